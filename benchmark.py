@@ -0,0 +1,264 @@
+"""
+Benchmark Harness cho banking data generator
+Chạy từng stage của pipeline (frame engines của stage DAG, export, analyze, generate_balanced_dataset
+end-to-end) ở nhiều quy mô (ví dụ 1k, 10k, 100k customers) và đo:
+- thời gian + rows/sec
+- peak RSS của process tới hết stage (Linux: VmHWM; --reset-peak-rss: reset trước mỗi stage)
+- tracemalloc: peak bytes được cấp phát trong stage
+Legacy object API (List[dataclass]) chỉ được đo khi có --legacy, trong section riêng (stage 'legacy.*').
+
+Kết quả lưu ra JSON để so sánh giữa các lần chạy; --baseline đánh dấu các stage bị chậm đi
+hoặc tốn bộ nhớ hơn baseline quá --tolerance.
+
+    python benchmark.py --scales 1000 10000 --output output/benchmark.json
+    python benchmark.py --scales 1000 --baseline output/benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from test_config import test_config
+from main_generator import NewMainGenerator
+from output_writers import pa
+from run_metrics import reset_peak_rss, peak_rss_mb
+from table_dtypes import with_datetime_dates
+
+# Các chỉ số được so sánh với baseline: (tên, True nếu càng lớn càng tốt)
+COMPARED_METRICS = [('rows_per_sec', True), ('peak_rss_mb', False), ('tracemalloc_peak_mb', False)]
+
+
+def run_stage(name: str, fn: Callable, count_rows: Callable = len, trace_alloc: bool = True,
+              reset_rss: bool = False):
+    """Chạy một stage (tắt stdout của generator) và trả về (kết quả, metrics)
+
+    reset_rss: reset VmHWM trước stage (opt-in) -> peak_rss_mb của riêng stage; mặc định là peak
+    của process tính tới hết stage.
+    """
+    if reset_rss:
+        reset_peak_rss()
+    if trace_alloc:
+        tracemalloc.start()
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        result = fn()
+    seconds = time.perf_counter() - start
+
+    tracemalloc_peak = None
+    if trace_alloc:
+        tracemalloc_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    rows = count_rows(result)
+    metrics = {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'tracemalloc_peak_mb': round(tracemalloc_peak, 1) if tracemalloc_peak is not None else None
+    }
+    print(f"   [STAGE] {name:<45} {rows:>10,} rows  {seconds:>8.2f}s  "
+          f"{metrics['rows_per_sec'] or 0:>12,.0f} rows/s  RSS {metrics['peak_rss_mb']:,.0f}MB")
+    return result, metrics
+
+
+def benchmark_scale(num_customers: int, seed: int = 42, trace_alloc: bool = True,
+                    reset_rss: bool = False, legacy: bool = False) -> Dict[str, Dict]:
+    """Benchmark các frame engines theo từng stage cho một quy mô customers, trả về {stage: metrics}
+
+    Các stage của stage DAG (cùng engines với generate_balanced_dataset) chạy tuần tự để đo riêng
+    từng stage, tiếp theo là export mỗi output format, analyze_dataset và generate_balanced_dataset
+    end-to-end (các branch song song). legacy: thêm section legacy object API (stage 'legacy.*').
+    """
+    print(f"\n[BENCHMARK] {num_customers:,} customers (seed={seed})")
+
+    # Seed + as_of cố định -> mọi lần chạy sinh cùng dữ liệu
+    config = test_config(SEED=seed, AS_OF_DATE=datetime(2025, 1, 1))
+    generator = NewMainGenerator(config)
+    stages = {}
+
+    def stage(name, fn, count_rows=len):
+        result, stages[name] = run_stage(name, fn, count_rows, trace_alloc, reset_rss)
+        return result
+
+    # Frame engines: từng stage của DAG theo thứ tự topo
+    tables = generator.resolve_tables()
+    artifacts = {'num_customers': num_customers}
+    for graph_stage in generator.stage_graph.plan(tables, list(artifacts)):
+        artifacts.update(stage(graph_stage.name, lambda: graph_stage.run(artifacts),
+                               lambda values: len(values[graph_stage.rows_from])))
+
+    # Dataset như generate_balanced_dataset trả về (cột date datetime64)
+    dataset = {table: with_datetime_dates(artifacts[table], table) for table in tables}
+    total_rows = lambda _: sum(len(df) for df in dataset.values())
+
+    # Exporters ghi vào thư mục tạm (không đụng tới output/)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_formats = ['csv', 'parquet', 'arrow'] if pa is not None else ['csv']
+        for output_format in output_formats:
+            stage(f'export_dataset[{output_format}]',
+                  lambda: generator.export_dataset(dataset, os.path.join(tmp_dir, 'banking_data'), output_format),
+                  total_rows)
+
+    stage('analyze_dataset', lambda: generator.analyze_dataset(dataset), lambda report: sum(report.counts.values()))
+
+    # End-to-end: stage DAG với các branch song song (config.STAGE_WORKERS), generator mới -> cùng dữ liệu
+    stage('generate_balanced_dataset',
+          lambda: NewMainGenerator(config).generate_balanced_dataset(num_customers),
+          lambda result: sum(len(df) for df in result.values()))
+
+    if legacy:
+        benchmark_legacy(config, num_customers, stage)
+    return stages
+
+
+def benchmark_legacy(config: test_config, num_customers: int, stage: Callable):
+    """Legacy object API (List[dataclass], dict records, CSV exporters cũ): các stage 'legacy.*'
+
+    Chỉ để so sánh với frame engines; pipeline (generate_balanced_dataset / streaming) không dùng các API này.
+    """
+    generator = NewMainGenerator(config)
+    start_date, end_date = config.START_DATE, config.END_DATE
+
+    customers = stage('legacy.generate_customers_by_count',
+                      lambda: generator.customer_generator.generate_customers_by_count(num_customers))
+    customers_dict = [customer.__dict__ for customer in customers]
+
+    accounts = stage('legacy.generate_accounts_for_customers',
+                     lambda: generator.account_generator.generate_accounts_for_customers(
+                         customers_dict, start_date, end_date))
+    accounts_dict = [account.__dict__ for account in accounts]
+
+    transactions = stage('legacy.generate_transactions_for_accounts',
+                         lambda: generator.transaction_generator.generate_transactions_for_accounts(
+                             accounts_dict, start_date, end_date))
+    transactions_dict = [transaction.__dict__ for transaction in transactions]
+
+    stage('legacy.update_account_balances',
+          lambda: generator.account_generator.update_account_balances(accounts, transactions_dict))
+
+    cards = stage('legacy.generate_cards_for_customers',
+                  lambda: generator.card_transaction_generator.generate_cards_for_customers(
+                      customers_dict, start_date, end_date))
+    card_transactions = stage('legacy.generate_transactions_for_cards',
+                              lambda: generator.card_transaction_generator.generate_transactions_for_cards(cards))
+    card_transactions_dict = [transaction.__dict__ for transaction in card_transactions]
+    cards_from_txn = stage('legacy.generate_cards',
+                           lambda: generator.card_generator.generate_cards(card_transactions_dict, customers_dict))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = lambda name: os.path.join(tmp_dir, name)
+
+        stage('legacy.export_customers_to_csv',
+              lambda: generator.customer_generator.export_customers_to_csv(customers, path('customers.csv')),
+              lambda _: len(customers))
+        stage('legacy.save_transactions_to_csv',
+              lambda: generator.transaction_generator.save_transactions_to_csv(transactions, path('transactions.csv')),
+              lambda _: len(transactions))
+        stage('legacy.export_card_transactions_to_csv',
+              lambda: generator.card_transaction_generator.export_transactions_to_csv(
+                  card_transactions, path('card_transactions.csv')),
+              lambda _: len(card_transactions))
+        stage('legacy.save_cards_to_csv',
+              lambda: generator.card_generator.save_cards_to_csv(cards_from_txn, customers_dict, path('cards.csv')),
+              lambda _: len(cards_from_txn))
+
+
+def run_benchmarks(scales: List[int], seed: int = 42, trace_alloc: bool = True, reset_rss: bool = False,
+                   legacy: bool = False) -> Dict:
+    """Benchmark mọi quy mô, trả về dict kết quả (ghi được ra JSON)"""
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'seed': seed,
+            'tracemalloc': trace_alloc,
+            'reset_peak_rss': reset_rss,
+            'legacy': legacy
+        },
+        'scales': {str(num_customers): benchmark_scale(num_customers, seed, trace_alloc, reset_rss, legacy)
+                   for num_customers in scales}
+    }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """So sánh với baseline, trả về danh sách regressions (rỗng nếu không có)"""
+    regressions = []
+    if results['meta'].get('tracemalloc') != baseline['meta'].get('tracemalloc'):
+        print("[WARNING] Baseline chạy với tracemalloc khác -> so sánh thời gian không chính xác")
+
+    for scale, stages in results['scales'].items():
+        baseline_stages = baseline['scales'].get(scale)
+        if baseline_stages is None:
+            continue
+        for stage_name, metrics in stages.items():
+            baseline_metrics = baseline_stages.get(stage_name)
+            if baseline_metrics is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS:
+                current, reference = metrics.get(metric), baseline_metrics.get(metric)
+                if not current or not reference:
+                    continue
+                change = (current - reference) / reference
+                if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                    regressions.append(
+                        f"{scale} customers / {stage_name}: {metric} {reference:,.1f} -> {current:,.1f} ({change:+.0%})"
+                    )
+    return regressions
+
+
+def main():
+    """CLI: chạy benchmark, ghi JSON, so sánh baseline (exit code 1 nếu có regression)"""
+    parser = argparse.ArgumentParser(description="Benchmark banking data generator stages")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+                        help="Số customers cho mỗi lần chạy")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='output/benchmark.json', help="File JSON kết quả")
+    parser.add_argument('--baseline', help="File JSON baseline để so sánh")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Mức chênh lệch cho phép so với baseline (0.2 = 20%%)")
+    parser.add_argument('--no-tracemalloc', action='store_true',
+                        help="Tắt tracemalloc (đo thời gian chính xác hơn, không có allocation peak)")
+    parser.add_argument('--legacy', action='store_true',
+                        help="Benchmark thêm legacy object API (stage 'legacy.*'), tách riêng khỏi frame engines")
+    parser.add_argument('--reset-peak-rss', action='store_true',
+                        help="Reset VmHWM (/proc/self/clear_refs) trước mỗi stage để đo peak RSS riêng từng stage")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.seed, trace_alloc=not args.no_tracemalloc,
+                             reset_rss=args.reset_peak_rss, legacy=args.legacy)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[SUCCESS] Benchmark results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[REGRESSION] {len(regressions)} regressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n[SUCCESS] No regressions vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
 """
-Card Generator - Sinh dữ liệu card dựa trên card_id từ card transaction
-và phân khúc khách hàng (A, B, C, D)
+Card Generator - Card master: sinh đầy đủ card record (PAN, loại thẻ, sản phẩm, hạn mức,
+ngày phát hành / hết hạn / kích hoạt, trạng thái) một lần theo phân khúc khách hàng (A-E).
+Card transactions được sinh trên card master này (bảng cards là projection của master).
+Chạy standalone: sinh card dựa trên card_id từ card transactions CSV.
 """
 
-import random
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict, Set
-from dataclasses import dataclass
+from typing import List, Dict, Set, Iterable, Union
+from dataclasses import dataclass, is_dataclass
 
-from test_config import test_config
+from test_config import test_config, GenerationContext
+from samplers import compile_samplers, compile_list_samplers
+from card_numbers import CardNumberEngine
+from id_allocator import child_ids
+from table_dtypes import (apply_table_dtypes, frame_to_python_columns, records_to_frame, ordered_categories,
+                          DATE_EPOCH, DAY_DTYPE, NO_DATE, day_ordinal, date_strings)
 
 @dataclass
 class Card:
@@ -34,10 +41,21 @@ class Card:
 class CardGenerator:
     """Card Generator với phân khúc khách hàng"""
     
-    def __init__(self, config: dict):
-        self.config = config
+    def __init__(self, config: test_config = None, context: GenerationContext = None):
+        self.config = config or test_config()
         self.cards_data = []
         
+        # RNG + clock context (substream riêng cho bảng cards_from_txn)
+        self.context = context or self.config.make_context()
+        self.rng = self.context.random('cards_from_txn')
+        self.np_rng = self.context.numpy('cards_from_txn')
+        # Card master: substream riêng cho thuộc tính thẻ và cho số thẻ mỗi customer
+        self.master_rng = self.context.numpy('cards')
+        self.master_count_rng = self.context.numpy('cards_count')
+        
+        # Card master: 2-4 thẻ mỗi khách hàng
+        self.cards_per_customer = (2, 4)
+        
         # Định nghĩa đặc điểm card theo phân khúc khách hàng
         self.segment_configs = {
             'A': {  # Khách hàng VIP - phân khúc cao
@@ -86,6 +104,79 @@ class CardGenerator:
                 'status_weights': {'ACTIVE': 0.5, 'INACTIVE': 0.3, 'BLOCKED': 0.05, 'LOST': 0.02, 'EXPIRED': 0.03, 'CLOSED': 0.1}
             }
         }
+        
+        # Compiled samplers (alias table) theo phân khúc
+        segments = self.segment_configs.keys()
+        self.card_type_samplers = compile_samplers(
+            {segment: self.segment_configs[segment]['card_type_weights'] for segment in segments}
+        )
+        self.product_type_samplers = compile_samplers(
+            {segment: self.segment_configs[segment]['product_type_weights'] for segment in segments}
+        )
+        self.credit_limit_range_samplers = compile_list_samplers(
+            {segment: self.segment_configs[segment]['credit_limit_ranges'] for segment in segments},
+            {segment: self.segment_configs[segment]['credit_limit_weights'] for segment in segments}
+        )
+        self.activation_samplers = compile_list_samplers(
+            {segment: [0, 1, 2] for segment in segments},  # 0: 7 ngày, 1: 7-30 ngày, 2: không kích hoạt
+            {segment: self.segment_configs[segment]['activation_probabilities'] for segment in segments}
+        )
+        self.status_samplers = compile_samplers(
+            {segment: self.segment_configs[segment]['status_weights'] for segment in segments}
+        )
+        self.status_samplers_with_transactions = compile_samplers(
+            {segment: self._status_weights_with_transactions(self.segment_configs[segment]['status_weights'])
+             for segment in segments}
+        )
+        
+        # PAN engine: số thẻ duy nhất, hợp lệ Luhn, BIN theo product_type
+        self.card_numbers = CardNumberEngine(self.config.CARD_BIN_PREFIXES, list(segments))
+        
+        # Thứ tự categories cố định cho các cột Categorical (table_dtypes)
+        configs = self.segment_configs.values()
+        self.categories = {
+            'card_type': ordered_categories(*(config['card_type_weights'] for config in configs)),
+            'product_type': ordered_categories(*(config['product_type_weights'] for config in configs)),
+            'card_status': ordered_categories(*(config['status_weights'] for config in configs)),
+        }
+    
+    def _status_weights_with_transactions(self, status_weights: Dict[str, float]) -> Dict[str, float]:
+        """Trọng số trạng thái cho thẻ có giao dịch: ưu tiên ACTIVE"""
+        weights = status_weights.copy()
+        weights['ACTIVE'] = min(0.9, weights['ACTIVE'] + 0.2)  # Tăng xác suất ACTIVE
+        # Giảm xác suất các trạng thái khác
+        for status in weights:
+            if status != 'ACTIVE':
+                weights[status] *= 0.5
+        return weights
+    
+    # Các cột cần từ card transactions / customers (không giữ cả bảng trong bộ nhớ)
+    CARD_COLUMNS = ['card_id', 'customer_code', 'card_number', 'card_type']
+    CUSTOMER_COLUMNS = ['customer_code', 'customer_segment']
+    # Các thuộc tính sinh từ uniforms ở generate_cards_frame (mỗi card một hàng)
+    CARD_UNIFORMS = ['issue', 'expire', 'activation', 'activation_days', 'card_type', 'product_type',
+                     'limit_range', 'limit', 'utilization', 'interest', 'status']
+    
+    def _to_frame(self, data: Union[pd.DataFrame, Iterable], columns: List[str]) -> pd.DataFrame:
+        """Chuẩn hóa input in-memory về DataFrame chỉ gồm các cột cần
+        
+        data có thể là DataFrame, list các dict/dataclass (ví dụ output của generator, đọc theo
+        cột qua records_to_frame), hoặc iterator các DataFrame chunks (ví dụ pd.read_csv(..., chunksize=...)).
+        """
+        if isinstance(data, pd.DataFrame):
+            return data[columns]
+        
+        data = list(data)
+        if not data:
+            return pd.DataFrame(columns=columns)
+        if isinstance(data[0], pd.DataFrame):
+            # Chunks: bỏ trùng theo từng chunk để không phải giữ toàn bộ rows
+            return pd.concat([chunk[columns].drop_duplicates() for chunk in data], ignore_index=True)
+        if is_dataclass(data[0]):
+            return records_to_frame(data, type(data[0]))[columns]
+        if not isinstance(data[0], dict):
+            data = [row.__dict__ for row in data]
+        return pd.DataFrame(data, columns=columns)
     
     def load_card_transactions(self) -> pd.DataFrame:
         """Load dữ liệu card transactions để lấy card_id"""
@@ -113,48 +204,27 @@ class CardGenerator:
         print(f"Tim thay {len(unique_cards)} card_id duy nhat")
         return unique_cards
     
-    def generate_card_number(self, customer_code: str, card_type: str) -> str:
-        """Sinh số thẻ theo format chuẩn"""
-        # Lấy 4 số cuối từ customer_code
-        customer_suffix = customer_code.split('_')[-1].zfill(4)
-        
-        # Sinh 4 số ngẫu nhiên cho mỗi nhóm 4 số
-        group1 = random.randint(1000, 9999)
-        group2 = random.randint(1000, 9999)
-        group3 = random.randint(1000, 9999)
-        group4 = int(customer_suffix)
-        
-        return f"{group1}-{group2}-{group3}-{group4}"
+    def generate_card_number(self, customer_code: str, card_type: str, product_type: str = 'NOI_DIA',
+                             card_seq: int = 1) -> str:
+        """Sinh số thẻ (PAN hợp lệ Luhn, BIN theo product_type) cho thẻ thứ card_seq của customer"""
+        card_keys = self.card_numbers.card_keys([customer_code], [card_seq])
+        return self.card_numbers.generate(card_keys, [product_type])[0]
     
     def determine_card_type(self, segment: str) -> str:
         """Xác định loại thẻ dựa trên phân khúc"""
-        config = self.segment_configs[segment]
-        return random.choices(
-            list(config['card_type_weights'].keys()),
-            weights=list(config['card_type_weights'].values())
-        )[0]
+        return self.card_type_samplers[segment].draw(self.rng)
     
     def determine_product_type(self, segment: str) -> str:
         """Xác định loại sản phẩm thẻ dựa trên phân khúc"""
-        config = self.segment_configs[segment]
-        return random.choices(
-            list(config['product_type_weights'].keys()),
-            weights=list(config['product_type_weights'].values())
-        )[0]
+        return self.product_type_samplers[segment].draw(self.rng)
     
     def calculate_credit_limit(self, segment: str, card_type: str) -> float:
         """Tính hạn mức credit dựa trên phân khúc và loại thẻ"""
         if card_type == 'DEBIT':
             return 0.0
         
-        config = self.segment_configs[segment]
-        range_idx = random.choices(
-            range(len(config['credit_limit_ranges'])),
-            weights=config['credit_limit_weights']
-        )[0]
-        
-        min_limit, max_limit = config['credit_limit_ranges'][range_idx]
-        return random.uniform(min_limit, max_limit)
+        min_limit, max_limit = self.credit_limit_range_samplers[segment].draw(self.rng)
+        return self.rng.uniform(min_limit, max_limit)
     
     def calculate_outstanding_balance(self, credit_limit: float) -> float:
         """Tính dư nợ hiện tại"""
@@ -162,7 +232,7 @@ class CardGenerator:
             return 0.0
         
         # Dư nợ từ 10% đến 80% hạn mức
-        utilization_rate = random.uniform(0.1, 0.8)
+        utilization_rate = self.rng.uniform(0.1, 0.8)
         return credit_limit * utilization_rate
     
     def calculate_available_credit(self, credit_limit: float, outstanding_balance: float) -> float:
@@ -179,25 +249,21 @@ class CardGenerator:
         """Sinh ngày phát hành thẻ"""
         start_date = datetime(2020, 1, 1)
         end_date = datetime(2024, 12, 31)
-        return start_date + timedelta(days=random.randint(0, (end_date - start_date).days))
+        return start_date + timedelta(days=self.rng.randint(0, (end_date - start_date).days))
     
     def generate_expire_date(self, issue_date: datetime) -> datetime:
         """Sinh ngày hết hạn thẻ (3-5 năm sau ngày phát hành)"""
-        years = random.randint(3, 5)
+        years = self.rng.randint(3, 5)
         return issue_date + timedelta(days=years * 365)
     
     def generate_activation_date(self, issue_date: datetime, segment: str) -> datetime:
         """Sinh ngày kích hoạt thẻ dựa trên phân khúc"""
-        config = self.segment_configs[segment]
-        activation_type = random.choices(
-            [0, 1, 2],  # 0: 7 ngày, 1: 7-30 ngày, 2: không kích hoạt
-            weights=config['activation_probabilities']
-        )[0]
+        activation_type = self.activation_samplers[segment].draw(self.rng)  # 0: 7 ngày, 1: 7-30 ngày, 2: không kích hoạt
         
         if activation_type == 0:  # Kích hoạt trong 7 ngày
-            days = random.randint(1, 7)
+            days = self.rng.randint(1, 7)
         elif activation_type == 1:  # Kích hoạt sau 7-30 ngày
-            days = random.randint(8, 30)
+            days = self.rng.randint(8, 30)
         else:  # Không kích hoạt
             return None
         
@@ -214,27 +280,14 @@ class CardGenerator:
         """Sinh lãi suất dựa trên phân khúc"""
         config = self.segment_configs[segment]
         min_rate, max_rate = config['interest_rate_range']
-        return round(random.uniform(min_rate, max_rate), 2)
+        return round(self.rng.uniform(min_rate, max_rate), 2)
     
     def determine_card_status(self, segment: str, has_transactions: bool) -> str:
         """Xác định trạng thái thẻ dựa trên phân khúc và hoạt động"""
-        config = self.segment_configs[segment]
-        
         # Nếu có giao dịch thì ưu tiên ACTIVE
         if has_transactions:
-            weights = config['status_weights'].copy()
-            weights['ACTIVE'] = min(0.9, weights['ACTIVE'] + 0.2)  # Tăng xác suất ACTIVE
-            # Giảm xác suất các trạng thái khác
-            for status in weights:
-                if status != 'ACTIVE':
-                    weights[status] *= 0.5
-        else:
-            weights = config['status_weights']
-        
-        return random.choices(
-            list(weights.keys()),
-            weights=list(weights.values())
-        )[0]
+            return self.status_samplers_with_transactions[segment].draw(self.rng)
+        return self.status_samplers[segment].draw(self.rng)
     
     def generate_card(self, card_id: str, customer_code: str, card_number: str, 
                      card_type: str, segment: str, has_transactions: bool) -> Card:
@@ -278,85 +331,220 @@ class CardGenerator:
             card_status=card_status
         )
     
-    def generate_cards(self) -> List[Card]:
-        """Sinh dữ liệu cho tất cả cards"""
+    def generate_cards(self, card_transactions: Union[pd.DataFrame, Iterable] = None,
+                       customers: Union[pd.DataFrame, Iterable] = None) -> List[Card]:
+        """Sinh dữ liệu cho tất cả cards
+        
+        card_transactions / customers: dữ liệu in-memory (DataFrame, list rows hoặc iterator
+        DataFrame chunks). Nếu không truyền thì đọc từ CSV trong output/ (chạy standalone).
+        """
         print("Bat dau sinh du lieu cards...")
         
-        # Load du lieu
-        card_txn_df = self.load_card_transactions()
-        customers_df = self.load_customers()
+        cards = self._frame_to_cards(self.generate_cards_frame(card_transactions, customers))
         
-        # Tao mapping customer_code -> segment
-        customer_segment_map = dict(zip(customers_df['customer_code'], customers_df['customer_segment']))
+        print(f"Da sinh {len(cards)} cards")
+        return cards
+    
+    def generate_card_master_frame(self, customers: Union[pd.DataFrame, Iterable],
+                                   start_date: datetime, end_date: datetime,
+                                   rng: np.random.Generator = None,
+                                   count_rng: np.random.Generator = None) -> pd.DataFrame:
+        """Card master: đầy đủ card record cho mọi customer, sinh một lần (DataFrame có các cột của Card)
         
-        # Lay danh sach card_id duy nhat
-        unique_cards_df = self.get_unique_cards_from_transactions(card_txn_df)
+        Mỗi customer có cards_per_customer thẻ (một uniform mỗi customer từ count_rng), ngày phát
+        hành trong [start_date, end_date]. Thẻ chưa kích hoạt (hoặc kích hoạt sau as_of) không có
+        giao dịch; thẻ đã kích hoạt dùng status ưu tiên ACTIVE như thẻ có giao dịch.
+        customers: DataFrame / list rows có customer_code (+ customer_segment, mặc định theo customer_code).
+        """
+        rng = rng or self.master_rng
+        count_rng = count_rng or self.master_count_rng
         
-        # Tao mapping card_id -> co giao dich hay khong
-        cards_with_transactions = set(card_txn_df['card_id'].unique())
+        customers_df = customers if isinstance(customers, pd.DataFrame) else pd.DataFrame(list(customers))
+        if customers_df.empty:
+            return self._cards_frame(*(np.empty(0, dtype=object),) * 3, None,
+                                     start_date, end_date, rng.random((0, len(self.CARD_UNIFORMS))))
+        customer_codes = customers_df['customer_code'].astype(object)
+        segments = (customers_df['customer_segment'].astype(object) if 'customer_segment' in customers_df
+                    else pd.Series(np.nan, index=customers_df.index, dtype=object))
+        segments = segments.fillna(customer_codes.str[:1]).to_numpy(dtype=object)
         
-        cards = []
-        for _, row in unique_cards_df.iterrows():
-            card_id = row['card_id']
-            customer_code = row['customer_code']
-            card_number = row['card_number']
-            card_type = row['card_type']
-            
-            # Lay phan khuc khach hang
-            segment = customer_segment_map.get(customer_code, 'D')  # Mac dinh la D neu khong tim thay
-            
-            # Kiem tra co giao dich hay khong
-            has_transactions = card_id in cards_with_transactions
+        # Số thẻ mỗi customer, mở rộng thành một row mỗi thẻ
+        low, high = self.cards_per_customer
+        counts = low + (count_rng.random(len(customers_df)) * (high - low + 1)).astype(np.int64)
+        customer_index = np.repeat(np.arange(len(customers_df)), counts)
+        card_seq = np.arange(len(customer_index)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        card_codes = customer_codes.to_numpy(dtype=object)[customer_index]
+        
+        u = rng.random((len(customer_index), len(self.CARD_UNIFORMS)))
+        return self._cards_frame(child_ids('CARD_', card_codes, card_seq, 2), card_codes,
+                                 segments[customer_index], None, start_date, end_date, u)
+    
+    def generate_cards_frame(self, card_transactions: Union[pd.DataFrame, Iterable] = None,
+                             customers: Union[pd.DataFrame, Iterable] = None,
+                             rng: np.random.Generator = None) -> pd.DataFrame:
+        """Sinh cards theo batch (NumPy) từ card_id của card transactions - trả về DataFrame có các cột của Card
+        
+        Cùng phân bố với generate_card nhưng mỗi thuộc tính được sinh một lần dưới dạng
+        array cho tất cả cards của cùng phân khúc, thay cho vòng lặp iterrows.
+        Input giống generate_cards (pipeline dùng generate_card_master_frame).
+        """
+        rng = rng or self.np_rng
+        
+        # Load du lieu (chỉ đọc file khi không có dữ liệu in-memory)
+        if card_transactions is None:
+            card_txn_df = self.load_card_transactions()
+        else:
+            card_txn_df = self._to_frame(card_transactions, self.CARD_COLUMNS)
+        customers_df = self._load_customer_segments(customers)
+        
+        # Lay danh sach card_id duy nhat + phan khuc (mac dinh D neu khong tim thay)
+        unique_cards_df = self.get_unique_cards_from_transactions(card_txn_df).reset_index(drop=True)
+        segment_map = pd.Series(customers_df['customer_segment'].to_numpy(), index=customers_df['customer_code'])
+        segment_map = segment_map[~segment_map.index.duplicated()]
+        card_segments = unique_cards_df['customer_code'].map(segment_map).fillna('D').to_numpy(dtype=object)
+        # isin trên object array (hash table), tránh isin chậm của string dtype
+        has_transactions = pd.Series(unique_cards_df['card_id'].to_numpy(dtype=object), dtype=object).isin(
+            card_txn_df['card_id'].to_numpy(dtype=object)
+        ).to_numpy()
+        
+        # Mỗi card dùng đúng một hàng uniforms (mỗi cột là một thuộc tính), nên kết quả
+        # không phụ thuộc cách chia chunk khi gọi nhiều lần trên cùng rng (streaming mode)
+        u = rng.random((len(unique_cards_df), len(self.CARD_UNIFORMS)))
+        return self._cards_frame(unique_cards_df['card_id'].to_numpy(dtype=object),
+                                 unique_cards_df['customer_code'].to_numpy(dtype=object), card_segments,
+                                 has_transactions, datetime(2020, 1, 1), datetime(2024, 12, 31), u)
+    
+    def _cards_frame(self, card_id: np.ndarray, customer_code: np.ndarray, card_segments: np.ndarray,
+                     has_transactions: np.ndarray, issue_start: datetime, issue_end: datetime,
+                     u: np.ndarray) -> pd.DataFrame:
+        """Thuộc tính của các thẻ từ uniforms (mỗi thẻ một hàng, cột theo CARD_UNIFORMS)
+        
+        has_transactions=None (card master): thẻ đã kích hoạt trước as_of được coi là có giao dịch,
+        thẻ chưa kích hoạt / kích hoạt sau as_of -> activation_date NaT.
+        """
+        n = len(card_id)
+        col = {name: u[:, i] for i, name in enumerate(self.CARD_UNIFORMS)}
+        
+        # Ngày phát hành, hết hạn (3-5 năm), đến hạn thanh toán (ngày 20 tháng sau), dạng day ordinals
+        issue_start = day_ordinal(issue_start)
+        issue_span = day_ordinal(issue_end) - issue_start
+        issue_date = issue_start + (col['issue'] * (issue_span + 1)).astype(np.int64)
+        expire_date = issue_date + (3 + (col['expire'] * 3).astype(np.int64)) * 365
+        next_month = (DATE_EPOCH + issue_date).astype('datetime64[M]') + 1
+        due_date = (next_month.astype('datetime64[D]') - DATE_EPOCH).astype(np.int64) + 19
+        
+        card_type = np.empty(n, dtype=object)
+        product_type = np.empty(n, dtype=object)
+        limit_min = np.zeros(n)
+        limit_max = np.zeros(n)
+        interest_min = np.zeros(n)
+        interest_max = np.zeros(n)
+        activation_type = np.zeros(n, dtype=np.int64)
+        
+        for segment, config in self.segment_configs.items():
+            mask = card_segments == segment
+            if not mask.any():
+                continue
+            card_type[mask] = self.card_type_samplers[segment].values_from_uniform(col['card_type'][mask])
+            product_type[mask] = self.product_type_samplers[segment].values_from_uniform(col['product_type'][mask])
+            activation_type[mask] = self.activation_samplers[segment].codes_from_uniform(col['activation'][mask])
             
-            # Sinh du lieu card
-            card = self.generate_card(card_id, customer_code, card_number, card_type, segment, has_transactions)
-            cards.append(card)
+            limit_sampler = self.credit_limit_range_samplers[segment]
+            limit_ranges = np.array(limit_sampler.values, dtype=float)
+            limit_codes = limit_sampler.codes_from_uniform(col['limit_range'][mask])
+            limit_min[mask] = limit_ranges[limit_codes, 0]
+            limit_max[mask] = limit_ranges[limit_codes, 1]
+            interest_min[mask], interest_max[mask] = config['interest_rate_range']
         
-        print(f"Da sinh {len(cards)} cards")
-        return cards
+        # Kích hoạt: 0 -> 1-7 ngày, 1 -> 8-30 ngày, 2 -> không kích hoạt
+        activation_days = np.where(
+            activation_type == 0,
+            1 + (col['activation_days'] * 7).astype(np.int64),
+            8 + (col['activation_days'] * 23).astype(np.int64)
+        )
+        activation_date = issue_date + activation_days
+        not_activated = activation_type == 2
+        if has_transactions is None:
+            not_activated |= activation_date > day_ordinal(self.context.as_of)
+            has_transactions = ~not_activated
+        activation_date[not_activated] = NO_DATE
+        
+        # Thẻ có giao dịch thì ưu tiên ACTIVE
+        card_status = np.empty(n, dtype=object)
+        for segment in self.segment_configs:
+            mask = card_segments == segment
+            if mask.any():
+                card_status[mask] = np.where(
+                    has_transactions[mask],
+                    self.status_samplers_with_transactions[segment].values_from_uniform(col['status'][mask]),
+                    self.status_samplers[segment].values_from_uniform(col['status'][mask])
+                )
+        
+        # Hạn mức, dư nợ (10-80% hạn mức), khả dụng, thanh toán tối thiểu (>= 100k)
+        credit_limit = np.where(card_type == 'DEBIT', 0.0, limit_min + (limit_max - limit_min) * col['limit'])
+        outstanding_balance = credit_limit * (0.1 + 0.7 * col['utilization'])
+        available_credit = np.maximum(0, credit_limit - outstanding_balance)
+        minimum_payment = np.where(outstanding_balance == 0, 0.0, np.maximum(0.05 * outstanding_balance, 100_000))
+        interest_rate = np.round(interest_min + (interest_max - interest_min) * col['interest'], 2)
+        
+        # PAN theo card_id (CARD_{customer_code}_{nn}) + BIN của product_type
+        card_seq = pd.Series(card_id, dtype=object).str.rsplit('_', n=1).str[1].astype(np.int64).to_numpy()
+        card_number = self.card_numbers.generate(self.card_numbers.card_keys(customer_code, card_seq), product_type)
+        
+        cards_df = pd.DataFrame({
+            'card_id': card_id,
+            'customer_code': customer_code,
+            'card_number': card_number,
+            'card_type': card_type,
+            'product_type': product_type,
+            'issue_date': issue_date.astype(DAY_DTYPE),
+            'expire_date': expire_date.astype(DAY_DTYPE),
+            'activation_date': activation_date.astype(DAY_DTYPE),
+            'credit_limit': credit_limit,
+            'available_credit': available_credit,
+            'outstanding_balance': outstanding_balance,
+            'minimum_payment': minimum_payment,
+            'due_date': due_date.astype(DAY_DTYPE),
+            'interest_rate': interest_rate,
+            'card_status': card_status
+        })
+        # Amount tính theo major units (float) -> minor units khi áp dtypes
+        return apply_table_dtypes(cards_df, 'cards_from_txn', self.categories, amounts='major')
     
-    def save_cards_to_csv(self, cards: List[Card]):
+    def _frame_to_cards(self, cards_df: pd.DataFrame) -> List[Card]:
+        """Convert DataFrame cards sang List[Card] (datetime Python, NaT -> None)"""
+        columns = frame_to_python_columns(cards_df, 'cards_from_txn', list(Card.__dataclass_fields__))
+        return [Card(*row) for row in zip(*columns)]
+    
+    def _load_customer_segments(self, customers: Union[pd.DataFrame, Iterable] = None) -> pd.DataFrame:
+        """customer_code + customer_segment từ dữ liệu in-memory, hoặc từ CSV nếu không có"""
+        if customers is None:
+            return self.load_customers()
+        return self._to_frame(customers, self.CUSTOMER_COLUMNS)
+    
+    def save_cards_to_csv(self, cards: List[Card], customers: Union[pd.DataFrame, Iterable] = None,
+                          file_path: str = os.path.join('output', 'banking_data_cards.csv')):
         """Lưu dữ liệu cards vào file CSV"""
-        output_dir = 'output'
-        os.makedirs(output_dir, exist_ok=True)
-        
-        file_path = os.path.join(output_dir, 'banking_data_cards.csv')
-        
-        # Chuẩn bị dữ liệu
-        cards_data = []
-        for card in cards:
-            cards_data.append({
-                'card_id': card.card_id,
-                'customer_code': card.customer_code,
-                'card_number': card.card_number,
-                'card_type': card.card_type,
-                'product_type': card.product_type,
-                'issue_date': card.issue_date.strftime('%Y-%m-%d'),
-                'expire_date': card.expire_date.strftime('%Y-%m-%d'),
-                'activation_date': card.activation_date.strftime('%Y-%m-%d') if card.activation_date else None,
-                'credit_limit': card.credit_limit,
-                'available_credit': card.available_credit,
-                'outstanding_balance': card.outstanding_balance,
-                'minimum_payment': card.minimum_payment,
-                'due_date': card.due_date.strftime('%Y-%m-%d'),
-                'interest_rate': card.interest_rate,
-                'card_status': card.card_status
-            })
+        os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+        
+        # Chuẩn bị dữ liệu (ghi theo cột, không tạo dict cho từng card)
+        df = records_to_frame(cards, Card)
+        for column in ('issue_date', 'expire_date', 'activation_date', 'due_date'):
+            df[column] = date_strings(df[column])
         
         # Lưu vào CSV
-        df = pd.DataFrame(cards_data)
         df.to_csv(file_path, index=False, encoding='utf-8')
-        print(f"Da luu {len(cards_data)} cards vao {file_path}")
+        print(f"Da luu {len(df)} cards vao {file_path}")
         
         # Thong ke theo phan khuc
-        self.print_segment_statistics(df)
+        self.print_segment_statistics(df, customers)
     
-    def print_segment_statistics(self, df: pd.DataFrame):
+    def print_segment_statistics(self, df: pd.DataFrame, customers: Union[pd.DataFrame, Iterable] = None):
         """In thống kê theo phân khúc"""
         print("\n=== THONG KE CARDS THEO PHAN KHUC ===")
         
-        # Load customer data de mapping
-        customers_df = pd.read_csv(os.path.join('output', 'banking_data_customers.csv'))
+        # Customer data de mapping (in-memory hoặc CSV)
+        customers_df = self._load_customer_segments(customers)
         customer_segment_map = dict(zip(customers_df['customer_code'], customers_df['customer_segment']))
         
         # Them cot segment vao df
@@ -381,7 +569,7 @@ def main():
     print("va phan khuc khach hang (A, B, C, D)")
     
     # Khoi tao generator
-    generator = CardGenerator(test_config)
+    generator = CardGenerator(test_config(SHOW_PROGRESS=True))
     
     # Sinh du lieu
     cards = generator.generate_cards()
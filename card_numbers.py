@@ -0,0 +1,121 @@
+"""
+Card Number (PAN) Engine
+Sinh số thẻ 16 chữ số hợp lệ Luhn theo batch (NumPy), BIN prefix theo product_type
+(QUOC_TE / NOI_DIA, cấu hình ở config.CARD_BIN_PREFIXES).
+
+Không trùng theo cách xây dựng (không cần lookup set): phần account number của PAN là một
+hoán vị (bijection) của card key, và card key được suy ra từ customer_code + số thứ tự thẻ
+(CARD_{customer_code}_{nn}), vốn đã duy nhất. Cùng card_id luôn cho cùng PAN với mọi
+cách chia chunk / shard.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+PAN_LENGTH = 16
+MAX_CARDS_PER_CUSTOMER = 10
+# Hoán vị affine key -> (a * key + b) mod 10^digits, a nguyên tố cùng nhau với 10 nên là bijection
+_PERMUTATION_MULTIPLIER = 7_654_321
+_PERMUTATION_OFFSET = 1_234_567
+
+
+def _luhn_block_table(block_digits: int = 3) -> np.ndarray:
+    """Tổng Luhn của mọi block block_digits chữ số, theo parity vị trí chữ số đầu tiên (tính từ phải)"""
+    values = np.arange(10 ** block_digits)
+    table = np.zeros((2, len(values)), dtype=np.int64)
+    for parity in (0, 1):
+        for j in range(block_digits):
+            digit = (values // 10 ** j) % 10
+            doubled = digit * 2
+            table[parity] += np.where((parity + j) % 2 == 0, doubled - 9 * (doubled > 9), digit)
+    return table
+
+
+_LUHN_BLOCK_TABLE = _luhn_block_table()
+
+
+def luhn_check_digits(payload: np.ndarray) -> np.ndarray:
+    """Check digit Luhn cho các payload (số nguyên, chưa có check digit)
+    
+    Sau khi nối check digit, chữ số thứ j (tính từ phải, 0-based) của payload được nhân đôi
+    nếu j chẵn; payload được xử lý theo block 3 chữ số qua bảng tra thay vì từng chữ số.
+    """
+    remaining = np.asarray(payload, dtype=np.int64).copy()
+    total = np.zeros(len(remaining), dtype=np.int64)
+    position = 0
+    while remaining.any():
+        total += _LUHN_BLOCK_TABLE[position % 2][remaining % 1000]
+        remaining //= 1000
+        position += 3
+    return (10 - total % 10) % 10
+
+
+def luhn_valid(card_numbers) -> np.ndarray:
+    """Kiểm tra Luhn cho số thẻ (chấp nhận dạng có dấu '-')"""
+    digits = pd.Series(np.asarray(card_numbers, dtype=object), dtype=object).str.replace('-', '', regex=False)
+    pans = digits.astype(np.int64).to_numpy()
+    return luhn_check_digits(pans // 10) == pans % 10
+
+
+# '0000'..'9999' dạng bytes, để ghép số thẻ theo từng nhóm 4 chữ số
+_DIGIT_GROUPS = np.char.zfill(np.arange(10_000).astype(str), 4).astype('S4').view(np.uint8).reshape(-1, 4)
+
+
+def format_card_numbers(pans: np.ndarray) -> np.ndarray:
+    """16 chữ số -> 'NNNN-NNNN-NNNN-NNNN' (object array), ghép trên mảng bytes theo nhóm 4 chữ số"""
+    pans = np.asarray(pans, dtype=np.int64)
+    groups = PAN_LENGTH // 4
+    width = PAN_LENGTH + groups - 1
+    chars = np.full((len(pans), width), ord('-'), dtype=np.uint8)
+    for i in range(groups):
+        group = (pans // 10 ** (4 * (groups - 1 - i))) % 10_000
+        chars[:, 5 * i:5 * i + 4] = _DIGIT_GROUPS[group]
+    return chars.view(f'S{width}').ravel().astype(f'U{width}').astype(object)
+
+
+class CardNumberEngine:
+    """Sinh PAN duy nhất + hợp lệ Luhn theo BIN của product_type"""
+
+    def __init__(self, bin_prefixes: Dict[str, str], segments: List[str]):
+        for product_type, bin_prefix in bin_prefixes.items():
+            if not bin_prefix.isdigit() or not 1 <= len(bin_prefix) < PAN_LENGTH - 1:
+                raise ValueError(f"Invalid BIN prefix '{bin_prefix}' for product_type '{product_type}'")
+        self.bin_prefixes = dict(bin_prefixes)
+        self.segments = list(segments)
+
+    def card_keys(self, customer_codes, card_seq) -> np.ndarray:
+        """Card key duy nhất từ customer_code ({segment}_{id}) + số thứ tự thẻ (1-based)"""
+        codes, unique_codes = pd.factorize(np.asarray(customer_codes, dtype=object))
+        customer_keys = np.empty(len(unique_codes), dtype=np.int64)
+        for i, code in enumerate(unique_codes):
+            segment, customer_id = code.rsplit('_', 1)
+            customer_keys[i] = int(customer_id) * len(self.segments) + self.segments.index(segment)
+        card_seq = np.asarray(card_seq, dtype=np.int64)
+        if len(card_seq) and (card_seq.min() < 1 or card_seq.max() > MAX_CARDS_PER_CUSTOMER):
+            raise ValueError(f"Card sequence must be in [1, {MAX_CARDS_PER_CUSTOMER}]")
+        return customer_keys[codes] * MAX_CARDS_PER_CUSTOMER + card_seq - 1
+
+    def generate(self, card_keys: np.ndarray, product_types) -> np.ndarray:
+        """PAN dạng 'NNNN-NNNN-NNNN-NNNN' cho từng card key theo BIN của product_type"""
+        card_keys = np.asarray(card_keys, dtype=np.int64)
+        product_types = np.asarray(product_types, dtype=object)
+        pans = np.zeros(len(card_keys), dtype=np.int64)
+
+        for product_type, bin_prefix in self.bin_prefixes.items():
+            mask = product_types == product_type
+            if not mask.any():
+                continue
+            account_digits = PAN_LENGTH - 1 - len(bin_prefix)
+            space = 10 ** account_digits
+            keys = card_keys[mask]
+            if keys.max() >= space:
+                raise OverflowError(f"BIN {bin_prefix}: card key vượt quá {space:,} số thẻ")
+            account = (keys * (_PERMUTATION_MULTIPLIER % space) + _PERMUTATION_OFFSET) % space
+            payload = int(bin_prefix) * space + account
+            pans[mask] = payload * 10 + luhn_check_digits(payload)
+
+        unknown = ~np.isin(product_types, list(self.bin_prefixes))
+        if unknown.any():
+            raise KeyError(f"No BIN prefix for product_type '{product_types[unknown][0]}'")
+        return format_card_numbers(pans)
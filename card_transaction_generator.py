@@ -1,19 +1,24 @@
 """
 Card Transaction Generator với phân khúc khách hàng
-Sử dụng dữ liệu cards từ card_generator.py để tạo card transactions
+Sinh card transactions trên card master của card_generator.py (in-memory, hoặc cards CSV)
 X_VIP (50%) - Khách hàng VIP: 6-8 transactions, >20 triệu, có giao dịch trong 30 ngày
 Y_medium (30%) - Khách hàng trung bình: 3+ transactions/ngày, 10-15 triệu, giao dịch trong 2-6 tháng  
 Z_low (20%) - Khách hàng thấp: 2-3 transactions/ngày, <10 triệu, giao dịch >6 tháng
 """
 
-import random
+import numpy as np
 import pandas as pd
 import os
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Union
 from dataclasses import dataclass
 
-from test_config import test_config
+from test_config import test_config, GenerationContext
+from samplers import WeightedSampler
+from id_allocator import child_ids, format_ids
+from table_dtypes import (apply_table_dtypes, frame_to_python_columns, records_to_frame, ordered_categories,
+                          amount_values, to_minor_units, DAY_DTYPE, NO_DATE, day_ordinal, to_day_ordinals, date_strings)
+from card_generator import CardGenerator
 
 @dataclass
 class Card:
@@ -50,9 +55,25 @@ class CardTransaction:
 class CardTransactionGenerator:
     """Card Transaction Generator với phân khúc khách hàng"""
     
-    def __init__(self, config: test_config = None):
+    # Mỗi transaction dùng một hàng uniforms, mỗi cột là một thuộc tính
+    TRANSACTION_UNIFORMS = ['bucket', 'day', 'recent_day', 'future_day', 'amount', 'limit_amount',
+                            'currency', 'type', 'type_name', 'merchant', 'merchant_id', 'status']
+    
+    def __init__(self, config: test_config = None, context: GenerationContext = None,
+                 card_master: CardGenerator = None):
         self.config = config or test_config()
         
+        # RNG + clock context (substream riêng cho bảng card_transactions)
+        self.context = context or self.config.make_context()
+        self.rng = self.context.random('card_transactions')
+        self.np_rng = self.context.numpy('card_transactions')
+        # Số giao dịch của mỗi thẻ lấy từ substream riêng: cả hai stream đều được dùng theo thứ tự
+        # thẻ nên batch engine cho cùng kết quả với mọi cách chia chunk
+        self.np_count_rng = self.context.numpy('card_transactions_count')
+        
+        # Card master (CardGenerator): cards được sinh một lần ở đó, bảng cards là projection của master
+        self.card_master = card_master or CardGenerator(self.config, self.context)
+        
         # Segment distribution (theo yêu cầu mới)
         self.segment_distribution = {
             'X_VIP': 0.50,      # 50% - Khách hàng VIP
@@ -197,6 +218,41 @@ class CardTransactionGenerator:
             'ATM/POS': 'DR',         # Rút tiền = ghi nợ
             'CREDIT': 'CR'           # Hoàn tiền = ghi có
         }
+        
+        # Card status (card master) -> mức hoạt động của thẻ, quyết định số giao dịch
+        # (các giá trị posted / decline service / closed / inactive được dùng trực tiếp)
+        self.card_status_activity = {
+            'ACTIVE': 'posted',
+            'INACTIVE': 'inactive',
+            'BLOCKED': 'decline service',
+            'LOST': 'decline service',
+            'EXPIRED': 'closed',
+            'CLOSED': 'closed'
+        }
+        
+        # Compiled samplers (alias table) cho các phân bố có trọng số
+        self.currency_sampler = WeightedSampler.from_dict(self.currency_distribution)
+        self.transaction_type_sampler = WeightedSampler(
+            list(self.transaction_types.keys()),
+            [t['weight'] for t in self.transaction_types.values()]
+        )
+        self.merchant_sampler = WeightedSampler.from_dict(self.merchants)
+        self.status_sampler = WeightedSampler.from_dict(self.status_distribution)
+        # merchant_id MERCH_10000..MERCH_99999 tính trước, mỗi giao dịch chỉ cần index
+        self.merchant_ids = format_ids('MERCH_', np.arange(10000, 100000), 5)
+        
+        # Thứ tự categories cố định cho các cột Categorical (table_dtypes), dùng cho cả cards
+        # và card_transactions
+        self.categories = {
+            'card_type': ['CREDIT', 'DEBIT'],
+            'status': self.card_master.categories['card_status'],
+            'tran_currency': list(self.currency_distribution),
+            'cr_dr': ordered_categories(self.cr_dr_mapping.values()),
+            'tran_type': list(self.transaction_types),
+            'tran_type_name': ordered_categories(*(t['type_names'] for t in self.transaction_types.values())),
+            'merchant_name': list(self.merchants),
+            'tran_status': list(self.status_distribution),
+        }
 
 
     def load_cards_from_csv(self, cards_file: str = "output/banking_data_cards.csv") -> List[Card]:
@@ -206,43 +262,252 @@ class CardTransactionGenerator:
             raise FileNotFoundError(f"Cards file {cards_file} not found. Please run card_generator.py first.")
         
         print(f"Loading cards from {cards_file}...")
-        df_cards = pd.read_csv(cards_file)
-        
-        cards = []
-        for _, row in df_cards.iterrows():
-            card = Card(
-                card_id=row['card_id'],
-                card_number=row['card_number'],
-                customer_code=row['customer_code'],
-                card_type=row['card_type'],
-                credit_limit=row['credit_limit'],
-                active_date=datetime.strptime(row['issue_date'], '%Y-%m-%d'),
-                expiry_date=datetime.strptime(row['expire_date'], '%Y-%m-%d'),
-                status=row['card_status']
-            )
-            cards.append(card)
+        cards = self._frame_to_cards(self.load_cards_frame_from_csv(cards_file))
         
         print(f"Loaded {len(cards)} cards from CSV file")
         return cards
 
-    def generate_transactions_for_cards(self, cards: List[Card], 
-                                      start_date: datetime, end_date: datetime) -> List[CardTransaction]:
-        """Generate transactions for cards based on customer segments"""
-        
-        all_transactions = []
-        
-        for card in cards:
-            # Generate transactions for all cards regardless of status
-            # Different status cards will have different transaction patterns
-                
-            # Determine segment from customer code
-            segment = self._determine_segment_from_customer_code(card.customer_code)
-            
-            # Generate transactions for this card
-            transactions = self._generate_transactions_for_card(card, segment, start_date, end_date)
-            all_transactions.extend(transactions)
+    def load_cards_frame_from_csv(self, cards_file: str = "output/banking_data_cards.csv") -> pd.DataFrame:
+        """Load cards CSV (format của card_generator.py) thành DataFrame có các cột của Card
+        
+        Đọc đúng các cột cần và parse ngày thành day ordinals một lần mỗi cột;
+        DataFrame này dùng trực tiếp được cho generate_transactions_frame.
+        """
+        df_cards = pd.read_csv(
+            cards_file,
+            usecols=['card_id', 'card_number', 'customer_code', 'card_type', 'credit_limit',
+                     'issue_date', 'expire_date', 'card_status']
+        )
+        return pd.DataFrame({
+            'card_id': df_cards['card_id'],
+            'card_number': df_cards['card_number'],
+            'customer_code': df_cards['customer_code'],
+            'card_type': df_cards['card_type'],
+            'credit_limit': to_minor_units(df_cards['credit_limit']),
+            'active_date': to_day_ordinals(pd.to_datetime(df_cards['issue_date'], format='%Y-%m-%d')),
+            'expiry_date': to_day_ordinals(pd.to_datetime(df_cards['expire_date'], format='%Y-%m-%d')),
+            'status': df_cards['card_status']
+        })
+
+    def generate_cards_for_customers(self, customers: Union[pd.DataFrame, List[Dict]],
+                                     start_date: datetime, end_date: datetime) -> List[Card]:
+        """Generate cards for customers based on their segments (projection của card master)
+        
+        customers: list các dict hoặc DataFrame có cột customer_code (+ customer_segment).
+        """
+        master_df = self.card_master.generate_card_master_frame(customers, start_date, end_date)
+        return self._frame_to_cards(self.cards_from_master(master_df))
+
+    def cards_from_master(self, master_df: pd.DataFrame) -> pd.DataFrame:
+        """Bảng cards (các cột của Card) từ card master: active_date = activation_date (NaT nếu
+        chưa kích hoạt), expiry_date = expire_date, status = card_status
+        """
+        cards_df = pd.DataFrame({
+            'card_id': master_df['card_id'],
+            'card_number': master_df['card_number'],
+            'customer_code': master_df['customer_code'],
+            'card_type': master_df['card_type'],
+            'credit_limit': master_df['credit_limit'],
+            'active_date': master_df['activation_date'],
+            'expiry_date': master_df['expire_date'],
+            'status': master_df['card_status']
+        })
+        return apply_table_dtypes(cards_df, 'cards', self.categories)
+
+    def _frame_to_cards(self, cards_df: pd.DataFrame) -> List[Card]:
+        """Convert DataFrame cards sang List[Card] (datetime Python, NaT -> None)"""
+        columns = frame_to_python_columns(cards_df, 'cards', list(Card.__dataclass_fields__))
+        return [Card(*row) for row in zip(*columns)]
+
+    def generate_transactions_for_cards(self, cards: List[Card]) -> List[CardTransaction]:
+        """Generate transactions for cards based on customer segments (batch engine, xem generate_transactions_frame)"""
+        transactions_df = self.generate_transactions_frame(cards)
+        columns = frame_to_python_columns(transactions_df, 'card_transactions', list(CardTransaction.__dataclass_fields__))
+        return [CardTransaction(*row) for row in zip(*columns)]
+
+    def generate_transactions_frame(self, cards: Union[pd.DataFrame, List[Card]],
+                                    rng: np.random.Generator = None,
+                                    count_rng: np.random.Generator = None) -> pd.DataFrame:
+        """Generate transactions for all cards theo batch (NumPy) - trả về DataFrame có các cột của CardTransaction
+        
+        Số giao dịch mỗi thẻ theo (segment, card status); mỗi thuộc tính (date, amount, currency,
+        type, merchant, status) được sinh một lần cho toàn bộ bảng. Số giao dịch lấy từ count_rng
+        (một uniform mỗi thẻ) và mỗi giao dịch dùng đúng một hàng uniforms, nên kết quả không phụ
+        thuộc cách chia chunk. cards: bảng cards (cards_from_master) hoặc List[Card].
+        Ngày giao dịch theo vòng đời thẻ [active_date, expiry_date] tới as_of, không theo kỳ
+        START_DATE / END_DATE của savings.
+        """
+        rng = rng or self.np_rng
+        count_rng = count_rng or self.np_count_rng
+        cards_df = self._cards_to_frame(cards)
+        param = lambda key: np.array([pattern[key] for pattern in self.segment_patterns.values()], dtype=float)
+        
+        # Segment + status code của từng thẻ
+        card_segment = self._segment_codes_from_customer_codes(cards_df['customer_code'].astype(object))
+        activity_codes = {'posted': 0, 'decline service': 1, 'closed': 2}
+        activity = cards_df['status'].astype(object).map(lambda status: self.card_status_activity.get(status, status))
+        card_status = activity.map(activity_codes).fillna(3).to_numpy(dtype=np.int64)
+        
+        # Số giao dịch mỗi thẻ: khoảng [min, max] tra bảng theo (segment, status);
+        # thẻ chưa kích hoạt (hoặc kích hoạt sau as_of) không có giao dịch
+        count_bounds = self._transaction_count_bounds()
+        low = count_bounds[card_segment, card_status, 0]
+        high = count_bounds[card_segment, card_status, 1]
+        counts = low + (count_rng.random(len(cards_df)) * (high - low + 1)).astype(np.int64)
+        card_active_day = to_day_ordinals(cards_df['active_date']).astype(np.int64)
+        counts[(card_active_day == NO_DATE) | (card_active_day > day_ordinal(self.context.as_of))] = 0
+        
+        # Mở rộng từ thẻ sang giao dịch, mỗi giao dịch một hàng uniforms
+        card_idx = np.repeat(np.arange(len(cards_df)), counts)
+        total = len(card_idx)
+        if total == 0:
+            return apply_table_dtypes(pd.DataFrame(columns=list(CardTransaction.__dataclass_fields__)),
+                                      'card_transactions', self.categories)
+        segment = card_segment[card_idx]
+        u = rng.random((total, len(self.TRANSACTION_UNIFORMS)))
+        col = {name: u[:, i] for i, name in enumerate(self.TRANSACTION_UNIFORMS)}
+        
+        # Transaction dates: rải theo cadence của segment, sort theo (card, date) bằng một lexsort
+        first_row = np.zeros(total, dtype=bool)
+        first_row[(np.cumsum(counts) - counts)[counts > 0]] = True
+        expiry_day = to_day_ordinals(cards_df['expiry_date']).astype(np.int64)
+        tran_day = self._spread_transaction_days(card_active_day[card_idx], expiry_day[card_idx],
+                                                 segment, first_row, col)
+        tran_day = tran_day[np.lexsort((tran_day, card_idx))]
+        
+        # Amount theo segment, thẻ CREDIT không vượt quá credit limit
+        min_amount = param('min_amount')[segment]
+        max_amount = param('max_amount')[segment]
+        amount = min_amount + col['amount'] * (max_amount - min_amount)
+        card_type = cards_df['card_type'].array.take(card_idx)
+        credit_limit = amount_values(cards_df['credit_limit'])[card_idx]
+        over_limit = np.asarray(card_type == 'CREDIT') & (amount > credit_limit)
+        amount[over_limit] = (min_amount + col['limit_amount'] * (credit_limit * 0.8 - min_amount))[over_limit]
+        amount = np.round(amount, 2)
+        
+        # Currency + LCY amount
+        currencies = self.currency_sampler.values
+        currency_code = self.currency_sampler.codes_from_uniform(col['currency'])
+        lcy_rates = np.array([self._calculate_lcy_amount(1, c) for c in currencies], dtype=float)
+        lcy_amount = amount * lcy_rates[currency_code]
+        
+        # Transaction type -> type name (chọn đều trong type_names của type) + CR/DR
+        tran_types = self.transaction_type_sampler.values
+        type_code = self.transaction_type_sampler.codes_from_uniform(col['type'])
+        type_names = [name for t in tran_types for name in self.transaction_types[t]['type_names']]
+        names_per_type = np.array([len(self.transaction_types[t]['type_names']) for t in tran_types])
+        names_offset = np.cumsum(names_per_type) - names_per_type
+        type_name_code = names_offset[type_code] + (col['type_name'] * names_per_type[type_code]).astype(np.int64)
+        cr_dr_codes = np.array([self.categories['cr_dr'].index(self.cr_dr_mapping[t]) for t in tran_types])
+        
+        # Merchant + description (bảng description tính trước cho mọi cặp type name x merchant)
+        merchants = self.merchant_sampler.values
+        merchant_code = self.merchant_sampler.codes_from_uniform(col['merchant'])
+        merchant_id = self.merchant_ids[(col['merchant_id'] * len(self.merchant_ids)).astype(np.int64)]
+        descriptions = np.array(
+            [[self._generate_transaction_description(name, m) for m in merchants] for name in type_names],
+            dtype=object
+        )
         
-        return all_transactions
+        # Transaction status
+        status_code = self.status_sampler.codes_from_uniform(col['status'])
+        
+        # Transaction ID: TXN_{card_id}_{seq:06d}
+        card_id = cards_df['card_id'].to_numpy(dtype=object)[card_idx]
+        seq = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        
+        # Cột ít giá trị dựng thẳng từ codes (không tạo object array cho từng row)
+        categorical = lambda codes, categories: pd.Categorical.from_codes(codes, categories=list(categories))
+        transactions_df = pd.DataFrame({
+            'tran_id': child_ids('TXN_', card_id, seq, 6),
+            'card_id': card_id,
+            'card_number': cards_df['card_number'].array.take(card_idx),
+            'customer_code': cards_df['customer_code'].array.take(card_idx),
+            'card_type': card_type,
+            'tran_amt_acy': amount,
+            'tran_amt_lcy': lcy_amount,
+            'tran_currency': categorical(currency_code, currencies),
+            'cr_dr': categorical(cr_dr_codes[type_code], self.categories['cr_dr']),
+            'tran_date': tran_day.astype(DAY_DTYPE),
+            'tran_type': categorical(type_code, tran_types),
+            'tran_type_name': categorical(type_name_code, type_names),
+            'tran_desc': descriptions[type_name_code, merchant_code],
+            'merchant_id': merchant_id,
+            'merchant_name': categorical(merchant_code, merchants),
+            'tran_status': categorical(status_code, self.status_sampler.values)
+        })
+        return apply_table_dtypes(transactions_df, 'card_transactions', self.categories, amounts='major')
+
+    def generate_transactions_for_cards_columnar(self, cards, rng: np.random.Generator = None) -> pd.DataFrame:
+        """Tên cũ của generate_transactions_frame (giữ cho code đang dùng)"""
+        return self.generate_transactions_frame(cards, rng)
+
+    def cards_to_frame(self, cards: List[Card]) -> pd.DataFrame:
+        """List[Card] -> DataFrame với dtypes của bảng cards"""
+        return apply_table_dtypes(self._cards_to_frame(cards), 'cards', self.categories)
+
+    def _cards_to_frame(self, cards) -> pd.DataFrame:
+        """Convert List[Card] to DataFrame (DataFrame đã typed được giữ nguyên)"""
+        if isinstance(cards, pd.DataFrame):
+            return cards.reset_index(drop=True)
+        # Card.credit_limit là major units
+        return apply_table_dtypes(records_to_frame(cards, Card), 'cards', self.categories,
+                                  amounts='major')
+
+    def _segment_codes_from_customer_codes(self, customer_codes: pd.Series) -> np.ndarray:
+        """Vectorized _determine_segment_from_customer_code: A_..D_ -> 0..3, còn lại -> E (4)"""
+        prefix_codes = {f"{segment}_": i for i, segment in enumerate(self.segment_patterns)}
+        return customer_codes.str[:2].map(prefix_codes).fillna(prefix_codes['E_']).to_numpy(dtype=np.int64)
+
+    def _transaction_count_bounds(self) -> np.ndarray:
+        """Bảng [segment, status, (min, max)] số giao dịch mỗi thẻ (thẻ không ACTIVE có ít giao dịch hơn)"""
+        # posted, decline service, closed, inactive
+        status_factors = [None, (0.5, 0.7), (0.2, 0.4), (0.1, 0.3)]
+        bounds = np.zeros((len(self.segment_patterns), len(status_factors), 2), dtype=np.int64)
+        for i, pattern in enumerate(self.segment_patterns.values()):
+            base_min = pattern['min_transactions']
+            base_max = pattern['max_transactions']
+            for j, factors in enumerate(status_factors):
+                if factors is None:
+                    bounds[i, j] = (base_min, base_max)
+                else:
+                    bounds[i, j] = (max(1, int(base_min * factors[0])), max(1, int(base_max * factors[1])))
+        return bounds
+
+    def _spread_transaction_days(self, active_day: np.ndarray, expiry_day: np.ndarray, segment: np.ndarray,
+                                 first_row: np.ndarray, col: Dict[str, np.ndarray]) -> np.ndarray:
+        """Batched date spreader: day ordinals cho mọi giao dịch trong một lượt (không vòng lặp Python)
+        
+        Cadence theo segment: E -> bucket 30 ngày, D -> bucket 7 ngày (chọn bucket trong thời gian
+        active rồi chọn ngày trong bucket), A/B/C -> đều trong [active, expiry]; giao dịch đầu tiên
+        của thẻ thuộc segment có recent_days <= 30 (A) nằm trong recent_days trước as_of.
+        Ngày sau as_of lùi về 1-30 ngày trước as_of; kết quả nằm trong [active_day, as_of]
+        (caller bỏ các thẻ có active_day > as_of).
+        """
+        today = day_ordinal(self.context.as_of)
+        patterns = list(self.segment_patterns.values())
+        bucket_days = np.array([30 if p.get('transactions_per_month') else 7 if p.get('transactions_per_week') else 0
+                                for p in patterns])[segment]
+        recent_days = np.array([p['recent_days'] for p in patterns])[segment]
+        
+        # Cửa sổ của mỗi giao dịch: một bucket (D, E) hoặc toàn bộ thời gian active (A, B, C)
+        span = np.maximum(expiry_day - active_day, 0)
+        bucketed = bucket_days > 0
+        bucket = np.where(bucketed, bucket_days, 1)
+        bucket_start = active_day + (col['bucket'] * np.maximum(span // bucket, 1)).astype(np.int64) * bucket
+        window_start = np.where(bucketed, bucket_start, active_day)
+        window_days = np.where(bucketed, np.maximum(np.minimum(bucket_start + bucket, expiry_day) - bucket_start, 1),
+                               span + 1)
+        tran_day = window_start + (col['day'] * window_days).astype(np.int64)
+        
+        # Recency anchor: giao dịch đầu tiên của thẻ A trong recent_days trước as_of
+        anchor = first_row & ~bucketed & (recent_days <= 30)
+        tran_day[anchor] = today - (col['recent_day'][anchor] * (recent_days[anchor] + 1)).astype(np.int64)
+        
+        # Ngày sau as_of lùi về trước as_of, rồi clamp cùng lúc vào [ngày kích hoạt, as_of]
+        future = tran_day > today
+        tran_day[future] = today - 1 - (col['future_day'][future] * 30).astype(np.int64)
+        return np.minimum(np.maximum(tran_day, active_day), today)
 
     def _determine_segment_from_customer_code(self, customer_code: str) -> str:
         """Determine segment from customer code"""
@@ -257,205 +522,6 @@ class CardTransactionGenerator:
         else:  # E_
             return 'E'
 
-    def _generate_transactions_for_card(self, card: Card, segment: str, 
-                                      start_date: datetime, end_date: datetime) -> List[CardTransaction]:
-        """Generate transactions for a specific card based on segment pattern"""
-        
-        pattern = self.segment_patterns[segment]
-        transactions = []
-        
-        # Determine number of transactions based on card status
-        base_min = pattern['min_transactions']
-        base_max = pattern['max_transactions']
-        
-        if card.status == 'posted':
-            # Active cards get full transaction count
-            num_transactions = random.randint(base_min, base_max)
-        elif card.status == 'decline service':
-            # Declined cards get fewer transactions (50-70% of normal)
-            min_txns = max(1, int(base_min * 0.5))
-            max_txns = max(1, int(base_max * 0.7))
-            num_transactions = random.randint(min_txns, max_txns)
-        elif card.status == 'closed':
-            # Closed cards get very few transactions (20-40% of normal)
-            min_txns = max(1, int(base_min * 0.2))
-            max_txns = max(1, int(base_max * 0.4))
-            num_transactions = random.randint(min_txns, max_txns)
-        else:  # inactive
-            # Inactive cards get minimal transactions (10-30% of normal)
-            min_txns = max(1, int(base_min * 0.1))
-            max_txns = max(1, int(base_max * 0.3))
-            num_transactions = random.randint(min_txns, max_txns)
-        
-        # Generate transaction dates
-        transaction_dates = self._generate_transaction_dates(
-            card.active_date, card.expiry_date, num_transactions, pattern
-        )
-        
-        for i, tran_date in enumerate(transaction_dates):
-            # Generate transaction amount
-            amount = self._generate_transaction_amount(pattern, card)
-            
-            # Generate currency
-            currency = random.choices(
-                list(self.currency_distribution.keys()),
-                weights=list(self.currency_distribution.values()),
-                k=1
-            )[0]
-            
-            # Calculate LCY amount
-            lcy_amount = self._calculate_lcy_amount(amount, currency)
-            
-            # Generate transaction type
-            tran_type = random.choices(
-                list(self.transaction_types.keys()),
-                weights=[t['weight'] for t in self.transaction_types.values()],
-                k=1
-            )[0]
-            
-            # Generate transaction type name
-            tran_type_name = random.choice(self.transaction_types[tran_type]['type_names'])
-            
-            # Generate CR/DR
-            cr_dr = self.cr_dr_mapping[tran_type]
-            
-            # Generate merchant
-            merchant_name = random.choices(
-                list(self.merchants.keys()),
-                weights=list(self.merchants.values()),
-                k=1
-            )[0]
-            merchant_id = f"MERCH_{random.randint(10000, 99999)}"
-            
-            # Generate transaction description
-            tran_desc = self._generate_transaction_description(tran_type_name, merchant_name)
-            
-            # Generate transaction status
-            tran_status = random.choices(
-                list(self.status_distribution.keys()),
-                weights=list(self.status_distribution.values()),
-                k=1
-            )[0]
-            
-            # Generate transaction ID
-            tran_id = f"TXN_{card.card_id}_{i+1:06d}"
-            
-            transaction = CardTransaction(
-                tran_id=tran_id,
-                card_id=card.card_id,
-                card_number=card.card_number,
-                customer_code=card.customer_code,
-                card_type=card.card_type,
-                tran_amt_acy=amount,
-                tran_amt_lcy=lcy_amount,
-                tran_currency=currency,
-                cr_dr=cr_dr,
-                tran_date=tran_date,
-                tran_type=tran_type,
-                tran_type_name=tran_type_name,
-                tran_desc=tran_desc,
-                merchant_id=merchant_id,
-                merchant_name=merchant_name,
-                tran_status=tran_status
-            )
-            
-            transactions.append(transaction)
-        
-        return transactions
-
-    def _generate_transaction_dates(self, active_date: datetime, expiry_date: datetime, 
-                                  num_transactions: int, pattern: Dict) -> List[datetime]:
-        """Generate transaction dates based on segment pattern"""
-        
-        current_date = datetime.now()
-        dates = []
-        
-        # Generate dates based on segment pattern
-        if pattern.get('transactions_per_month'):  # Segment E - 1-2 transactions/month
-            # Spread transactions over months
-            months_range = (expiry_date - active_date).days // 30
-            if months_range == 0:
-                months_range = 1
-            
-            for i in range(num_transactions):
-                # Random month within range
-                random_month = random.randint(0, months_range - 1)
-                month_start = active_date + timedelta(days=random_month * 30)
-                month_end = min(month_start + timedelta(days=30), expiry_date)
-                
-                # Random day within month
-                days_in_month = (month_end - month_start).days
-                random_day = random.randint(0, days_in_month - 1)
-                tran_date = month_start + timedelta(days=random_day)
-                
-                # Ensure not in future
-                if tran_date > current_date:
-                    tran_date = current_date - timedelta(days=random.randint(1, 30))
-                
-                dates.append(tran_date)
-                
-        elif pattern.get('transactions_per_week'):  # Segment D - 2-4 transactions/week
-            # Spread transactions over weeks
-            weeks_range = (expiry_date - active_date).days // 7
-            if weeks_range == 0:
-                weeks_range = 1
-            
-            for i in range(num_transactions):
-                # Random week within range
-                random_week = random.randint(0, weeks_range - 1)
-                week_start = active_date + timedelta(days=random_week * 7)
-                week_end = min(week_start + timedelta(days=7), expiry_date)
-                
-                # Random day within week
-                days_in_week = (week_end - week_start).days
-                random_day = random.randint(0, days_in_week - 1)
-                tran_date = week_start + timedelta(days=random_day)
-                
-                # Ensure not in future
-                if tran_date > current_date:
-                    tran_date = current_date - timedelta(days=random.randint(1, 30))
-                
-                dates.append(tran_date)
-                
-        else:  # Segments A, B, C - daily transactions
-            # Ensure we have at least one recent transaction
-            recent_cutoff = current_date - timedelta(days=pattern['recent_days'])
-            
-            # Generate dates within the active period
-            date_range = expiry_date - active_date
-            days_range = date_range.days
-            
-            for i in range(num_transactions):
-                if i == 0 and pattern['recent_days'] <= 30:
-                    # First transaction should be recent for A segment
-                    random_days = random.randint(0, pattern['recent_days'])
-                    tran_date = current_date - timedelta(days=random_days)
-                else:
-                    # Other transactions can be anywhere in the active period
-                    random_days = random.randint(0, days_range)
-                    tran_date = active_date + timedelta(days=random_days)
-                
-                # Ensure transaction is not in the future
-                if tran_date > current_date:
-                    tran_date = current_date - timedelta(days=random.randint(1, 30))
-                
-                dates.append(tran_date)
-        
-        # Sort dates
-        dates.sort()
-        return dates
-
-    def _generate_transaction_amount(self, pattern: Dict, card: Card) -> float:
-        """Generate transaction amount based on pattern and card constraints"""
-        
-        amount = random.uniform(pattern['min_amount'], pattern['max_amount'])
-        
-        # For credit cards, ensure amount doesn't exceed credit limit
-        if card.card_type == 'CREDIT' and amount > card.credit_limit:
-            amount = random.uniform(pattern['min_amount'], card.credit_limit * 0.8)
-        
-        return round(amount, 2)
-
     def _calculate_lcy_amount(self, amount: float, currency: str) -> float:
         """Calculate LCY amount based on currency"""
         if currency == 'VND':
@@ -490,7 +556,7 @@ class CardTransactionGenerator:
         """Generate random date between start and end"""
         time_between_dates = end_date - start_date
         days_between_dates = time_between_dates.days
-        random_number_of_days = random.randrange(days_between_dates)
+        random_number_of_days = self.rng.randrange(days_between_dates)
         random_date = start_date + timedelta(days=random_number_of_days)
         return random_date
 
@@ -502,31 +568,9 @@ class CardTransactionGenerator:
         # Ensure output directory exists
         os.makedirs("output", exist_ok=True)
         
-        # Convert transactions to list of dictionaries
-        transactions_data = []
-        for txn in transactions:
-            txn_dict = {
-                'tran_id': txn.tran_id,
-                'card_id': txn.card_id,
-                'card_number': txn.card_number,
-                'customer_code': txn.customer_code,
-                'card_type': txn.card_type,
-                'tran_amt_acy': txn.tran_amt_acy,
-                'tran_amt_lcy': txn.tran_amt_lcy,
-                'tran_currency': txn.tran_currency,
-                'cr_dr': txn.cr_dr,
-                'tran_date': txn.tran_date.strftime('%Y-%m-%d'),
-                'tran_type': txn.tran_type,
-                'tran_type_name': txn.tran_type_name,
-                'tran_desc': txn.tran_desc,
-                'merchant_id': txn.merchant_id,
-                'merchant_name': txn.merchant_name,
-                'tran_status': txn.tran_status
-            }
-            transactions_data.append(txn_dict)
-        
-        # Create DataFrame and export to CSV
-        df = pd.DataFrame(transactions_data)
+        # Ghi theo cột (không tạo dict cho từng transaction)
+        df = records_to_frame(transactions, CardTransaction)
+        df['tran_date'] = date_strings(df['tran_date'])
         df.to_csv(output_file, index=False)
         
         print(f"[SUCCESS] Exported {len(transactions)} card transactions to {output_file}")
@@ -534,12 +578,7 @@ class CardTransactionGenerator:
 
 def main():
     """Test Card Transaction Generator"""
-    generator = CardTransactionGenerator()
-    
-    # Test data
-    start_date = datetime(2023, 1, 1)
-    end_date = datetime(2024, 12, 31)
-    
+    generator = CardTransactionGenerator(test_config(SHOW_PROGRESS=True))
     
     # Load cards from CSV file generated by card_generator.py
     print("Loading cards from CSV file...")
@@ -553,7 +592,7 @@ def main():
     
     # Generate transactions
     print("Generating card transactions...")
-    transactions = generator.generate_transactions_for_cards(cards, start_date, end_date)
+    transactions = generator.generate_transactions_for_cards(cards)
     print(f"Generated {len(transactions)} card transactions")
     
     # Export to CSV (only transactions, not cards)
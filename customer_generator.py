@@ -7,14 +7,18 @@ D(20%) - Stable Savers - Khách hàng tiết kiệm ổn định
 E(30%) - New/Occasional Users - Khách hàng mới hoặc thỉnh thoảng sử dụng
 """
 
-import random
+import numpy as np
 import pandas as pd
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import datetime
+from typing import List, Dict, Iterator
 from dataclasses import dataclass
 
-from test_config import test_config
+from test_config import test_config, GenerationContext
+from samplers import WeightedSampler, compile_list_samplers
+from id_allocator import format_ids
+from table_dtypes import (apply_table_dtypes, frame_to_python_columns, records_to_frame, ordered_categories,
+                          DAY_DTYPE, day_ordinal, date_strings)
 
 @dataclass
 class NewCustomer:
@@ -36,9 +40,18 @@ class NewCustomer:
 class NewCustomerGenerator:
     """New Customer Generator với phân khúc RFM mới"""
     
-    def __init__(self, config: test_config = None):
+    # Mỗi customer dùng một hàng uniforms, theo thứ tự cột này
+    CUSTOMER_UNIFORMS = ('gender', 'name', 'age_group', 'age', 'city_type', 'city', 'marital_status',
+                         'nationality', 'occupation', 'income_range', 'income_currency', 'source_of_income',
+                         'status')
+    
+    def __init__(self, config: test_config = None, context: GenerationContext = None):
         self.config = config or test_config()
         
+        # RNG + clock context (substream riêng cho bảng customers)
+        self.context = context or self.config.make_context()
+        self.np_rng = self.context.numpy('customers')
+        
         # RFM segment distribution
         self.segment_distribution = {
             'A': 0.10,  # 10% - Champions/VIPs
@@ -66,6 +79,15 @@ class NewCustomerGenerator:
             'E': ['Sinh vien', 'Cong nhan / lao dong pho thong', 'Noi tro', 'Nhan vien van phong']
         }
         
+        # Occupation weights by RFM segment (cùng thứ tự với occupation_by_segment)
+        self.occupation_weights_by_segment = {
+            'A': [0.3, 0.3, 0.2, 0.2],  # Champions/VIPs - nghề nghiệp thuộc top thu nhập cao
+            'B': [0.3, 0.3, 0.2, 0.2],  # Potential Loyalists - nghề nghiệp trung cấp
+            'C': [0.3, 0.3, 0.2, 0.2],  # At-Risk High Value - nghề nghiệp thuộc top thu nhập cao
+            'D': [0.3, 0.3, 0.2, 0.2],  # Stable Savers - nghề nghiệp ổn định
+            'E': [0.3, 0.3, 0.2, 0.2]   # New/Occasional Users - nghề nghiệp đa dạng
+        }
+        
         # Income ranges by RFM segment (phụ thuộc vào account_id và transaction amount)
         self.income_ranges_by_segment = {
             'A': ['50-100 trieu', '100-200 trieu', '>200 trieu'],  # VIPs - thu nhập cao
@@ -75,6 +97,15 @@ class NewCustomerGenerator:
             'E': ['<10 trieu', '10-20 trieu']  # New/Occasional Users
         }
         
+        # Income range weights by RFM segment (cùng thứ tự với income_ranges_by_segment)
+        self.income_weights_by_segment = {
+            'A': [0.3, 0.4, 0.3],  # Champions/VIPs - thu nhập cao 50-200tr
+            'B': [0.6, 0.4],       # Potential Loyalists - thu nhập trung bình
+            'C': [0.3, 0.4, 0.3],  # At-Risk High Value - thu nhập cao nhưng có nguy cơ
+            'D': [0.6, 0.4],       # Stable Savers - thu nhập ổn định
+            'E': [0.7, 0.3]        # New/Occasional Users - thu nhập thấp
+        }
+        
         # Source of income by RFM segment
         self.source_of_income_by_segment = {
             'A': ['Kinh doanh', 'Dau tu', 'Luong cao cap'],
@@ -84,6 +115,15 @@ class NewCustomerGenerator:
             'E': ['Luong', 'Ho tro gia dinh', 'Khac']
         }
         
+        # Source of income weights by RFM segment (cùng thứ tự với source_of_income_by_segment)
+        self.source_of_income_weights_by_segment = {
+            'A': [0.4, 0.4, 0.2],  # Champions/VIPs - đa dạng nguồn thu nhập
+            'B': [0.5, 0.3, 0.2],  # Potential Loyalists - cân bằng
+            'C': [0.4, 0.4, 0.2],  # At-Risk High Value - đa dạng nguồn thu nhập
+            'D': [0.8, 0.2],       # Stable Savers - chủ yếu lương và tiết kiệm
+            'E': [0.5, 0.3, 0.2]   # New/Occasional Users - đa dạng nguồn
+        }
+        
         # Vietnamese names
         self.vietnamese_names = {
             'male': [
@@ -127,276 +167,208 @@ class NewCustomerGenerator:
             'Tra Vinh', 'Tuyen Quang', 'Vinh Long', 'Vinh Phuc', 'Yen Bai'
         ]
         
+        # City type weights by RFM segment (phụ thuộc vào channel_txn)
+        self.city_types = ['major', 'secondary', 'other']
+        self.city_type_weights_by_segment = {
+            'A': [0.6, 0.3, 0.1],  # Champions/VIPs - ưu tiên thành phố lớn
+            'B': [0.6, 0.3, 0.1],  # Potential Loyalists - ưu tiên thành phố lớn
+            'C': [0.4, 0.4, 0.2],  # At-Risk High Value - thành phố lớn hoặc trung bình
+            'D': [0.3, 0.4, 0.3],  # Stable Savers - phân bố đều
+            'E': [0.2, 0.3, 0.5]   # New/Occasional Users - đa dạng, có thể ở bất kỳ đâu
+        }
+
+        # Tỷ lệ khách hàng E <30 tuổi (phần còn lại >=55 tuổi)
+        self.young_ratio_segment_e = 0.6
+
         # Channel preferences by city type
         self.channel_preferences = {
             'major': ['mobile/internet', 'qr_code', 'fund_transfer'],  # Thành phố lớn: nhiều chuyển khoản, QR
             'secondary': ['mobile/internet', 'atm', 'fund_transfer'],
             'other': ['atm', 'branch', 'mobile/internet']
         }
-
-    def generate_customers_by_count(self, num_customers: int) -> List[NewCustomer]:
-        """Generate customers by count with RFM segment distribution"""
-        customers = []
-        
-        # Calculate segment counts
-        a_count = int(num_customers * self.segment_distribution['A'])
-        b_count = int(num_customers * self.segment_distribution['B'])
-        c_count = int(num_customers * self.segment_distribution['C'])
-        d_count = int(num_customers * self.segment_distribution['D'])
-        e_count = num_customers - a_count - b_count - c_count - d_count  # Remaining for E
-        
-        print(f"[TARGET] Generating customers with RFM distribution:")
-        print(f"   A (Champions/VIPs - 10%): {a_count} customers")
-        print(f"   B (Potential Loyalists - 15%): {b_count} customers")
-        print(f"   C (At-Risk High Value - 5%): {c_count} customers")
-        print(f"   D (Stable Savers - 20%): {d_count} customers")
-        print(f"   E (New/Occasional Users - 30%): {e_count} customers")
-        
-        # Generate A segment customers
-        for i in range(a_count):
-            customer = self._generate_customer_by_segment('A', i + 1)
-            customers.append(customer)
-        
-        # Generate B segment customers
-        for i in range(b_count):
-            customer = self._generate_customer_by_segment('B', a_count + i + 1)
-            customers.append(customer)
-        
-        # Generate C segment customers
-        for i in range(c_count):
-            customer = self._generate_customer_by_segment('C', a_count + b_count + i + 1)
-            customers.append(customer)
-        
-        # Generate D segment customers
-        for i in range(d_count):
-            customer = self._generate_customer_by_segment('D', a_count + b_count + c_count + i + 1)
-            customers.append(customer)
-        
-        # Generate E segment customers
-        for i in range(e_count):
-            customer = self._generate_customer_by_segment('E', a_count + b_count + c_count + d_count + i + 1)
-            customers.append(customer)
-        
-        return customers
-
-    def _generate_customer_by_segment(self, segment: str, customer_id: int) -> NewCustomer:
-        """Generate customer by specific RFM segment"""
-        
-        # Generate customer code
-        customer_code = f"{segment}_{customer_id:06d}"
         
-        # Generate gender
-        gender = random.choice(['Nam', 'Nữ'])
-        
-        # Generate full name
-        full_name = self._generate_vietnamese_name(gender)
-        
-        # Generate age based on segment
-        age = self._generate_age_by_segment(segment)
-        dob = datetime.now() - timedelta(days=age * 365)
-        
-        # Generate city based on segment (phụ thuộc vào channel_txn)
-        city = self._generate_city_by_segment(segment)
-        
-        # Generate marital status
-        marital_status = random.choice(['Độc thân', 'Kết hôn'])
-        
-        # Generate nationality (98% người VN)
-        nationality = random.choices(['Việt Nam', 'Nước ngoài'], weights=[0.98, 0.02])[0]
-        
-        # Generate occupation based on segment (phụ thuộc vào account_id và transaction amount)
-        occupation = self._generate_occupation_by_segment(segment)
-        
-        # Generate income range based on segment (phụ thuộc vào account_id và transaction amount)
-        income_range = self._generate_income_range_by_segment(segment)
-        
-        # Generate income currency
-        income_currency = random.choices(['VND', 'USD'], weights=[0.95, 0.05])[0]
-        
-        # Generate source of income based on segment
-        source_of_income = self._generate_source_of_income_by_segment(segment)
-        
-        # Generate status
-        status = random.choices(['Active', 'Inactive', 'Closed'], weights=[0.80, 0.15, 0.05])[0]
-        
-        return NewCustomer(
-            customer_code=customer_code,
-            full_name=full_name,
-            gender=gender,
-            dob=dob,
-            city=city,
-            marital_status=marital_status,
-            nationality=nationality,
-            occupation=occupation,
-            income_range=income_range,
-            income_currency=income_currency,
-            source_of_income=source_of_income,
-            status=status,
-            customer_segment=segment
+        # Compiled samplers (alias table) - compile một lần, batch engine map uniforms -> codes
+        self.occupation_samplers = compile_list_samplers(
+            self.occupation_by_segment, self.occupation_weights_by_segment
         )
+        self.income_range_samplers = compile_list_samplers(
+            self.income_ranges_by_segment, self.income_weights_by_segment
+        )
+        self.source_of_income_samplers = compile_list_samplers(
+            self.source_of_income_by_segment, self.source_of_income_weights_by_segment
+        )
+        self.city_type_samplers = compile_list_samplers(
+            {segment: self.city_types for segment in self.city_type_weights_by_segment},
+            self.city_type_weights_by_segment
+        )
+        self.nationality_sampler = WeightedSampler(['Việt Nam', 'Nước ngoài'], [0.98, 0.02])
+        self.income_currency_sampler = WeightedSampler(['VND', 'USD'], [0.95, 0.05])
+        self.status_sampler = WeightedSampler(['Active', 'Inactive', 'Closed'], [0.80, 0.15, 0.05])
+        
+        # Thứ tự categories cố định cho các cột Categorical (table_dtypes)
+        self.categories = {
+            'gender': ['Nam', 'Nữ'],
+            'city': self.major_cities + self.secondary_cities + self.other_cities,
+            'marital_status': ['Độc thân', 'Kết hôn'],
+            'nationality': self.nationality_sampler.values,
+            'occupation': ordered_categories(*self.occupation_by_segment.values()),
+            'income_range': ordered_categories(*self.income_ranges_by_segment.values()),
+            'income_currency': self.income_currency_sampler.values,
+            'source_of_income': ordered_categories(*self.source_of_income_by_segment.values()),
+            'status': self.status_sampler.values,
+            'customer_segment': list(self.segment_distribution),
+        }
 
-    def _generate_age_by_segment(self, segment: str) -> int:
-        """Generate age based on RFM segment"""
-        if segment == 'A':
-            # A: 30-50 tuổi - VIPs thường ở độ tuổi trung niên
-            return random.randint(30, 50)
-        elif segment == 'B':
-            # B: 25-45 tuổi - Potential Loyalists
-            return random.randint(25, 45)
-        elif segment == 'C':
-            # C: 35-55 tuổi - At-Risk High Value
-            return random.randint(35, 55)
-        elif segment == 'D':
-            # D: 40-65 tuổi - Stable Savers
-            return random.randint(40, 65)
-        else:  # E
-            # E: <30 tuổi (60%) hoặc >=55 tuổi (40%) - New/Occasional
-            if random.random() < 0.6:
-                return random.randint(18, 30)  # <30 tuổi
-            else:
-                return random.randint(55, 80)  # >=55 tuổi
+    def generate_customers_by_count(self, num_customers: int, first_id: int = 1) -> List[NewCustomer]:
+        """Legacy object API: generate_customers_frame dưới dạng List[NewCustomer] (customer_id từ first_id)"""
+        customers_df = self.generate_customers_frame(num_customers, first_id)
+        columns = frame_to_python_columns(customers_df, 'customers', list(NewCustomer.__dataclass_fields__))
+        return [NewCustomer(*row) for row in zip(*columns)]
 
-    def _generate_occupation_by_segment(self, segment: str) -> str:
-        """Generate occupation based on RFM segment (phụ thuộc vào account_id và transaction amount)"""
-        if segment == 'A':
-            # A: Champions/VIPs - nghề nghiệp thuộc top thu nhập cao
-            return random.choices(
-                self.occupation_by_segment['A'],
-                weights=[0.3, 0.3, 0.2, 0.2]
-            )[0]
-        elif segment == 'B':
-            # B: Potential Loyalists - nghề nghiệp trung cấp
-            return random.choices(
-                self.occupation_by_segment['B'],
-                weights=[0.3, 0.3, 0.2, 0.2]
-            )[0]
-        elif segment == 'C':
-            # C: At-Risk High Value - nghề nghiệp thuộc top thu nhập cao
-            return random.choices(
-                self.occupation_by_segment['C'],
-                weights=[0.3, 0.3, 0.2, 0.2]
-            )[0]
-        elif segment == 'D':
-            # D: Stable Savers - nghề nghiệp ổn định
-            return random.choices(
-                self.occupation_by_segment['D'],
-                weights=[0.3, 0.3, 0.2, 0.2]
-            )[0]
-        else:  # E
-            # E: New/Occasional Users - nghề nghiệp đa dạng
-            return random.choices(
-                self.occupation_by_segment['E'],
-                weights=[0.3, 0.3, 0.2, 0.2]
-            )[0]
+    def generate_customers_frame(self, num_customers: int, first_id: int = 1,
+                                 rng: np.random.Generator = None) -> pd.DataFrame:
+        """Generate num_customers customers with RFM segment distribution (batch engine, customer_id từ first_id)"""
+        self._print_segment_counts(self._calculate_segment_counts(num_customers))
+        return self.generate_customers_for_range(num_customers, 0, num_customers, first_id, rng)
 
-    def _generate_income_range_by_segment(self, segment: str) -> str:
-        """Generate income range based on RFM segment (phụ thuộc vào account_id và transaction amount)"""
-        if segment == 'A':
-            # A: Champions/VIPs - thu nhập cao 50-200tr
-            return random.choices(
-                self.income_ranges_by_segment['A'],
-                weights=[0.3, 0.4, 0.3]
-            )[0]
-        elif segment == 'B':
-            # B: Potential Loyalists - thu nhập trung bình
-            return random.choices(
-                self.income_ranges_by_segment['B'],
-                weights=[0.6, 0.4]
-            )[0]
-        elif segment == 'C':
-            # C: At-Risk High Value - thu nhập cao nhưng có nguy cơ
-            return random.choices(
-                self.income_ranges_by_segment['C'],
-                weights=[0.3, 0.4, 0.3]
-            )[0]
-        elif segment == 'D':
-            # D: Stable Savers - thu nhập ổn định
-            return random.choices(
-                self.income_ranges_by_segment['D'],
-                weights=[0.6, 0.4]
-            )[0]
-        else:  # E
-            # E: New/Occasional Users - thu nhập thấp
-            return random.choices(
-                self.income_ranges_by_segment['E'],
-                weights=[0.7, 0.3]
-            )[0]
+    def generate_customers_columnar(self, num_customers: int,
+                                    rng: np.random.Generator = None) -> pd.DataFrame:
+        """Tên cũ của generate_customers_frame (giữ cho code đang dùng)"""
+        return self.generate_customers_frame(num_customers, rng=rng)
 
-    def _generate_source_of_income_by_segment(self, segment: str) -> str:
-        """Generate source of income based on RFM segment"""
-        if segment == 'A':
-            # A: Champions/VIPs - đa dạng nguồn thu nhập
-            return random.choices(
-                self.source_of_income_by_segment['A'],
-                weights=[0.4, 0.4, 0.2]
-            )[0]
-        elif segment == 'B':
-            # B: Potential Loyalists - cân bằng
-            return random.choices(
-                self.source_of_income_by_segment['B'],
-                weights=[0.5, 0.3, 0.2]
-            )[0]
-        elif segment == 'C':
-            # C: At-Risk High Value - đa dạng nguồn thu nhập
-            return random.choices(
-                self.source_of_income_by_segment['C'],
-                weights=[0.4, 0.4, 0.2]
-            )[0]
-        elif segment == 'D':
-            # D: Stable Savers - chủ yếu lương và tiết kiệm
-            return random.choices(
-                self.source_of_income_by_segment['D'],
-                weights=[0.8, 0.2]
-            )[0]
-        else:  # E
-            # E: New/Occasional Users - đa dạng nguồn
-            return random.choices(
-                self.source_of_income_by_segment['E'],
-                weights=[0.5, 0.3, 0.2]
-            )[0]
+    def iter_customer_chunks(self, num_customers: int, chunk_size: int,
+                             first_id: int = 1) -> Iterator[pd.DataFrame]:
+        """Generate customers theo từng chunk (tối đa chunk_size customers mỗi chunk)
+        
+        Các chunk nối lại giống hệt generate_customers_frame (cùng rng, mỗi customer một hàng
+        uniforms), nhưng chỉ giữ một chunk trong bộ nhớ tại một thời điểm. first_id > 1: đánh số
+        tiếp sau dataset đã có (incremental mode).
+        """
+        self._print_segment_counts(self._calculate_segment_counts(num_customers))
+        for start in range(0, num_customers, chunk_size):
+            yield self.generate_customers_for_range(num_customers, start, min(start + chunk_size, num_customers),
+                                                    first_id)
 
-    def _generate_city_by_segment(self, segment: str) -> str:
-        """Generate city based on RFM segment (phụ thuộc vào channel_txn)"""
-        if segment in ['A', 'B']:
-            # A, B: Champions/VIPs và Potential Loyalists - ưu tiên thành phố lớn
-            # Thành phố lớn có nhiều chuyển khoản, QR code
-            city_type = random.choices(
-                ['major', 'secondary', 'other'],
-                weights=[0.6, 0.3, 0.1]
-            )[0]
-        elif segment == 'C':
-            # C: At-Risk High Value - có thể ở thành phố lớn hoặc trung bình
-            city_type = random.choices(
-                ['major', 'secondary', 'other'],
-                weights=[0.4, 0.4, 0.2]
-            )[0]
-        elif segment == 'D':
-            # D: Stable Savers - phân bố đều
-            city_type = random.choices(
-                ['major', 'secondary', 'other'],
-                weights=[0.3, 0.4, 0.3]
-            )[0]
-        else:  # E
-            # E: New/Occasional Users - đa dạng, có thể ở bất kỳ đâu
-            city_type = random.choices(
-                ['major', 'secondary', 'other'],
-                weights=[0.2, 0.3, 0.5]
-            )[0]
+    def generate_customers_for_range(self, num_customers: int, start: int, stop: int, first_id: int = 1,
+                                     rng: np.random.Generator = None) -> pd.DataFrame:
+        """Generate customers ở vị trí [start, stop) của dataset num_customers customers (batch NumPy engine)
+        
+        Customer thứ i (0-based) thuộc segment theo _calculate_segment_counts và có customer_code
+        {segment}_{first_id + i:06d}, nên dataset chia được thành chunks / shards độc lập. Mỗi customer
+        dùng đúng một hàng uniforms (CUSTOMER_UNIFORMS); các cột ít giá trị dựng thẳng từ codes.
+        """
+        rng = rng or self.np_rng
+        segments = list(self.segment_distribution)
+        segment_stops = np.cumsum(list(self._calculate_segment_counts(num_customers).values()))
+        position = np.arange(start, stop)
+        segment = np.searchsorted(segment_stops, position, side='right')
+        n = len(position)
+        u = rng.random((n, len(self.CUSTOMER_UNIFORMS)))
+        col = {name: u[:, i] for i, name in enumerate(self.CUSTOMER_UNIFORMS)}
+        
+        # Customer code: {segment}_{id:06d}
+        customer_code = np.empty(n, dtype=object)
+        for code, name in enumerate(segments):
+            mask = segment == code
+            if mask.any():
+                customer_code[mask] = format_ids(f"{name}_", first_id + position[mask], 6)
+        
+        # Gender + name theo giới tính
+        is_female = col['gender'] >= 0.5
+        names = {gender: np.array(self.vietnamese_names[gender], dtype=object) for gender in ('male', 'female')}
+        full_name = np.where(
+            is_female,
+            names['female'][(col['name'] * len(names['female'])).astype(np.int64)],
+            names['male'][(col['name'] * len(names['male'])).astype(np.int64)]
+        )
         
-        # Select city from chosen type
-        if city_type == 'major':
-            return random.choice(self.major_cities)
-        elif city_type == 'secondary':
-            return random.choice(self.secondary_cities)
-        else:
-            return random.choice(self.other_cities)
+        # Age theo phân khúc (E: <30 tuổi hoặc >=55 tuổi) -> dob (day ordinals)
+        (young_min, young_max), (old_min, old_max) = self.age_groups_by_segment['E']
+        age_low = np.array([self.age_groups_by_segment[name][0] if name != 'E' else 0 for name in segments])[segment]
+        age_high = np.array([self.age_groups_by_segment[name][1] if name != 'E' else 0 for name in segments])[segment]
+        is_e = segment == segments.index('E')
+        is_young = col['age_group'] < self.young_ratio_segment_e
+        age_low = np.where(is_e, np.where(is_young, young_min, old_min), age_low)
+        age_high = np.where(is_e, np.where(is_young, young_max, old_max), age_high)
+        age = age_low + (col['age'] * (age_high - age_low + 1)).astype(np.int64)
+        dob = (day_ordinal(self.context.as_of) - age * 365).astype(DAY_DTYPE)
+        
+        # City: loại thành phố theo segment, rồi chọn đều trong danh sách (categories = major + secondary + other)
+        city_lists = [self.major_cities, self.secondary_cities, self.other_cities]
+        city_sizes = np.array([len(cities) for cities in city_lists])
+        city_offsets = np.cumsum(city_sizes) - city_sizes
+        city_type = self._segment_codes(self.city_type_samplers, None, col['city_type'], segment, segments)
+        city = city_offsets[city_type] + (col['city'] * city_sizes[city_type]).astype(np.int64)
+        
+        categorical = lambda codes, column: pd.Categorical.from_codes(codes, categories=self.categories[column])
+        customers_df = pd.DataFrame({
+            'customer_code': customer_code,
+            'full_name': full_name,
+            'gender': categorical(is_female.astype(np.int64), 'gender'),
+            'dob': dob,
+            'city': categorical(city, 'city'),
+            'marital_status': categorical((col['marital_status'] >= 0.5).astype(np.int64), 'marital_status'),
+            'nationality': categorical(self.nationality_sampler.codes_from_uniform(col['nationality']), 'nationality'),
+            'occupation': categorical(self._segment_codes(self.occupation_samplers, 'occupation', col['occupation'],
+                                                          segment, segments), 'occupation'),
+            'income_range': categorical(self._segment_codes(self.income_range_samplers, 'income_range',
+                                                            col['income_range'], segment, segments), 'income_range'),
+            'income_currency': categorical(self.income_currency_sampler.codes_from_uniform(col['income_currency']),
+                                           'income_currency'),
+            'source_of_income': categorical(self._segment_codes(self.source_of_income_samplers, 'source_of_income',
+                                                                col['source_of_income'], segment, segments),
+                                            'source_of_income'),
+            'status': categorical(self.status_sampler.codes_from_uniform(col['status']), 'status'),
+            'customer_segment': categorical(segment, 'customer_segment')
+        })
+        return apply_table_dtypes(customers_df, 'customers', self.categories)
+
+    def _segment_codes(self, samplers: Dict[str, WeightedSampler], column: str, u: np.ndarray,
+                       segment: np.ndarray, segments: List[str]) -> np.ndarray:
+        """Codes từ sampler của segment mỗi row; column: map sang code trong categories của cột (None: giữ code)"""
+        codes = np.zeros(len(u), dtype=np.int64)
+        for code, name in enumerate(segments):
+            mask = segment == code
+            if not mask.any():
+                continue
+            sampler = samplers[name]
+            lookup = (np.arange(len(sampler.values)) if column is None
+                      else np.array([self.categories[column].index(value) for value in sampler.values]))
+            codes[mask] = lookup[sampler.codes_from_uniform(u[mask])]
+        return codes
 
-    def _generate_vietnamese_name(self, gender: str) -> str:
-        """Generate Vietnamese full name"""
-        if gender == 'Nam':
-            return random.choice(self.vietnamese_names['male'])
-        else:
-            return random.choice(self.vietnamese_names['female'])
+    def last_customer_ids(self, num_customers: int, first_id: int = 1) -> Dict[str, int]:
+        """customer_id cuối cùng của mỗi segment khi sinh num_customers customers từ first_id
+        (chỉ các segment có customer)"""
+        last_ids = {}
+        next_id = first_id
+        for segment, count in self._calculate_segment_counts(num_customers).items():
+            next_id += count
+            if count > 0:
+                last_ids[segment] = next_id - 1
+        return last_ids
+
+    def _calculate_segment_counts(self, num_customers: int) -> Dict[str, int]:
+        """Calculate number of customers per RFM segment (E nhận phần còn lại)"""
+        segment_counts = {}
+        for segment in ['A', 'B', 'C', 'D']:
+            segment_counts[segment] = int(num_customers * self.segment_distribution[segment])
+        segment_counts['E'] = num_customers - sum(segment_counts.values())  # Remaining for E
+        return segment_counts
+
+    def _print_segment_counts(self, segment_counts: Dict[str, int]):
+        """Print target RFM distribution"""
+        print(f"[TARGET] Generating customers with RFM distribution:")
+        print(f"   A (Champions/VIPs - 10%): {segment_counts['A']} customers")
+        print(f"   B (Potential Loyalists - 15%): {segment_counts['B']} customers")
+        print(f"   C (At-Risk High Value - 5%): {segment_counts['C']} customers")
+        print(f"   D (Stable Savers - 20%): {segment_counts['D']} customers")
+        print(f"   E (New/Occasional Users - 30%): {segment_counts['E']} customers")
+
+    def customers_to_frame(self, customers: List[NewCustomer]) -> pd.DataFrame:
+        """List[NewCustomer] (legacy object API) -> DataFrame với dtypes của bảng customers"""
+        customers_df = records_to_frame(customers, NewCustomer)
+        return apply_table_dtypes(customers_df, 'customers', self.categories)
 
     def export_customers_to_csv(self, customers: List[NewCustomer], 
                                output_file: str = "output/banking_data_customers.csv") -> str:
@@ -405,28 +377,9 @@ class NewCustomerGenerator:
         # Ensure output directory exists
         os.makedirs("output", exist_ok=True)
         
-        # Convert customers to list of dictionaries
-        customers_data = []
-        for customer in customers:
-            customer_dict = {
-                'customer_code': customer.customer_code,
-                'full_name': customer.full_name,
-                'gender': customer.gender,
-                'dob': customer.dob.strftime('%Y-%m-%d'),
-                'city': customer.city,
-                'marital_status': customer.marital_status,
-                'nationality': customer.nationality,
-                'occupation': customer.occupation,
-                'income_range': customer.income_range,
-                'income_currency': customer.income_currency,
-                'source_of_income': customer.source_of_income,
-                'status': customer.status,
-                'customer_segment': customer.customer_segment
-            }
-            customers_data.append(customer_dict)
-        
-        # Create DataFrame and export to CSV
-        df = pd.DataFrame(customers_data)
+        # Ghi theo cột (không tạo dict cho từng customer)
+        df = records_to_frame(customers, NewCustomer)
+        df['dob'] = date_strings(df['dob'])
         df.to_csv(output_file, index=False)
         
         print(f"[SUCCESS] Exported {len(customers)} customers to {output_file}")
@@ -434,7 +387,7 @@ class NewCustomerGenerator:
 
 def main():
     """Test New Customer Generator with RFM segments and export to CSV"""
-    generator = NewCustomerGenerator()
+    generator = NewCustomerGenerator(test_config(SHOW_PROGRESS=True))
     
     # Generate test customers
     customers = generator.generate_customers_by_count(1000)
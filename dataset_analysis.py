@@ -0,0 +1,308 @@
+"""
+Dataset Analysis Engine
+Phân tích dataset theo segment bằng grouped aggregations, mỗi bảng một lượt:
+segment codes (int8, từ ký tự đầu của customer_code) được tính một lần cho mỗi bảng, sau đó
+- phân phối giá trị theo segment: np.bincount trên segment code * n_values + value code
+- min / max / mean theo segment: một groupby trên các cột số của bảng
+
+Kết quả là DatasetReport (dict lồng nhau, ghi được ra JSON), in ra sau khi phân tích xong.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List
+
+from table_dtypes import amount_values, day_ordinal, to_day_ordinals
+
+ANALYSIS_SEGMENTS = ['A', 'B', 'C', 'D', 'E']
+TOP_MERCHANTS = 5
+# Các bảng được phân tích -> nhãn khi in
+TABLE_LABELS = {
+    'customers': 'Customers',
+    'accounts': 'Accounts',
+    'transactions': 'Transactions',
+    'cards': 'Cards',
+    'card_transactions': 'Card Transactions'
+}
+
+
+def segment_codes(df: pd.DataFrame, segment: pd.Series = None) -> np.ndarray:
+    """Segment code 0..4 (theo ANALYSIS_SEGMENTS) cho từng row, -1 nếu không thuộc segment nào
+
+    Mặc định segment là ký tự đầu của customer_code ({segment}_{id}).
+    """
+    if segment is None:
+        segment = df['customer_code'].str[:1]
+    codes = pd.Categorical(segment, categories=ANALYSIS_SEGMENTS).codes
+    return codes.astype(np.int8)
+
+
+def _factorize(values: pd.Series, sort: bool = False):
+    """(codes, uniques) - Categorical dùng luôn codes / categories, không cần hash lại"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), list(values.cat.categories)
+    codes, uniques = pd.factorize(values, sort=sort)
+    return codes, list(uniques)
+
+
+def grouped_counts(codes: np.ndarray, values: pd.Series, sort_by_value: bool = False) -> List[Dict]:
+    """Số lần xuất hiện mỗi giá trị trong từng segment (một lượt bincount)
+
+    Trả về list theo segment, mỗi phần tử {value: count} sắp theo count giảm dần
+    (hoặc theo value nếu sort_by_value), bỏ các giá trị không xuất hiện.
+    """
+    value_codes, uniques = _factorize(values, sort=sort_by_value)
+    n_values = max(len(uniques), 1)
+    valid = (codes >= 0) & (value_codes >= 0)
+    keys = codes[valid].astype(np.int64) * n_values + value_codes[valid]
+    table = np.bincount(keys, minlength=len(ANALYSIS_SEGMENTS) * n_values).reshape(len(ANALYSIS_SEGMENTS), n_values)
+
+    order = np.arange(n_values) if sort_by_value else None
+    result = []
+    for row in table:
+        ranked = order if sort_by_value else np.argsort(-row, kind='stable')
+        result.append({_json_value(uniques[i]): int(row[i]) for i in ranked if row[i] > 0})
+    return result
+
+
+def grouped_stats(codes: np.ndarray, columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """min / max / mean của các cột số theo segment (một groupby cho cả bảng)
+
+    Trả về list theo segment, mỗi phần tử {column: {'min', 'max', 'mean'}} (None nếu segment rỗng).
+    """
+    valid = codes >= 0
+    frame = pd.DataFrame({column: np.asarray(values)[valid] for column, values in columns.items()})
+    stats = frame.groupby(codes[valid]).agg(['min', 'max', 'mean'])
+    result = []
+    for code in range(len(ANALYSIS_SEGMENTS)):
+        segment_stats = {}
+        for column in columns:
+            if code in stats.index and not pd.isna(stats.at[code, (column, 'mean')]):
+                segment_stats[column] = {stat: float(stats.at[code, (column, stat)]) for stat in ('min', 'max', 'mean')}
+            else:
+                segment_stats[column] = None
+        result.append(segment_stats)
+    return result
+
+
+def _json_value(value):
+    """NumPy scalar -> Python scalar (key của JSON)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+@dataclass
+class DatasetReport:
+    """Kết quả phân tích dataset: counts + thống kê theo segment cho từng bảng
+
+    Mỗi mục theo segment là {segment: {...}} theo thứ tự ANALYSIS_SEGMENTS (chỉ các segment có dữ liệu).
+    """
+    as_of: str
+    counts: Dict[str, int]
+    segments: Dict[str, Dict] = field(default_factory=dict)
+    customers: Dict[str, Dict] = field(default_factory=dict)
+    accounts: Dict[str, Dict] = field(default_factory=dict)
+    transactions: Dict[str, Dict] = field(default_factory=dict)
+    cards: Dict[str, Dict] = field(default_factory=dict)
+    card_transactions: Dict[str, Dict] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def to_json(self, path: str = None) -> str:
+        """JSON của report; ghi ra file nếu có path"""
+        text = json.dumps(self.to_dict(), indent=2, ensure_ascii=False)
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            print(f"[REPORT] Analysis report saved to {path}")
+        return text
+
+    def print_report(self):
+        """In report (cùng format với analyze_dataset trước đây)"""
+        print("\n[ANALYSIS] DATASET ANALYSIS")
+        print("=" * 50)
+
+        print(f"[COUNTS] Record Counts:")
+        for table, count in self.counts.items():
+            print(f"   {TABLE_LABELS[table]}: {count:,}")
+
+        # Bảng không có trong dataset -> bỏ qua phần của bảng đó
+        if 'customers' in self.counts:
+            print(f"\n[SEGMENTS] Segment Distribution:")
+            for segment, info in self.segments.items():
+                print(f"   {segment}: {info['count']:,} ({info['percentage']:.1f}%)")
+
+            print(f"\n[AGE] Age Distribution by Segment:")
+            for segment, info in self.customers.items():
+                age = info['age']
+                print(f"   {segment}: Min={age['min']:.0f}, Max={age['max']:.0f}, Mean={age['mean']:.1f}")
+
+            print(f"\n[OCCUPATION] Occupation Distribution by Segment:")
+            for segment, info in self.customers.items():
+                print(f"   {segment}:")
+                _print_counts(info['occupation'], info['count'], "     ")
+
+            print(f"\n[INCOME] Income Distribution by Segment:")
+            for segment, info in self.customers.items():
+                print(f"   {segment}:")
+                _print_counts(info['income_range'], info['count'], "     ")
+
+        if 'accounts' in self.counts:
+            self._print_accounts()
+        if 'transactions' in self.counts:
+            self._print_transactions()
+        if 'cards' in self.counts:
+            self._print_cards()
+        if 'card_transactions' in self.counts:
+            self._print_card_transactions()
+
+    def _print_accounts(self):
+        print(f"\n[ACCOUNTS] Account Analysis by Segment:")
+        for segment, info in self.accounts.items():
+            print(f"   {segment} ({info['count']} accounts):")
+            _print_counts(info['product_type'], info['count'], "     ")
+            term_months = info['term_months']
+            if term_months:
+                print(f"     Term Months:")
+                term_total = sum(term_months.values())
+                for term, count in term_months.items():
+                    print(f"       {term} months: {count} ({count / term_total * 100:.1f}%)")
+            rates = info['interest_rate']
+            print(f"     Interest Rates: Min={rates['min']:.3f}%, Max={rates['max']:.3f}%, Mean={rates['mean']:.3f}%")
+
+    def _print_transactions(self):
+        print(f"\n[TRANSACTIONS] Transaction Analysis by Segment:")
+        for segment, info in self.transactions.items():
+            print(f"   {segment} ({info['count']} transactions):")
+            _print_stats("Amount", info['amount'])
+            print(f"     Types:")
+            _print_counts(info['transaction_type'], info['count'], "       ")
+
+    def _print_cards(self):
+        print(f"\n[CARDS] Card Analysis by Segment:")
+        for segment, info in self.cards.items():
+            print(f"   {segment} ({info['count']} cards):")
+            _print_counts(info['card_type'], info['count'], "     ")
+            if info['credit_limit']:
+                _print_stats("Credit Limits", info['credit_limit'])
+
+    def _print_card_transactions(self):
+        print(f"\n[CARD_TRANSACTIONS] Card Transaction Analysis by Segment:")
+        for segment, info in self.card_transactions.items():
+            print(f"   {segment} ({info['count']} card transactions):")
+            _print_stats("Amount", info['amount'])
+            print(f"     Types:")
+            _print_counts(info['tran_type'], info['count'], "       ")
+            print(f"     Currencies:")
+            _print_counts(info['tran_currency'], info['count'], "       ")
+            print(f"     Top Merchants:")
+            _print_counts(info['top_merchants'], info['count'], "       ")
+
+
+def _print_counts(counts: Dict, total: int, indent: str):
+    for value, count in counts.items():
+        print(f"{indent}{value}: {count} ({count / total * 100:.1f}%)")
+
+
+def _print_stats(label: str, stats: Dict):
+    print(f"     {label}: Min={stats['min']:,.0f}, Max={stats['max']:,.0f}, Mean={stats['mean']:,.0f}")
+
+
+class DatasetAnalyzer:
+    """Phân tích dataset {table: DataFrame} thành DatasetReport, mỗi bảng một lượt grouped aggregations"""
+
+    def __init__(self, as_of: datetime):
+        self.as_of = as_of
+
+    def analyze(self, dataset: Dict[str, pd.DataFrame]) -> DatasetReport:
+        """Phân tích các bảng có trong dataset (dataset có thể chỉ là một subset bảng)"""
+        report = DatasetReport(
+            as_of=self.as_of.isoformat(),
+            counts={table: len(dataset[table]) for table in TABLE_LABELS if table in dataset}
+        )
+        if 'customers' in dataset:
+            report.segments, report.customers = self._analyze_customers(dataset['customers'])
+        if 'accounts' in dataset:
+            report.accounts = self._analyze_accounts(dataset['accounts'])
+        if 'transactions' in dataset:
+            report.transactions = self._analyze_transactions(dataset['transactions'])
+        if 'cards' in dataset:
+            report.cards = self._analyze_cards(dataset['cards'])
+        if 'card_transactions' in dataset:
+            report.card_transactions = self._analyze_card_transactions(dataset['card_transactions'])
+        return report
+
+    @staticmethod
+    def _by_segment(codes: np.ndarray, **columns: List) -> Dict[str, Dict]:
+        """Ghép các kết quả theo segment (list theo ANALYSIS_SEGMENTS) thành {segment: {...}}, bỏ segment rỗng"""
+        counts = np.bincount(codes[codes >= 0], minlength=len(ANALYSIS_SEGMENTS))
+        return {
+            segment: {'count': int(counts[i]), **{name: values[i] for name, values in columns.items()}}
+            for i, segment in enumerate(ANALYSIS_SEGMENTS) if counts[i] > 0
+        }
+
+    def _analyze_customers(self, customers_df: pd.DataFrame):
+        codes = segment_codes(customers_df, customers_df['customer_segment'])
+        dob = to_day_ordinals(customers_df['dob']).astype(np.int64)
+        ages = (day_ordinal(self.as_of) - dob) // 365
+        customers = self._by_segment(
+            codes,
+            age=[stats['age'] for stats in grouped_stats(codes, {'age': ages})],
+            occupation=grouped_counts(codes, customers_df['occupation']),
+            income_range=grouped_counts(codes, customers_df['income_range'])
+        )
+        total = len(customers_df)
+        segments = {
+            segment: {'count': info['count'], 'percentage': info['count'] / total * 100}
+            for segment, info in sorted(customers.items(), key=lambda item: -item[1]['count'])
+        }
+        return segments, customers
+
+    def _analyze_accounts(self, accounts_df: pd.DataFrame) -> Dict[str, Dict]:
+        codes = segment_codes(accounts_df)
+        term_months = accounts_df['term_months']
+        term_codes = np.where(term_months.to_numpy() > 0, codes, -1).astype(np.int8)
+        return self._by_segment(
+            codes,
+            product_type=grouped_counts(codes, accounts_df['product_type']),
+            term_months=grouped_counts(term_codes, term_months, sort_by_value=True),
+            interest_rate=[stats['interest_rate'] for stats in
+                           grouped_stats(codes, {'interest_rate': accounts_df['interest_rate'].to_numpy(dtype=float)})]
+        )
+
+    def _analyze_transactions(self, transactions_df: pd.DataFrame) -> Dict[str, Dict]:
+        codes = segment_codes(transactions_df)
+        return self._by_segment(
+            codes,
+            amount=[stats['amount'] for stats in
+                    grouped_stats(codes, {'amount': amount_values(transactions_df['amount'])})],
+            transaction_type=grouped_counts(codes, transactions_df['transaction_type'])
+        )
+
+    def _analyze_cards(self, cards_df: pd.DataFrame) -> Dict[str, Dict]:
+        codes = segment_codes(cards_df)
+        # Credit limit chỉ tính trên thẻ CREDIT (amount: minor units -> major units)
+        credit_codes = np.where((cards_df['card_type'] == 'CREDIT').to_numpy(), codes, -1).astype(np.int8)
+        return self._by_segment(
+            codes,
+            card_type=grouped_counts(codes, cards_df['card_type']),
+            credit_limit=[stats['credit_limit'] for stats in
+                          grouped_stats(credit_codes, {'credit_limit': amount_values(cards_df['credit_limit'])})]
+        )
+
+    def _analyze_card_transactions(self, card_transactions_df: pd.DataFrame) -> Dict[str, Dict]:
+        codes = segment_codes(card_transactions_df)
+        merchants = grouped_counts(codes, card_transactions_df['merchant_name'])
+        return self._by_segment(
+            codes,
+            amount=[stats['amount'] for stats in
+                    grouped_stats(codes, {'amount': amount_values(card_transactions_df['tran_amt_acy'])})],
+            tran_type=grouped_counts(codes, card_transactions_df['tran_type']),
+            tran_currency=grouped_counts(codes, card_transactions_df['tran_currency']),
+            top_merchants=[dict(list(counts.items())[:TOP_MERCHANTS]) for counts in merchants]
+        )
@@ -0,0 +1,63 @@
+"""
+ID Allocator dùng chung cho các generator
+Cấp integer keys theo block liên tiếp (allocate(n) trả về cả một range), format sang
+display ID dạng PREFIX + số zero-padded theo kiểu vectorized.
+
+Mỗi shard (parallel mode) có một key space riêng [shard_index * SHARD_ID_STRIDE, ...),
+nên ID không trùng giữa các shard mà không cần phối hợp giữa các process.
+Trong một generator, keys được cấp theo thứ tự sinh nên streaming mode cho cùng ID
+với mọi cách chia chunk.
+"""
+
+import numpy as np
+from typing import Tuple
+
+# Số key tối đa mỗi shard (10 tỷ); ID_WIDTH chữ số đủ cho 10_000 shards
+SHARD_ID_STRIDE = 10 ** 10
+ID_WIDTH = 14
+
+
+def format_ids(prefix: str, keys: np.ndarray, width: int = ID_WIDTH) -> np.ndarray:
+    """Vectorized f"{prefix}{key:0{width}d}" -> object array"""
+    digits = np.char.zfill(np.asarray(keys, dtype=np.int64).astype(str), width)
+    return np.char.add(prefix, digits).astype(object)
+
+
+def child_ids(prefix: str, parent_ids: np.ndarray, seq: np.ndarray, width: int) -> np.ndarray:
+    """Vectorized f"{prefix}{parent_id}_{seq:0{width}d}" (ID theo parent, ví dụ ACC_A_000001_01)"""
+    parents = np.asarray(parent_ids, dtype=object).astype(str)
+    suffix = np.char.zfill(np.asarray(seq, dtype=np.int64).astype(str), width)
+    return np.char.add(np.char.add(prefix, parents), np.char.add('_', suffix)).astype(object)
+
+
+class IdAllocator:
+    """Cấp integer surrogate keys theo block, không trùng trong key space của shard"""
+
+    def __init__(self, prefix: str, start: int = 0, width: int = ID_WIDTH):
+        self.prefix = prefix
+        self.width = width
+        self.start = start
+        self.next_key = start
+
+    def allocate(self, n: int) -> np.ndarray:
+        """Cấp n keys liên tiếp [next_key, next_key + n)"""
+        if self.next_key + n > self.start + SHARD_ID_STRIDE:
+            raise OverflowError(f"{self.prefix} key space của shard đã hết ({SHARD_ID_STRIDE:,} keys)")
+        keys = np.arange(self.next_key, self.next_key + n, dtype=np.int64)
+        self.next_key += n
+        return keys
+
+    def format(self, keys: np.ndarray) -> np.ndarray:
+        """Display IDs cho keys"""
+        return format_ids(self.prefix, keys, self.width)
+
+    def allocate_ids(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Cấp n keys, trả về (integer keys, display IDs)"""
+        keys = self.allocate(n)
+        return keys, self.format(keys)
+
+    def next_id(self) -> str:
+        """Một display ID (scalar path)"""
+        key = self.next_key
+        self.allocate(1)
+        return f"{self.prefix}{key:0{self.width}d}"
@@ -0,0 +1,136 @@
+"""
+Ledger Engine cho saving transactions
+Sắp xếp toàn bộ bảng transactions một lần theo (account, ngày), tính signed amount
+(deposit +, withdrawal -) và grouped cumulative sum để có running balance sau mỗi transaction
+và current_balance cuối kỳ của mỗi account trong một lần vectorized.
+
+Overdraft policy cho các withdrawal làm số dư âm:
+- allow: giữ nguyên (số dư có thể âm)
+- clamp: giảm withdrawal xuống đúng số dư hiện có (số dư về 0)
+- redraw: sinh lại amount của withdrawal trong khoảng [0, số dư hiện có)
+Số dư hiện có không bao giờ âm: số dư đầu kỳ âm (opening_balances) được giữ nguyên trong balance
+nhưng withdrawal chỉ rút được từ phần dương, không bị đổi dấu thành deposit.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+from table_dtypes import to_day_ordinals
+
+DEPOSIT_TYPES = ('Deposit', 'Fund Transfer')
+WITHDRAWAL_TYPES = ('Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction')
+OVERDRAFT_POLICIES = ('allow', 'clamp', 'redraw')
+
+
+def signed_amounts(transaction_type: np.ndarray, amount: np.ndarray) -> np.ndarray:
+    """Deposit -> +amount, withdrawal -> -amount, loại khác -> 0"""
+    transaction_type = pd.Series(np.asarray(transaction_type, dtype=object), dtype=object)
+    sign = (transaction_type.isin(DEPOSIT_TYPES).to_numpy(dtype=np.int64)
+            - transaction_type.isin(WITHDRAWAL_TYPES).to_numpy(dtype=np.int64))
+    return sign * np.asarray(amount, dtype=np.int64)
+
+
+def _grouped_cumsum(values: np.ndarray, group_starts: np.ndarray, group_sizes: np.ndarray) -> np.ndarray:
+    """Cumulative sum trong từng group liên tiếp (rows đã sort theo group)"""
+    total = np.cumsum(values)
+    offset = np.repeat(total[group_starts] - values[group_starts], group_sizes)
+    return total - offset
+
+
+def _clamp_withdrawals(signed: np.ndarray, opening: np.ndarray, group: np.ndarray,
+                       group_starts: np.ndarray, group_sizes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Clamp withdrawals theo số dư hiện có, trả về (signed amounts sau khi clamp, số dư hiện có trước mỗi row)
+
+    Lindley recursion b_t = max(b_{t-1} + x_t, 0) cho withdrawals: b_t = S_t - min(0, min_{k<=t} S_k),
+    S = số dư khi không clamp, tính từ opening cắt về >= 0 nên số dư hiện có luôn >= 0.
+    """
+    start = np.maximum(opening, 0)
+    balance = start[group] + _grouped_cumsum(signed, group_starts, group_sizes)
+    running_min = pd.Series(balance).groupby(group).cummin().to_numpy()
+    balance = balance - np.minimum(running_min, 0)
+    # Số dư trước mỗi transaction (row đầu mỗi account: opening)
+    available = np.empty(len(signed), dtype=np.int64)
+    available[1:] = balance[:-1]
+    available[group_starts] = start
+    return np.where(signed < 0, balance - available, signed), available
+
+
+def apply_ledger(transactions_df: pd.DataFrame, opening_balances: pd.Series = None,
+                 overdraft: str = 'allow', rng: np.random.Generator = None) -> Tuple[pd.DataFrame, pd.Series]:
+    """Tính running balance + số dư cuối kỳ, trả về (transactions_df, final_balances)
+
+    transactions_df cần các cột account_id, transaction_date, transaction_type, amount;
+    kết quả giữ nguyên thứ tự rows, cột balance là số dư sau mỗi transaction (clamp/redraw
+    thì amount, tran_amt_acy, tran_amt_lcy cũng được cập nhật). opening_balances: số dư đầu
+    kỳ theo account_id (mặc định 0). final_balances: index account_id, chỉ gồm các account
+    có transaction. Transactions cùng ngày giữ thứ tự của input. Số tiền là số nguyên, balance,
+    opening_balances và final_balances cùng đơn vị với amount (bảng typed: minor units).
+    """
+    if overdraft not in OVERDRAFT_POLICIES:
+        raise ValueError(f"Unknown overdraft policy '{overdraft}', expected one of {OVERDRAFT_POLICIES}")
+
+    transactions_df = transactions_df.copy()
+    n = len(transactions_df)
+    if n == 0:
+        transactions_df['balance'] = pd.Series(dtype=np.int64)
+        return transactions_df, pd.Series(dtype=np.int64, index=pd.Index([], name='account_id'))
+
+    # Sort một lần theo (account, ngày); lexsort stable nên cùng ngày giữ thứ tự input
+    account_codes, account_ids = pd.factorize(transactions_df['account_id'].to_numpy(dtype=object))
+    dates = to_day_ordinals(transactions_df['transaction_date'])
+    order = np.lexsort((dates, account_codes))
+    group = account_codes[order]
+    group_sizes = np.bincount(group, minlength=len(account_ids))
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
+
+    opening = np.zeros(len(account_ids), dtype=np.int64)
+    if opening_balances is not None:
+        opening = (pd.Series(np.asarray(account_ids, dtype=object), dtype=object).map(opening_balances)
+                   .fillna(0).to_numpy(dtype=float).round().astype(np.int64))
+
+    signed = signed_amounts(transactions_df['transaction_type'].to_numpy(dtype=object),
+                            transactions_df['amount'].to_numpy())[order]
+    original_signed = signed.copy()
+    # Uniform cho redraw: một giá trị mỗi row theo thứ tự input (không phụ thuộc cách chia chunk)
+    redraw_u = rng.random(n)[order] if overdraft == 'redraw' and rng is not None else None
+
+    if overdraft == 'redraw' and redraw_u is None:
+        raise ValueError("overdraft='redraw' requires rng")
+    if overdraft != 'allow':
+        clamped, available = _clamp_withdrawals(signed, opening, group, group_starts, group_sizes)
+        if overdraft == 'clamp':
+            signed = clamped
+        else:
+            # Một lượt: mọi withdrawal bị clamp (overdrawn) được sinh lại trong [0, số dư hiện có) theo
+            # đường clamp. Withdrawals sau đó chỉ rút ít hơn nên số dư thực tế >= đường clamp >= 0
+            rows = np.flatnonzero(clamped != signed)
+            signed[rows] = -(redraw_u[rows] * available[rows]).astype(np.int64)
+
+    balance = opening[group] + _grouped_cumsum(signed, group_starts, group_sizes)
+
+    # Ghi kết quả về thứ tự rows ban đầu
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[order] = np.arange(n)
+    transactions_df['balance'] = balance[inverse]
+
+    if overdraft != 'allow':
+        new_amount = np.abs(signed)[inverse]
+        old_amount = transactions_df['amount'].to_numpy(dtype=np.int64)
+        changed = new_amount != np.abs(original_signed)[inverse]
+        if changed.any():
+            # Giữ tỷ giá lcy/acy của từng transaction
+            rate = np.ones(n)
+            if 'tran_amt_lcy' in transactions_df:
+                lcy = transactions_df['tran_amt_lcy'].to_numpy(dtype=float)
+                rate = np.divide(lcy, old_amount, out=np.ones(n), where=old_amount != 0)
+                transactions_df['tran_amt_lcy'] = np.where(
+                    changed, np.round(new_amount * rate), lcy).astype(np.int64)
+            transactions_df['amount'] = np.where(changed, new_amount, old_amount)
+            if 'tran_amt_acy' in transactions_df:
+                transactions_df['tran_amt_acy'] = transactions_df['amount']
+
+    last_rows = group_starts + group_sizes - 1
+    final_balances = pd.Series(balance[last_rows],
+                               index=pd.Index(np.asarray(account_ids, dtype=object), name='account_id'))
+    return transactions_df, final_balances
@@ -5,309 +5,506 @@ Y(30%) - Khách hàng trung bình
 Z(20%) - Khách hàng ít tiền
 """
 
+import numpy as np
 import pandas as pd
-import random
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
 import os
 
-from test_config import test_config
-from customer_generator import NewCustomerGenerator, NewCustomer
-from transaction_generator import NewTransactionGenerator, NewTransaction
-from account_generator import NewAccountGenerator, NewAccount
+from test_config import test_config, GenerationContext
+from customer_generator import NewCustomerGenerator
+from saving_transaction_generator import NewTransactionGenerator, NewTransaction
+from saving_account_generator import NewAccountGenerator, NewAccount
 from card_transaction_generator import CardTransactionGenerator, Card, CardTransaction
 from card_generator import CardGenerator
+from output_writers import (open_table_writer, write_table, concatenate_parts, output_path, read_table,
+                            replace_table)
+from table_dtypes import apply_table_dtypes, with_datetime_dates
+from run_manifest import RunManifest, manifest_path
+from pipeline import Stage, StageGraph
+from dataset_analysis import DatasetAnalyzer, DatasetReport
+from run_metrics import RunMetrics, GenerationHooks, peak_rss_mb
+from progress import make_progress
 
 class NewMainGenerator:
     """New Main Generator với flow CUSTOMER → TRANSACTION → ACCOUNT"""
     
-    def __init__(self, config: test_config = None):
+    # Các bảng được ghi ở streaming/parallel mode
+    TABLES = ['customers', 'accounts', 'transactions', 'cards', 'card_transactions', 'cards_from_txn']
+    
+    def __init__(self, config: test_config = None, context: GenerationContext = None,
+                 hooks: List[GenerationHooks] = None):
         self.config = config or test_config()
-        self.customer_generator = NewCustomerGenerator(self.config)
-        self.transaction_generator = NewTransactionGenerator(self.config)
-        self.account_generator = NewAccountGenerator(self.config)
-        self.card_transaction_generator = CardTransactionGenerator(self.config)
-        self.card_generator = CardGenerator(self.config)
+        # Metrics theo stage (wall/CPU time, rows) + peak memory của run + hooks
+        self.metrics = RunMetrics(hooks)
+        # Một context (seed + as_of) dùng chung, mỗi generator lấy substream riêng
+        self.context = context or self.config.make_context()
+        self.customer_generator = NewCustomerGenerator(self.config, self.context)
+        self.transaction_generator = NewTransactionGenerator(self.config, self.context)
+        self.account_generator = NewAccountGenerator(self.config, self.context)
+        # Card master sinh cards một lần; card transactions được sinh trên master đó
+        self.card_generator = CardGenerator(self.config, self.context)
+        self.card_transaction_generator = CardTransactionGenerator(self.config, self.context, self.card_generator)
+        self.stage_graph = self._build_stage_graph()
+
+    def _build_stage_graph(self) -> StageGraph:
+        """Stage DAG: customers -> savings branch (accounts, transactions, balances) + card branch (card master,
+        cards projection, card transactions)"""
+        start_date, end_date = self.config.START_DATE, self.config.END_DATE
+        customer_generator = self.customer_generator
+        account_generator = self.account_generator
+        card_transaction_generator = self.card_transaction_generator
+        return StageGraph([
+            Stage('customers',
+                  customer_generator.generate_customers_frame,
+                  ['num_customers'], ['customers'], "Generating customers"),
+            # Savings branch
+            Stage('accounts',
+                  lambda customers: account_generator.generate_accounts_frame(customers, start_date, end_date),
+                  ['customers'], ['opened_accounts'], "Generating accounts based on customer segments"),
+            Stage('transactions',
+                  lambda opened_accounts: self.transaction_generator.generate_transactions_frame(
+                      opened_accounts, start_date, end_date),
+                  ['opened_accounts'], ['posted_transactions'],
+                  "Generating transactions based on customer behavior"),
+            # Ledger: running balance + current_balance
+            Stage('update_account_balances',
+                  lambda opened_accounts, posted_transactions: self._update_balances(
+                      opened_accounts, posted_transactions),
+                  ['opened_accounts', 'posted_transactions'], ['accounts', 'transactions'],
+                  "Updating account balances", rows_from='transactions'),
+            # Card branch: card master (bảng cards_from_txn) sinh một lần, cards là projection của master
+            Stage('card_master',
+                  lambda customers: self.card_generator.generate_card_master_frame(customers, start_date, end_date),
+                  ['customers'], ['cards_from_txn'], "Generating card master for customers"),
+            Stage('cards', card_transaction_generator.cards_from_master,
+                  ['cards_from_txn'], ['cards'], "Projecting cards from card master"),
+            # Batch NumPy theo cột -> DataFrame typed (không tạo CardTransaction objects)
+            Stage('card_transactions',
+                  card_transaction_generator.generate_transactions_frame,
+                  ['cards'], ['card_transactions'], "Generating card transactions")
+        ])
+
+    def _update_balances(self, accounts_df: pd.DataFrame, transactions_df: pd.DataFrame):
+        accounts_df, transactions_df = self.account_generator.update_account_balances_frame(
+            accounts_df, transactions_df
+        )
+        return accounts_df.reset_index(drop=True), transactions_df
+
+    def resolve_tables(self, tables: List[str] = None) -> List[str]:
+        """Bảng cần sinh: tables > config.TABLES > tất cả, theo thứ tự TABLES"""
+        tables = tables or self.config.TABLES or self.TABLES
+        unknown = [table for table in tables if table not in self.TABLES]
+        if unknown:
+            raise ValueError(f"Unknown table(s) {unknown}, expected a subset of {self.TABLES}")
+        return [table for table in self.TABLES if table in tables]
 
-    def generate_balanced_dataset(self, num_customers: int) -> Dict[str, pd.DataFrame]:
-        """Generate balanced dataset với flow mới"""
+    def generate_balanced_dataset(self, num_customers: int, tables: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """Generate balanced dataset với flow mới
+        
+        tables: chỉ sinh các bảng này (mặc định config.TABLES / tất cả), các stage không cần
+        được bỏ qua; savings branch và card branch chạy song song (config.STAGE_WORKERS).
+        Cột date của các bảng trả về là datetime64[ns] (day ordinals chỉ dùng bên trong engines / writers).
+        """
+        tables = self.resolve_tables(tables)
         
         print(f"[START] Starting NEW BALANCED dataset generation with {num_customers} customers")
         print(f"[TIME] Period: {self.config.START_DATE.strftime('%Y-%m-%d')} to {self.config.END_DATE.strftime('%Y-%m-%d')}")
         print(f"[TARGET] Target segments: A(10%), B(15%), C(5%), D(20%), E(30%)")
-        print(f"[FLOW] Flow: CUSTOMER -> ACCOUNT -> TRANSACTION -> CARD -> CARD_TRANSACTION")
-
-        # STEP 1: Generate customers trước
-        print("\n[STEP 1] Generating customers...")
-        customers = self.customer_generator.generate_customers_by_count(num_customers)
-        print(f"   [SUCCESS] Generated {len(customers)} customers")
+        print(f"[FLOW] Flow: CUSTOMER -> ACCOUNT -> TRANSACTION | CUSTOMER -> CARD_MASTER -> CARD_TRANSACTION")
+        print(f"[TABLES] {', '.join(tables)}")
         
-        # Convert customers to dict for easier processing
-        customers_dict = [customer.__dict__ for customer in customers]
+        dataset = self.stage_graph.run(tables, {'num_customers': num_customers},
+                                       self.config.STAGE_WORKERS, self.metrics, verbose=True)
+        return {table: with_datetime_dates(df, table) for table, df in dataset.items()}
 
-        # STEP 2: Generate accounts dựa trên customer segments
-        print("\n[STEP 2] Generating accounts based on customer segments...")
-        accounts = self.account_generator.generate_accounts_for_customers(
-            customers_dict, self.config.START_DATE, self.config.END_DATE
-        )
-        print(f"   [SUCCESS] Generated {len(accounts)} accounts")
+    def generate_streaming_dataset(self, num_customers: int, chunk_size: int = 10_000,
+                                   output_prefix: str = "output/banking_data",
+                                   output_format: str = None, tables: List[str] = None) -> Dict[str, str]:
+        """Generate dataset theo từng chunk customers và ghi nối (append) thẳng vào output files
+        
+        Mỗi chunk chạy các stage cần cho tables (mặc định: đủ flow CUSTOMER -> ACCOUNT -> TRANSACTION
+        -> CARD_MASTER -> CARD_TRANSACTION) rồi được ghi ra file (CSV chunk / Parquet row group /
+        Arrow record batch) và giải phóng, nên bộ nhớ tối đa phụ thuộc vào chunk_size chứ không phụ thuộc
+        vào num_customers. Customer codes giống hệt generate_balanced_dataset.
+        """
+        output_format = output_format or self.config.OUTPUT_FORMAT
+        tables = self.resolve_tables(tables)
         
-        # Convert accounts to dict for easier processing
-        accounts_dict = [account.__dict__ for account in accounts]
+        print(f"[START] Starting STREAMING dataset generation with {num_customers} customers (chunk_size={chunk_size})")
+        print(f"[TIME] Period: {self.config.START_DATE.strftime('%Y-%m-%d')} to {self.config.END_DATE.strftime('%Y-%m-%d')}")
+        
+        output_files, row_counts = self._stream_customer_chunks(num_customers, chunk_size, output_prefix,
+                                                                output_format, tables)
+        self._write_manifest(self._new_manifest(num_customers, output_prefix, output_format, tables, row_counts))
+        self._write_configured_report(output_files)
+        return output_files
 
-        # STEP 3: Generate transactions dựa trên customer behavior
-        print("\n[STEP 3] Generating transactions based on customer behavior...")
-        transactions = self.transaction_generator.generate_transactions_for_accounts(
-            accounts_dict, self.config.START_DATE, self.config.END_DATE
-        )
-        print(f"   [SUCCESS] Generated {len(transactions)} transactions")
+    def _stream_customer_chunks(self, num_customers: int, chunk_size: int, output_prefix: str, output_format: str,
+                                tables: List[str], first_customer_id: int = 1,
+                                append: bool = False) -> Tuple[Dict[str, str], Dict[str, int]]:
+        """Sinh + ghi từng chunk customers (customer_id từ first_customer_id), trả về (output_files, row_counts)
+        
+        append: ghi nối vào output files đã có thay vì ghi đè (incremental mode).
+        """
+        os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+        output_files = {table: output_path(output_prefix, table, output_format) for table in tables}
+        row_counts = {table: 0 for table in output_files}
+        writers = {
+            table: open_table_writer(output_format, path, table, self.config.OUTPUT_COMPRESSION, append)
+            for table, path in output_files.items()
+        }
+        # Progress theo chunk (customers đã ghi / tổng, throughput, ETA)
+        progress = make_progress(self.config, "customers written", num_customers)
+        
+        try:
+            chunks = self.customer_generator.iter_customer_chunks(num_customers, chunk_size, first_customer_id)
+            chunk_index = 0
+            while True:
+                with self.metrics.stage('customers') as run:
+                    customers = next(chunks, None)
+                    run.rows = 0 if customers is None else len(customers)
+                if customers is None:
+                    break
+                
+                chunk_tables = self._generate_chunk_tables(customers, tables)
+                chunk_counts = {}
+                for table, frame in chunk_tables.items():
+                    with self.metrics.stage(f'export_{table}[{output_format}]') as run:
+                        writers[table].write(frame)
+                        run.rows = len(frame)
+                    chunk_counts[table] = len(frame)
+                    row_counts[table] += len(frame)
+                
+                self.metrics.chunk(chunk_index, chunk_counts)
+                progress.update(len(customers))
+                chunk_index += 1
+        finally:
+            progress.close()
+            for writer in writers.values():
+                writer.close()
+        
+        for table, path in output_files.items():
+            print(f"   [SUCCESS] {row_counts[table]:,} {table} {'appended' if append else 'exported'} to {path}")
         
-        # Convert transactions to dict for easier processing
-        transactions_dict = [transaction.__dict__ for transaction in transactions]
+        return {f"{table}_file": path for table, path in output_files.items()}, row_counts
 
-        # STEP 4: Update account balances
-        print("\n[STEP 4] Updating account balances...")
-        accounts = self.account_generator.update_account_balances(accounts, transactions_dict)
-        print(f"   [SUCCESS] Updated {len(accounts)} account balances")
+    def _generate_chunk_tables(self, customers_df: pd.DataFrame, tables: List[str] = None) -> Dict[str, pd.DataFrame]:
+        """Run các stage cần cho tables (mặc định: tất cả) trên một nhóm customers"""
+        return self.stage_graph.run(self.resolve_tables(tables), {'customers': customers_df},
+                                    self.config.STAGE_WORKERS, self.metrics)
 
-        # STEP 5: Generate cards for customers
-        print("\n[STEP 5] Generating cards for customers...")
-        cards = self.card_transaction_generator.generate_cards_for_customers(
-            customers_dict, self.config.START_DATE, self.config.END_DATE
-        )
-        print(f"   [SUCCESS] Generated {len(cards)} cards")
+    def generate_parallel_dataset(self, num_customers: int, num_workers: int = None,
+                                  shard_size: int = 50_000, master_seed: int = None,
+                                  output_prefix: str = "output/banking_data",
+                                  output_format: str = None, tables: List[str] = None) -> Dict[str, str]:
+        """Generate dataset song song trên nhiều process, mỗi shard là một khoảng customers
         
-        # Convert cards to dict for easier processing
-        cards_dict = [card.__dict__ for card in cards]
-
-        # STEP 6: Generate card transactions
-        print("\n[STEP 6] Generating card transactions...")
-        card_transactions = self.card_transaction_generator.generate_transactions_for_cards(
-            cards, self.config.START_DATE, self.config.END_DATE
-        )
-        print(f"   [SUCCESS] Generated {len(card_transactions)} card transactions")
+        Shard được chia theo shard_size (không phụ thuộc num_workers) và mỗi shard có seed
+        riêng sinh từ master_seed (mặc định: seed của context), cùng as_of, nên output giống
+        hệt nhau với mọi số worker. Mỗi shard ghi
+        part files riêng, sau đó được nối lại theo thứ tự shard thành file cuối cùng.
+        tables: chỉ sinh + ghi các bảng này (mặc định config.TABLES / tất cả).
+        """
+        output_format = output_format or self.config.OUTPUT_FORMAT
+        tables = self.resolve_tables(tables)
+        num_workers = num_workers or os.cpu_count() or 1
+        num_shards = max(1, -(-num_customers // shard_size))
         
-        # Convert card transactions to dict for easier processing
-        card_transactions_dict = [transaction.__dict__ for transaction in card_transactions]
-
-        # STEP 7: Generate cards based on card transactions and customer segments
-        print("\n[STEP 7] Generating cards based on card transactions and customer segments...")
-        cards_from_txn = self.card_generator.generate_cards()
-        print(f"   [SUCCESS] Generated {len(cards_from_txn)} cards from transactions")
+        print(f"[START] Starting PARALLEL dataset generation with {num_customers} customers")
+        master_context = self.context if master_seed is None else GenerationContext(master_seed, self.context.as_of)
+        print(f"[SHARDS] {num_shards} shards x {shard_size} customers, {num_workers} workers, master_seed={master_context.seed}")
+        
+        os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+        tasks = [
+            (self.config, master_context.for_shard(shard_index), num_customers, shard_index * shard_size,
+             min((shard_index + 1) * shard_size, num_customers), f"{output_prefix}.part-{shard_index:05d}",
+             output_format, tables)
+            for shard_index in range(num_shards)
+        ]
         
-        # Convert cards to dict for easier processing
-        cards_from_txn_dict = [card.__dict__ for card in cards_from_txn]
+        # Progress theo shard (kết quả lấy theo thứ tự shard)
+        with make_progress(self.config, "customers (shards)", num_customers) as progress:
+            if num_workers == 1:
+                shard_results = self._collect_shards(map(_generate_shard, tasks), progress)
+            else:
+                with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                    shard_results = self._collect_shards(executor.map(_generate_shard, tasks), progress)
+        
+        # Metrics của các shard (chạy ở process khác) được cộng dồn vào run này
+        for shard_index, result in enumerate(shard_results):
+            for stage_name, stage_metrics in result['stages'].items():
+                self.metrics.merge_stage(stage_name, stage_metrics)
+            self.metrics.merge_peak_rss(result['peak_rss_mb'])
+            self.metrics.chunk(shard_index, result['row_counts'])
+        
+        # Nối part files theo thứ tự shard
+        output_files = {}
+        row_counts = {}
+        for table in tables:
+            output_file = output_path(output_prefix, table, output_format)
+            part_files = [result['files'][table] for result in shard_results]
+            total_rows = sum(result['row_counts'][table] for result in shard_results)
+            with self.metrics.stage(f'concatenate_{table}[{output_format}]') as run:
+                concatenate_parts(output_format, part_files, output_file, table, self.config.OUTPUT_COMPRESSION)
+                run.rows = total_rows
+            print(f"   [SUCCESS] {total_rows:,} {table} exported to {output_file}")
+            output_files[f"{table}_file"] = output_file
+            row_counts[table] = total_rows
+        
+        # Lần sinh tiếp theo (incremental mode) dùng shard kế tiếp của master_context
+        manifest = self._new_manifest(num_customers, output_prefix, output_format, tables, row_counts, num_shards)
+        manifest.seed = int(master_context.seed)
+        self._write_manifest(manifest)
+        self._write_configured_report(output_files)
+        return output_files
 
-        # Convert to DataFrames
-        customers_df = pd.DataFrame(customers_dict)
-        accounts_df = pd.DataFrame([account.__dict__ for account in accounts])
-        transactions_df = pd.DataFrame(transactions_dict)
-        cards_df = pd.DataFrame(cards_dict)
-        card_transactions_df = pd.DataFrame(card_transactions_dict)
-        cards_from_txn_df = pd.DataFrame(cards_from_txn_dict)
-
-        return {
-            'customers': customers_df,
-            'accounts': accounts_df,
-            'transactions': transactions_df,
-            'cards': cards_df,
-            'card_transactions': card_transactions_df,
-            'cards_from_txn': cards_from_txn_df
-        }
+    @staticmethod
+    def _collect_shards(results, progress) -> List[Dict]:
+        """Gom kết quả các shard, cộng số customers của mỗi shard xong vào progress"""
+        shard_results = []
+        for result in results:
+            shard_results.append(result)
+            progress.update(result['num_customers'])
+        return shard_results
 
     def export_to_csv(self, dataset: Dict[str, pd.DataFrame], output_prefix: str = "output/banking_data"):
         """Export data to CSV files"""
-        print("\n[EXPORT] Exporting data to CSV files...")
+        return self.export_dataset(dataset, output_prefix, output_format='csv')
+
+    def export_dataset(self, dataset: Dict[str, pd.DataFrame], output_prefix: str = "output/banking_data",
+                       output_format: str = None):
+        """Export data bằng output backend đã cấu hình (csv / parquet / arrow)"""
+        output_format = output_format or self.config.OUTPUT_FORMAT
+        print(f"\n[EXPORT] Exporting data to {output_format.upper()} files...")
         
         # Ensure output directory exists
-        os.makedirs("output", exist_ok=True)
-        
-        customers_file = f"{output_prefix}_customers.csv"
-        accounts_file = f"{output_prefix}_accounts.csv"
-        transactions_file = f"{output_prefix}_transactions.csv"
-        cards_file = f"{output_prefix}_cards.csv"
-        card_transactions_file = f"{output_prefix}_card_transactions.csv"
-        cards_from_txn_file = f"{output_prefix}_cards_from_txn.csv"
+        os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+        
+        # Chỉ các bảng có trong dataset (dataset có thể là một subset bảng)
+        output_files = {}
+        for table in self.TABLES:
+            if table not in dataset:
+                continue
+            file_path = output_path(output_prefix, table, output_format)
+            with self.metrics.stage(f'export_{table}[{output_format}]') as run:
+                write_table(output_format, dataset[table], file_path, table, self.config.OUTPUT_COMPRESSION)
+                run.rows = len(dataset[table])
+            print(f"   [SUCCESS] {table} exported to {file_path}")
+            output_files[f"{table}_file"] = file_path
+        
+        # Manifest cho incremental mode (customer_id cuối suy ra từ số customers của dataset)
+        if 'customers' in dataset:
+            tables = [table for table in self.TABLES if table in dataset]
+            row_counts = {table: len(dataset[table]) for table in tables}
+            self._write_manifest(self._new_manifest(len(dataset['customers']), output_prefix, output_format,
+                                                    tables, row_counts))
+        return output_files
 
-        dataset['customers'].to_csv(customers_file, index=False)
-        dataset['accounts'].to_csv(accounts_file, index=False)
-        dataset['transactions'].to_csv(transactions_file, index=False)
-        dataset['cards'].to_csv(cards_file, index=False)
-        dataset['card_transactions'].to_csv(card_transactions_file, index=False)
-        dataset['cards_from_txn'].to_csv(cards_from_txn_file, index=False)
+    def _new_manifest(self, num_customers: int, output_prefix: str, output_format: str, tables: List[str],
+                      row_counts: Dict[str, int], next_shard: int = 1) -> RunManifest:
+        """Manifest của một run đầy đủ (customer_id từ 1)"""
+        manifest = RunManifest(
+            seed=int(self.context.seed),
+            as_of=self.context.as_of,
+            start_date=self.config.START_DATE,
+            end_date=self.config.END_DATE,
+            output_prefix=output_prefix,
+            output_format=output_format,
+            tables=list(tables),
+            surrogate_keys=self.config.SURROGATE_KEYS,
+            next_shard=next_shard
+        )
+        manifest.add_customers(num_customers, self.customer_generator.last_customer_ids(num_customers))
+        manifest.add_rows(row_counts)
+        return manifest
 
-        print(f"   [SUCCESS] Customers exported to {customers_file}")
-        print(f"   [SUCCESS] Accounts exported to {accounts_file}")
-        print(f"   [SUCCESS] Transactions exported to {transactions_file}")
-        print(f"   [SUCCESS] Cards exported to {cards_file}")
-        print(f"   [SUCCESS] Card Transactions exported to {card_transactions_file}")
-        print(f"   [SUCCESS] Cards from transactions exported to {cards_from_txn_file}")
-        
-        return {
-            'customers_file': customers_file,
-            'accounts_file': accounts_file,
-            'transactions_file': transactions_file,
-            'cards_file': cards_file,
-            'card_transactions_file': card_transactions_file,
-            'cards_from_txn_file': cards_from_txn_file
-        }
+    def _manifest_file(self, manifest_file: str = None, output_prefix: str = "output/banking_data") -> str:
+        """manifest_file > config.RUN_MANIFEST_FILE > {output_prefix}_manifest.json"""
+        return manifest_file or self.config.RUN_MANIFEST_FILE or manifest_path(output_prefix)
 
-    def analyze_dataset(self, dataset: Dict[str, pd.DataFrame]):
-        """Analyze the generated dataset"""
-        print("\n[ANALYSIS] DATASET ANALYSIS")
-        print("=" * 50)
-        
-        customers_df = dataset['customers']
-        accounts_df = dataset['accounts']
-        transactions_df = dataset['transactions']
-        
-        # Basic counts
-        print(f"[COUNTS] Record Counts:")
-        print(f"   Customers: {len(customers_df):,}")
-        print(f"   Accounts: {len(accounts_df):,}")
-        print(f"   Transactions: {len(transactions_df):,}")
-        print(f"   Cards: {len(dataset['cards']):,}")
-        print(f"   Card Transactions: {len(dataset['card_transactions']):,}")
-        
-        # Segment distribution
-        print(f"\n[SEGMENTS] Segment Distribution:")
-        segment_counts = customers_df['customer_segment'].value_counts()
-        for segment, count in segment_counts.items():
-            percentage = (count / len(customers_df)) * 100
-            print(f"   {segment}: {count:,} ({percentage:.1f}%)")
-        
-        # Age distribution by segment
-        print(f"\n[AGE] Age Distribution by Segment:")
-        customers_df['age'] = (datetime.now() - pd.to_datetime(customers_df['dob'])).dt.days // 365
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_customers = customers_df[customers_df['customer_segment'] == segment]
-            if len(segment_customers) > 0:
-                ages = segment_customers['age']
-                print(f"   {segment}: Min={ages.min()}, Max={ages.max()}, Mean={ages.mean():.1f}")
-        
-        # Occupation distribution by segment
-        print(f"\n[OCCUPATION] Occupation Distribution by Segment:")
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_customers = customers_df[customers_df['customer_segment'] == segment]
-            if len(segment_customers) > 0:
-                occupations = segment_customers['occupation'].value_counts()
-                print(f"   {segment}:")
-                for occ, count in occupations.items():
-                    percentage = (count / len(segment_customers)) * 100
-                    print(f"     {occ}: {count} ({percentage:.1f}%)")
-        
-        # Income distribution by segment
-        print(f"\n[INCOME] Income Distribution by Segment:")
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_customers = customers_df[customers_df['customer_segment'] == segment]
-            if len(segment_customers) > 0:
-                incomes = segment_customers['income_range'].value_counts()
-                print(f"   {segment}:")
-                for income, count in incomes.items():
-                    percentage = (count / len(segment_customers)) * 100
-                    print(f"     {income}: {count} ({percentage:.1f}%)")
-        
-        # Account analysis by segment
-        print(f"\n[ACCOUNTS] Account Analysis by Segment:")
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_accounts = accounts_df[accounts_df['customer_code'].str.startswith(segment)]
-            if len(segment_accounts) > 0:
-                print(f"   {segment} ({len(segment_accounts)} accounts):")
-                
-                # Product type distribution
-                product_types = segment_accounts['product_type'].value_counts()
-                for p_type, count in product_types.items():
-                    percentage = (count / len(segment_accounts)) * 100
-                    print(f"     {p_type}: {count} ({percentage:.1f}%)")
-                
-                # Term months distribution
-                term_accounts = segment_accounts[segment_accounts['term_months'] > 0]
-                if len(term_accounts) > 0:
-                    term_months = term_accounts['term_months'].value_counts().sort_index()
-                    print(f"     Term Months:")
-                    for term, count in term_months.items():
-                        percentage = (count / len(term_accounts)) * 100
-                        print(f"       {term} months: {count} ({percentage:.1f}%)")
-                
-                # Interest rate analysis
-                interest_rates = segment_accounts['interest_rate']
-                print(f"     Interest Rates: Min={interest_rates.min():.3f}%, Max={interest_rates.max():.3f}%, Mean={interest_rates.mean():.3f}%")
-        
-        # Transaction analysis by segment
-        print(f"\n[TRANSACTIONS] Transaction Analysis by Segment:")
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_transactions = transactions_df[transactions_df['customer_code'].str.startswith(segment)]
-            if len(segment_transactions) > 0:
-                print(f"   {segment} ({len(segment_transactions)} transactions):")
-                
-                # Amount analysis
-                amounts = segment_transactions['amount']
-                print(f"     Amount: Min={amounts.min():,.0f}, Max={amounts.max():,.0f}, Mean={amounts.mean():,.0f}")
-                
-                # Transaction type distribution
-                types = segment_transactions['transaction_type'].value_counts()
-                print(f"     Types:")
-                for t_type, count in types.items():
-                    percentage = (count / len(segment_transactions)) * 100
-                    print(f"       {t_type}: {count} ({percentage:.1f}%)")
-        
-        # Card analysis by segment
-        print(f"\n[CARDS] Card Analysis by Segment:")
-        cards_df = dataset['cards']
-        card_transactions_df = dataset['card_transactions']
-        
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_cards = cards_df[cards_df['customer_code'].str.startswith(segment)]
-            if len(segment_cards) > 0:
-                print(f"   {segment} ({len(segment_cards)} cards):")
-                
-                # Card type distribution
-                card_types = segment_cards['card_type'].value_counts()
-                for c_type, count in card_types.items():
-                    percentage = (count / len(segment_cards)) * 100
-                    print(f"     {c_type}: {count} ({percentage:.1f}%)")
-                
-                # Credit limit analysis
-                credit_cards = segment_cards[segment_cards['card_type'] == 'CREDIT']
-                if len(credit_cards) > 0:
-                    limits = credit_cards['credit_limit']
-                    print(f"     Credit Limits: Min={limits.min():,.0f}, Max={limits.max():,.0f}, Mean={limits.mean():,.0f}")
-        
-        # Card transaction analysis by segment
-        print(f"\n[CARD_TRANSACTIONS] Card Transaction Analysis by Segment:")
-        for segment in ['A', 'B', 'C', 'D', 'E']:
-            segment_card_txns = card_transactions_df[card_transactions_df['customer_code'].str.startswith(segment)]
-            if len(segment_card_txns) > 0:
-                print(f"   {segment} ({len(segment_card_txns)} card transactions):")
-                
-                # Amount analysis
-                amounts = segment_card_txns['tran_amt_acy']
-                print(f"     Amount: Min={amounts.min():,.0f}, Max={amounts.max():,.0f}, Mean={amounts.mean():,.0f}")
-                
-                # Transaction type distribution
-                types = segment_card_txns['tran_type'].value_counts()
-                print(f"     Types:")
-                for t_type, count in types.items():
-                    percentage = (count / len(segment_card_txns)) * 100
-                    print(f"       {t_type}: {count} ({percentage:.1f}%)")
-                
-                # Currency distribution
-                currencies = segment_card_txns['tran_currency'].value_counts()
-                print(f"     Currencies:")
-                for currency, count in currencies.items():
-                    percentage = (count / len(segment_card_txns)) * 100
-                    print(f"       {currency}: {count} ({percentage:.1f}%)")
-                
-                # Merchant analysis
-                merchants = segment_card_txns['merchant_name'].value_counts()
-                print(f"     Top Merchants:")
-                for merchant, count in merchants.head(5).items():
-                    percentage = (count / len(segment_card_txns)) * 100
-                    print(f"       {merchant}: {count} ({percentage:.1f}%)")
+    def _write_manifest(self, manifest: RunManifest) -> str:
+        return manifest.save(self._manifest_file(output_prefix=manifest.output_prefix))
+
+    def _increment_generator(self, manifest: RunManifest, end_date: datetime) -> 'NewMainGenerator':
+        """Generator cho một lần sinh tiếp: cấu hình của dataset đã có (kỳ dữ liệu, format, bảng, keys),
+        context = shard next_shard của seed trong manifest (seed + key space mới), as_of của run này"""
+        config = replace(self.config, START_DATE=manifest.start_date, END_DATE=end_date,
+                         OUTPUT_FORMAT=manifest.output_format, TABLES=manifest.tables,
+                         SURROGATE_KEYS=manifest.surrogate_keys)
+        context = GenerationContext(manifest.seed, self.context.as_of).for_shard(manifest.next_shard)
+        generator = NewMainGenerator(config, context)
+        # Metrics của lần sinh tiếp được ghi vào run này
+        generator.metrics = self.metrics
+        return generator
+
+    def _record_increment(self, manifest: RunManifest, kind: str, row_counts: Dict[str, int], **details):
+        """Cập nhật manifest sau một lần sinh tiếp (row counts, shard đã dùng, lịch sử)"""
+        manifest.add_rows(row_counts)
+        manifest.increments.append({'kind': kind, 'shard': manifest.next_shard,
+                                    'as_of': self.context.as_of.isoformat(), **details,
+                                    'row_counts': row_counts})
+        manifest.next_shard += 1
+        manifest.as_of = self.context.as_of
+
+    def append_customers(self, num_customers: int, chunk_size: int = 10_000,
+                         manifest_file: str = None) -> Dict[str, str]:
+        """Incremental mode: sinh thêm num_customers customers mới (cùng accounts, transactions, cards, ...)
+        và ghi nối vào output của dataset đã có, theo run manifest
+        
+        customer_code được đánh số tiếp sau customer_id cuối cùng, kỳ dữ liệu giống dataset đã có;
+        transaction_id / surrogate keys nằm trong key space của shard mới nên không trùng với các
+        lần trước. Rows đã có không được đọc lại hay sinh lại.
+        """
+        manifest_file = self._manifest_file(manifest_file)
+        manifest = RunManifest.load(manifest_file)
+        generator = self._increment_generator(manifest, manifest.end_date)
+        first_customer_id = manifest.next_customer_id
+        
+        print(f"[START] Appending {num_customers} customers to {manifest.output_prefix} "
+              f"(customer_id from {first_customer_id}, shard {manifest.next_shard})")
+        output_files, row_counts = generator._stream_customer_chunks(
+            num_customers, chunk_size, manifest.output_prefix, manifest.output_format, manifest.tables,
+            first_customer_id, append=True
+        )
+        
+        manifest.add_customers(num_customers,
+                               generator.customer_generator.last_customer_ids(num_customers, first_customer_id))
+        self._record_increment(manifest, 'customers', row_counts, num_customers=num_customers,
+                               first_customer_id=first_customer_id)
+        manifest.save(manifest_file)
+        self._write_configured_report(output_files)
+        return output_files
+
+    def extend_end_date(self, end_date: datetime, manifest_file: str = None) -> Dict[str, str]:
+        """Incremental mode: kéo dài kỳ dữ liệu tới end_date, chỉ sinh transactions cho phần mới
+        (END_DATE cũ + 1 ngày -> end_date) của các accounts đã có
+        
+        Số transactions tỉ lệ với số ngày của phần mới, running balance tiếp nối từ current_balance
+        của mỗi account; transactions được ghi nối, bảng accounts được ghi lại với current_balance mới.
+        Card transactions sinh theo vòng đời thẻ tới as_of (không theo END_DATE) nên không thay đổi.
+        end_date phải sau END_DATE của manifest và không sau as_of, nếu không ValueError trước khi ghi gì.
+        """
+        manifest_file = self._manifest_file(manifest_file)
+        manifest = RunManifest.load(manifest_file)
+        missing = [table for table in ('accounts', 'transactions') if table not in manifest.tables]
+        if missing:
+            raise ValueError(f"extend_end_date needs table(s) {missing} in the existing dataset")
+        if end_date <= manifest.end_date:
+            raise ValueError(f"end_date {end_date:%Y-%m-%d} must be after the covered END_DATE "
+                             f"{manifest.end_date:%Y-%m-%d}")
+        # Không sinh transactions sau mốc "hôm nay" của run này
+        if end_date.date() > self.context.as_of.date():
+            raise ValueError(f"end_date {end_date:%Y-%m-%d} must not be after as_of "
+                             f"{self.context.as_of:%Y-%m-%d}")
+        
+        window_start = manifest.end_date + timedelta(days=1)
+        generator = self._increment_generator(manifest, end_date)
+        output_format = manifest.output_format
+        accounts_file = output_path(manifest.output_prefix, 'accounts', output_format)
+        transactions_file = output_path(manifest.output_prefix, 'transactions', output_format)
+        
+        print(f"[START] Extending {manifest.output_prefix} to {end_date:%Y-%m-%d} "
+              f"(new period {window_start:%Y-%m-%d} to {end_date:%Y-%m-%d}, shard {manifest.next_shard})")
+        with self.metrics.stage(f'read_accounts[{output_format}]') as run:
+            # File ghi số tiền theo major units
+            accounts_df = apply_table_dtypes(read_table(output_format, accounts_file, 'accounts'), 'accounts',
+                                             generator.account_generator.categories, amounts='major')
+            run.rows = len(accounts_df)
+        
+        with self.metrics.stage('transactions') as run:
+            transactions_df = generator.transaction_generator.generate_transactions_frame(
+                accounts_df, window_start, end_date, months=((end_date - window_start).days + 1) / 30
+            )
+            run.rows = len(transactions_df)
+        
+        # Ledger: số dư đầu kỳ mới = current_balance hiện tại của account
+        with self.metrics.stage('update_account_balances') as run:
+            opening_balances = pd.Series(accounts_df['current_balance'].to_numpy(dtype=np.int64),
+                                         index=accounts_df['account_id'].to_numpy(dtype=object))
+            accounts_df, transactions_df = generator.account_generator.update_account_balances_frame(
+                accounts_df, transactions_df, opening_balances
+            )
+            run.rows = len(transactions_df)
+        
+        with self.metrics.stage(f'export_transactions[{output_format}]') as run:
+            writer = open_table_writer(output_format, transactions_file, 'transactions',
+                                       self.config.OUTPUT_COMPRESSION, append=True)
+            writer.write(transactions_df)
+            writer.close()
+            run.rows = len(transactions_df)
+        with self.metrics.stage(f'export_accounts[{output_format}]') as run:
+            replace_table(output_format, accounts_df, accounts_file, 'accounts', self.config.OUTPUT_COMPRESSION)
+            run.rows = len(accounts_df)
+        print(f"   [SUCCESS] {len(transactions_df):,} transactions appended to {transactions_file}")
+        print(f"   [SUCCESS] {len(accounts_df):,} account balances updated in {accounts_file}")
+        
+        self._record_increment(manifest, 'end_date', {'transactions': len(transactions_df)},
+                               start_date=window_start.isoformat(), end_date=end_date.isoformat())
+        manifest.end_date = end_date
+        manifest.save(manifest_file)
+        
+        output_files = {'transactions_file': transactions_file, 'accounts_file': accounts_file}
+        self._write_configured_report(output_files)
+        return output_files
+
+    def write_run_report(self, report_file: str = None, output_files: Dict[str, str] = None) -> str:
+        """Ghi run report JSON (metrics từng stage + chunk) - mặc định config.RUN_REPORT_FILE"""
+        report_file = report_file or self.config.RUN_REPORT_FILE or "output/run_report.json"
+        return self.metrics.write_report(report_file, {
+            'seed': self.context.seed,
+            'as_of': self.context.as_of.isoformat(),
+            'output_format': self.config.OUTPUT_FORMAT,
+            'output_files': output_files or {}
+        })
+
+    def _write_configured_report(self, output_files: Dict[str, str]):
+        """Ghi run report ở cuối streaming/parallel run nếu config.RUN_REPORT_FILE được set"""
+        if self.config.RUN_REPORT_FILE:
+            self.write_run_report(self.config.RUN_REPORT_FILE, output_files)
+
+    def analyze_dataset(self, dataset: Dict[str, pd.DataFrame], report_file: str = None) -> DatasetReport:
+        """Analyze the generated dataset
+        
+        Mỗi bảng được phân tích bằng một lượt grouped aggregations (DatasetAnalyzer), kết quả
+        là DatasetReport được in ra sau đó; report_file: ghi thêm report ra JSON.
+        """
+        with self.metrics.stage('analyze_dataset') as run:
+            report = DatasetAnalyzer(self.context.as_of).analyze(dataset)
+            run.rows = sum(report.counts.values())
+        report.print_report()
+        if report_file:
+            report.to_json(report_file)
+        return report
+
+def _generate_shard(task: Tuple) -> Dict:
+    """Worker: sinh một shard customers và ghi part files (chạy trong ProcessPoolExecutor)"""
+    config, context, num_customers, start, stop, part_prefix, output_format, tables = task
+    
+    # Context riêng cho shard -> output của shard không phụ thuộc worker nào chạy nó
+    generator = NewMainGenerator(config, context)
+    with generator.metrics.stage('customers') as run:
+        customers = generator.customer_generator.generate_customers_for_range(num_customers, start, stop)
+        run.rows = len(customers)
+    chunk_tables = generator._generate_chunk_tables(customers, tables)
+    
+    files = {}
+    row_counts = {}
+    for table, frame in chunk_tables.items():
+        files[table] = output_path(part_prefix, table, output_format)
+        with generator.metrics.stage(f'export_{table}[{output_format}]') as run:
+            write_table(output_format, frame, files[table], table, config.OUTPUT_COMPRESSION)
+            run.rows = len(frame)
+        row_counts[table] = len(frame)
+    
+    return {'files': files, 'row_counts': row_counts, 'num_customers': len(customers),
+            'stages': generator.metrics.stages, 'peak_rss_mb': peak_rss_mb()}
 
 def main():
     """Test New Main Generator"""
-    generator = NewMainGenerator()
+    generator = NewMainGenerator(test_config(SHOW_PROGRESS=True))
     
     # Generate dataset
     dataset = generator.generate_balanced_dataset(1000)
@@ -318,6 +515,9 @@ def main():
     # Analyze dataset
     generator.analyze_dataset(dataset)
     
+    # Run report (metrics từng stage)
+    generator.write_run_report(output_files=output_files)
+    
     print("\n[SUCCESS] New balanced dataset generation completed!")
     print(f"[FILES] Files saved to: {output_files}")
 
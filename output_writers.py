@@ -0,0 +1,435 @@
+"""
+Output Writers cho các bảng banking data
+Backend ghi có thể thay đổi: CSV (mặc định), Parquet hoặc Arrow IPC.
+Parquet/Arrow dùng schema có kiểu rõ ràng (date32, int64, decimal, dictionary) để downstream
+(Spark, ...) không phải parse text, và ghi từng row group ngay khi có dữ liệu (streaming).
+pyarrow là optional dependency: chỉ cần khi dùng format 'parquet' hoặc 'arrow'.
+Incremental mode ghi nối (append) vào file đã có và đọc lại bảng bằng read_table.
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'arrow')
+FILE_EXTENSIONS = {'csv': 'csv', 'parquet': 'parquet', 'arrow': 'arrow'}
+
+# Kiểu logic của cột -> kiểu Arrow
+# string: utf8, category: dictionary<int32, utf8>, date: date32, int: int64 (số đếm, kỳ hạn - không phải tiền),
+# amount: decimal128(18, 2), float: float64, key: int64 surrogate key (chỉ có khi config.SURROGATE_KEYS)
+# Mọi cột tiền là kind 'amount': trong DataFrame luôn là int64 minor units (value * AMOUNT_SCALE, xem
+# table_dtypes), đơn vị được quy định bởi schema chứ không đoán theo dtype; input major units (float,
+# Decimal, file đọc lại) phải convert bằng to_minor_units / apply_table_dtypes(..., amounts='major')
+AMOUNT_SCALE = 100
+# Cột date trong DataFrame: int32 day ordinals = số ngày kể từ DATE_EPOCH (cùng encoding với Arrow date32),
+# NO_DATE = không có ngày (NaT); chỉ convert sang datetime64 / string một lần mỗi cột khi ghi
+DATE_EPOCH = np.datetime64('1970-01-01', 'D')
+DAY_DTYPE = np.int32
+NO_DATE = np.iinfo(np.int32).min
+TABLE_SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    'customers': [
+        ('customer_code', 'string'), ('full_name', 'string'), ('gender', 'category'),
+        ('dob', 'date'), ('city', 'category'), ('marital_status', 'category'),
+        ('nationality', 'category'), ('occupation', 'category'), ('income_range', 'category'),
+        ('income_currency', 'category'), ('source_of_income', 'category'), ('status', 'category'),
+        ('customer_segment', 'category'),
+    ],
+    'accounts': [
+        ('account_key', 'key'), ('account_id', 'string'), ('customer_code', 'string'), ('product_type', 'category'),
+        ('open_date', 'date'), ('maturity_date', 'date'), ('term_months', 'int'),
+        ('interest_rate', 'float'), ('status', 'category'), ('channel_opened', 'category'),
+        ('currency', 'category'), ('current_balance', 'amount'),
+    ],
+    'transactions': [
+        ('transaction_key', 'key'), ('transaction_id', 'string'), ('account_id', 'string'), ('customer_code', 'string'),
+        ('transaction_date', 'date'), ('transaction_type', 'category'), ('transaction_desc', 'category'),
+        ('amount', 'amount'), ('balance', 'amount'), ('channel_txn', 'category'), ('status_txn', 'category'),
+        ('tran_amt_acy', 'amount'), ('tran_amt_lcy', 'amount'), ('currency', 'category'),
+        ('term_month', 'int'), ('maturity_date', 'date'), ('open_date', 'date'),
+        ('account_type', 'category'),
+    ],
+    'cards': [
+        ('card_id', 'string'), ('card_number', 'string'), ('customer_code', 'string'),
+        ('card_type', 'category'), ('credit_limit', 'amount'), ('active_date', 'date'),
+        ('expiry_date', 'date'), ('status', 'category'),
+    ],
+    'card_transactions': [
+        ('tran_id', 'string'), ('card_id', 'string'), ('card_number', 'string'),
+        ('customer_code', 'string'), ('card_type', 'category'), ('tran_amt_acy', 'amount'),
+        ('tran_amt_lcy', 'amount'), ('tran_currency', 'category'), ('cr_dr', 'category'),
+        ('tran_date', 'date'), ('tran_type', 'category'), ('tran_type_name', 'category'),
+        ('tran_desc', 'string'), ('merchant_id', 'string'), ('merchant_name', 'category'),
+        ('tran_status', 'category'),
+    ],
+    'cards_from_txn': [
+        ('card_id', 'string'), ('customer_code', 'string'), ('card_number', 'string'),
+        ('card_type', 'category'), ('product_type', 'category'), ('issue_date', 'date'),
+        ('expire_date', 'date'), ('activation_date', 'date'), ('credit_limit', 'amount'),
+        ('available_credit', 'amount'), ('outstanding_balance', 'amount'),
+        ('minimum_payment', 'amount'), ('due_date', 'date'), ('interest_rate', 'float'),
+        ('card_status', 'category'),
+    ],
+}
+
+
+def _require_pyarrow(output_format: str):
+    if pa is None:
+        raise ImportError(f"pyarrow is required for output_format='{output_format}' (pip install pyarrow)")
+
+
+def arrow_type(kind: str):
+    """Map a logical column kind to its Arrow type"""
+    _require_pyarrow('parquet')
+    return {
+        'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'date': pa.date32(),
+        'int': pa.int64(),
+        'key': pa.int64(),
+        'amount': pa.decimal128(18, 2),
+        'float': pa.float64(),
+    }[kind]
+
+
+def table_columns(table: str, columns=None) -> List[Tuple[str, str]]:
+    """(column, kind) của bảng; cột 'key' chỉ có khi nằm trong columns (DataFrame được ghi)"""
+    columns = set(columns) if columns is not None else set()
+    return [(column, kind) for column, kind in TABLE_SCHEMAS[table] if kind != 'key' or column in columns]
+
+
+def arrow_schema(table: str, columns=None):
+    """Arrow schema of a table"""
+    return pa.schema([(column, arrow_type(kind)) for column, kind in table_columns(table, columns)])
+
+
+def to_minor_units(values) -> np.ndarray:
+    """Amount (major units, float) -> int64 minor units; NaN -> 0"""
+    amounts = pd.to_numeric(pd.Series(np.asarray(values))).fillna(0).to_numpy(dtype=float)
+    return np.round(amounts * AMOUNT_SCALE).astype(np.int64)
+
+
+def minor_units(values, column: str = 'amount') -> np.ndarray:
+    """Cột amount (int64 minor units) -> np.int64 array; cột không phải số nguyên -> TypeError"""
+    values = pd.Series(np.asarray(values)) if not isinstance(values, pd.Series) else values
+    if len(values) and not pd.api.types.is_integer_dtype(values):
+        raise TypeError(f"{column}: expected int64 minor units, got {values.dtype} "
+                        f"(convert major-unit amounts with to_minor_units)")
+    return values.to_numpy().astype(np.int64)
+
+
+def amount_values(values) -> np.ndarray:
+    """Cột amount (int64 minor units) -> float major units"""
+    return minor_units(values) / AMOUNT_SCALE
+
+
+_EPOCH_ORDINAL = DATE_EPOCH.astype(object).toordinal()
+
+
+def day_ordinal(value) -> int:
+    """datetime / date -> day ordinal (None -> NO_DATE)"""
+    return NO_DATE if value is None or value is pd.NaT else value.toordinal() - _EPOCH_ORDINAL
+
+
+def to_day_ordinals(values) -> np.ndarray:
+    """Cột date (int day ordinals, datetime64, datetime hoặc 'YYYY-MM-DD') -> int32 day ordinals; NaT -> NO_DATE"""
+    values = pd.Series(np.asarray(values)) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy().astype(DAY_DTYPE, copy=False)
+    days = pd.to_datetime(values).to_numpy().astype('datetime64[D]')
+    return np.where(np.isnat(days), NO_DATE, days.astype(np.int64)).astype(DAY_DTYPE)
+
+
+def date_values(values) -> np.ndarray:
+    """Cột date -> datetime64[D] (int được hiểu là day ordinals, NO_DATE -> NaT)"""
+    values = pd.Series(np.asarray(values)) if not isinstance(values, pd.Series) else values
+    if not pd.api.types.is_integer_dtype(values):
+        return pd.to_datetime(values).to_numpy().astype('datetime64[D]')
+    days = values.to_numpy().astype(np.int64)
+    return np.where(days == NO_DATE, np.datetime64('NaT', 'D'), DATE_EPOCH + days)
+
+
+def date_strings(values) -> np.ndarray:
+    """Cột date -> 'YYYY-MM-DD' (NaT -> ''), format cả cột một lần"""
+    days = date_values(values)
+    return np.where(np.isnat(days), '', np.datetime_as_string(days, unit='D')).astype(object)
+
+
+def output_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """DataFrame để ghi text (CSV): amount minor units -> major units, date -> 'YYYY-MM-DD'"""
+    columns = {column: amount_values(df[column]) for column, kind in TABLE_SCHEMAS[table]
+               if kind == 'amount' and column in df}
+    columns.update({column: date_strings(df[column]) for column, kind in TABLE_SCHEMAS[table]
+                    if kind == 'date' and column in df})
+    if not columns:
+        return df
+    return df.assign(**columns)
+
+
+def _to_arrow_array(values: pd.Series, kind: str):
+    """Convert một cột pandas sang Arrow array đúng kiểu của schema"""
+    if isinstance(values.dtype, pd.CategoricalDtype) and kind in ('category', 'string'):
+        # Categorical: dùng thẳng codes + categories (dictionary cố định, không hash lại strings)
+        codes = values.cat.codes.to_numpy()
+        dictionary = pa.array(np.asarray(values.cat.categories, dtype=object), type=pa.string())
+        categorical = pa.DictionaryArray.from_arrays(pa.array(codes, type=pa.int32(), mask=codes < 0), dictionary)
+        return categorical if kind == 'category' else categorical.cast(pa.string())
+    if kind == 'date':
+        # Day ordinals có cùng encoding với date32: chỉ cần mask NO_DATE, không convert từng giá trị
+        days = to_day_ordinals(values)
+        return pa.array(days, type=pa.int32(), mask=days == NO_DATE).cast(pa.date32())
+    if kind in ('int', 'key'):
+        return pa.array(pd.to_numeric(values).round().astype('Int64'), type=pa.int64(), from_pandas=True)
+    if kind == 'amount':
+        amounts = np.round(amount_values(values), 2)
+        return pa.array(amounts, from_pandas=True).cast(pa.decimal128(18, 2))
+    if kind == 'float':
+        return pa.array(pd.to_numeric(values).to_numpy(dtype=float), from_pandas=True)
+    strings = pa.array(values.astype(object), type=pa.string(), from_pandas=True)
+    return strings.dictionary_encode() if kind == 'category' else strings
+
+
+def to_arrow_table(df: pd.DataFrame, table: str):
+    """Convert DataFrame của một bảng sang pyarrow.Table theo TABLE_SCHEMAS"""
+    _require_pyarrow('parquet')
+    schema = arrow_schema(table, df.columns)
+    arrays = []
+    for column, kind in table_columns(table, df.columns):
+        values = df[column] if column in df else pd.Series([None] * len(df), dtype=object)
+        arrays.append(_to_arrow_array(values, kind))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class CsvTableWriter:
+    """Ghi một bảng ra CSV, mỗi write() append một chunk"""
+
+    def __init__(self, path: str, table: str, compression: str = None):
+        self.path = path
+        self.table = table
+        self._header_written = False
+
+    def write(self, df: pd.DataFrame):
+        df = output_frame(df, self.table)
+        df.to_csv(self.path, mode='a' if self._header_written else 'w',
+                  header=not self._header_written, index=False)
+        self._header_written = True
+
+    def close(self):
+        # Không có chunk nào -> vẫn tạo file rỗng
+        if not self._header_written:
+            open(self.path, 'w').close()
+
+    @classmethod
+    def appender(cls, path: str, table: str, compression: str = None) -> 'CsvTableWriter':
+        """Ghi nối vào CSV đã có (không ghi lại header)"""
+        writer = cls(path, table, compression)
+        writer._header_written = os.path.getsize(path) > 0
+        return writer
+
+    @staticmethod
+    def concatenate(part_files: List[str], output_file: str, table: str, compression: str = None):
+        """Nối CSV part files (giữ header của part đầu tiên)"""
+        with open(output_file, 'wb') as out:
+            for i, part_file in enumerate(part_files):
+                with open(part_file, 'rb') as part:
+                    if i > 0:
+                        part.readline()  # Bỏ header
+                    shutil.copyfileobj(part, out)
+
+
+class ParquetTableWriter:
+    """Ghi một bảng ra Parquet, mỗi write() là một (hoặc nhiều) row group"""
+
+    def __init__(self, path: str, table: str, compression: str = 'snappy'):
+        _require_pyarrow('parquet')
+        # compression: snappy, zstd, gzip, lz4, brotli hoặc None
+        self.path = path
+        self.table = table
+        self.compression = compression
+        # Mở file ở lần ghi đầu tiên: schema theo các cột thực tế (có surrogate keys hay không)
+        self._writer = None
+
+    def _open(self, schema):
+        self._writer = pq.ParquetWriter(self.path, schema, compression=self.compression or 'none')
+
+    def write(self, df: pd.DataFrame):
+        self.write_arrow(to_arrow_table(df, self.table))
+
+    def write_arrow(self, arrow_table):
+        if self._writer is None:
+            self._open(arrow_table.schema)
+        if arrow_table.num_rows:
+            self._writer.write_table(arrow_table)
+
+    def close(self):
+        if self._writer is None:
+            self._open(arrow_schema(self.table))
+        self._writer.close()
+
+    @classmethod
+    def appender(cls, path: str, table: str, compression: str = 'snappy') -> 'AppendTableWriter':
+        """Ghi nối vào file đã có (qua part file, xem AppendTableWriter)"""
+        return AppendTableWriter(cls, path, table, compression)
+
+    @staticmethod
+    def concatenate(part_files: List[str], output_file: str, table: str, compression: str = 'snappy'):
+        """Nối Parquet part files: copy từng row group, không convert lại qua pandas"""
+        writer = ParquetTableWriter(output_file, table, compression)
+        for part_file in part_files:
+            part = pq.ParquetFile(part_file)
+            for i in range(part.num_row_groups):
+                writer.write_arrow(part.read_row_group(i))
+        writer.close()
+
+
+class ArrowTableWriter:
+    """Ghi một bảng ra Arrow IPC stream, mỗi write() là một record batch
+    
+    Dùng IPC stream format (không phải file format) vì dictionary của các cột category
+    có thể khác nhau giữa các chunk, stream format cho phép thay dictionary giữa các batch.
+    """
+
+    def __init__(self, path: str, table: str, compression: str = 'lz4'):
+        _require_pyarrow('arrow')
+        self.path = path
+        self.table = table
+        # Arrow IPC chỉ hỗ trợ lz4/zstd
+        self._options = pa_ipc.IpcWriteOptions(compression=compression if compression in ('lz4', 'zstd') else None)
+        # Mở stream ở lần ghi đầu tiên: schema theo các cột thực tế (có surrogate keys hay không)
+        self._sink = None
+        self._writer = None
+
+    def _open(self, schema):
+        self._sink = pa.OSFile(self.path, 'wb')
+        self._writer = pa_ipc.new_stream(self._sink, schema, options=self._options)
+
+    def write(self, df: pd.DataFrame):
+        self.write_arrow(to_arrow_table(df, self.table))
+
+    def write_arrow(self, arrow_table):
+        if self._writer is None:
+            self._open(arrow_table.schema)
+        if arrow_table.num_rows:
+            self._writer.write_table(arrow_table)
+
+    def close(self):
+        if self._writer is None:
+            self._open(arrow_schema(self.table))
+        self._writer.close()
+        self._sink.close()
+
+    @classmethod
+    def appender(cls, path: str, table: str, compression: str = 'lz4') -> 'AppendTableWriter':
+        """Ghi nối vào file đã có (qua part file, xem AppendTableWriter)"""
+        return AppendTableWriter(cls, path, table, compression)
+
+    @staticmethod
+    def concatenate(part_files: List[str], output_file: str, table: str, compression: str = 'lz4'):
+        """Nối Arrow IPC part files theo record batch"""
+        writer = ArrowTableWriter(output_file, table, compression)
+        for part_file in part_files:
+            with pa.OSFile(part_file, 'rb') as source:
+                for batch in pa_ipc.open_stream(source):
+                    writer.write_arrow(pa.Table.from_batches([batch]))
+        writer.close()
+
+
+class AppendTableWriter:
+    """Ghi nối vào file Parquet/Arrow đã có
+    
+    Hai format này không mở lại được file để ghi tiếp: các chunk mới được ghi ra một part file,
+    khi close file cũ + part file được nối lại (copy theo row group / record batch, không convert
+    qua pandas) rồi thay thế file cũ.
+    """
+
+    def __init__(self, writer_class, path: str, table: str, compression: str = None):
+        self.writer_class = writer_class
+        self.path = path
+        self.table = table
+        self.compression = compression
+        self._part = writer_class(f"{path}.append", table, compression)
+
+    def write(self, df: pd.DataFrame):
+        self._part.write(df)
+
+    def close(self):
+        self._part.close()
+        merged_file = f"{self.path}.merge"
+        self.writer_class.concatenate([self.path, self._part.path], merged_file, self.table, self.compression)
+        os.replace(merged_file, self.path)
+        os.remove(self._part.path)
+
+
+WRITERS = {
+    'csv': CsvTableWriter,
+    'parquet': ParquetTableWriter,
+    'arrow': ArrowTableWriter,
+}
+
+
+def _writer_class(output_format: str):
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output_format '{output_format}', expected one of {OUTPUT_FORMATS}")
+    return WRITERS[output_format]
+
+
+def output_path(output_prefix: str, table: str, output_format: str) -> str:
+    """File path của một bảng, ví dụ output/banking_data_customers.parquet"""
+    return f"{output_prefix}_{table}.{FILE_EXTENSIONS[output_format]}"
+
+
+def open_table_writer(output_format: str, path: str, table: str, compression: str = None,
+                      append: bool = False):
+    """Open a writer for one table; append: ghi nối vào file đã có (chưa có file -> tạo mới)"""
+    writer_class = _writer_class(output_format)
+    if append and os.path.exists(path):
+        return writer_class.appender(path, table, compression)
+    return writer_class(path, table, compression)
+
+
+def write_table(output_format: str, df: pd.DataFrame, path: str, table: str, compression: str = None):
+    """Ghi cả một DataFrame ra file trong một lần"""
+    writer = open_table_writer(output_format, path, table, compression)
+    writer.write(df)
+    writer.close()
+
+
+def replace_table(output_format: str, df: pd.DataFrame, path: str, table: str, compression: str = None):
+    """Ghi lại cả một bảng: ghi ra file tạm rồi thay file cũ (lỗi giữa chừng -> file cũ còn nguyên)"""
+    temp_file = f"{path}.tmp"
+    write_table(output_format, df, temp_file, table, compression)
+    os.replace(temp_file, path)
+
+
+def read_table(output_format: str, path: str, table: str) -> pd.DataFrame:
+    """Đọc lại một bảng đã ghi (incremental mode); dtypes của bảng: table_dtypes.apply_table_dtypes
+    
+    CSV: cột string/category đọc dạng string (ID, customer_code không bị parse thành số).
+    """
+    _writer_class(output_format)
+    if output_format == 'csv':
+        if os.path.getsize(path) == 0:
+            return pd.DataFrame(columns=[column for column, _ in table_columns(table)])
+        text_columns = {column: str for column, kind in TABLE_SCHEMAS[table] if kind in ('string', 'category')}
+        return pd.read_csv(path, dtype=text_columns)
+    _require_pyarrow(output_format)
+    if output_format == 'parquet':
+        return pq.read_table(path).to_pandas()
+    with pa.OSFile(path, 'rb') as source:
+        return pa_ipc.open_stream(source).read_all().to_pandas()
+
+
+def concatenate_parts(output_format: str, part_files: List[str], output_file: str, table: str,
+                      compression: str = None):
+    """Nối part files (theo thứ tự) thành file cuối cùng rồi xóa part files"""
+    _writer_class(output_format).concatenate(part_files, output_file, table, compression)
+    for part_file in part_files:
+        os.remove(part_file)
@@ -0,0 +1,113 @@
+"""
+Stage DAG cho NewMainGenerator
+Pipeline được mô tả bằng các Stage với inputs / outputs (tên artifact) tường minh:
+
+    customers -> accounts -> transactions -> update_account_balances   (savings branch)
+              -> card_master -> cards_from_txn                          (card branch)
+                                cards_from_txn -> cards -> card_transactions
+
+Card branch: stage card_master sinh card master (bảng cards_from_txn) một lần; cards là projection
+của master và card_transactions được sinh trên các cards đó, nên cả hai bảng đều suy ra từ master.
+
+StageGraph.plan() chỉ giữ lại các stage cần cho các bảng được yêu cầu (pruning), và
+StageGraph.run() chạy mỗi stage ngay khi đủ inputs, nên các branch độc lập (savings / card)
+chạy song song trên thread pool. Mỗi generator có RNG substream riêng nên output không
+phụ thuộc thứ tự chạy giữa các branch. Metrics của stage dùng CPU time của thread chạy stage
+(time.thread_time), peak RSS chỉ được đo cho cả run (xem run_metrics.RunMetrics).
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+
+@dataclass
+class Stage:
+    """Một stage: fn(*inputs) (theo thứ tự inputs) trả về output (một output) hoặc tuple theo thứ tự outputs"""
+    name: str
+    fn: Callable
+    inputs: List[str]
+    outputs: List[str]
+    description: str = ''
+    # Output dùng để đếm rows cho metrics (mặc định: output đầu tiên)
+    rows_from: str = None
+
+    def __post_init__(self):
+        self.rows_from = self.rows_from or self.outputs[0]
+
+    def run(self, inputs: Dict) -> Dict:
+        """Chạy fn với inputs (theo thứ tự self.inputs), trả về {output: value}"""
+        result = self.fn(*(inputs[name] for name in self.inputs))
+        return dict(zip(self.outputs, result if len(self.outputs) > 1 else (result,)))
+
+
+@dataclass
+class StageGraph:
+    """DAG các stage, khai báo theo thứ tự topo (mỗi artifact có đúng một stage sinh ra)"""
+    stages: List[Stage] = field(default_factory=list)
+
+    def __post_init__(self):
+        self._producers: Dict[str, Stage] = {}
+        for stage in self.stages:
+            for output in stage.outputs:
+                if output in self._producers:
+                    raise ValueError(f"Artifact '{output}' is produced by both "
+                                     f"'{self._producers[output].name}' and '{stage.name}'")
+                self._producers[output] = stage
+
+    @property
+    def artifacts(self) -> List[str]:
+        return list(self._producers)
+
+    def plan(self, outputs: List[str], available: List[str] = ()) -> List[Stage]:
+        """Các stage cần chạy để có outputs (đã có available), theo thứ tự khai báo"""
+        needed = set()
+        pending = [name for name in outputs if name not in available]
+        while pending:
+            name = pending.pop()
+            if name not in self._producers:
+                raise KeyError(f"Unknown artifact '{name}', expected one of {self.artifacts}")
+            stage = self._producers[name]
+            if stage.name not in needed:
+                needed.add(stage.name)
+                pending.extend(i for i in stage.inputs if i not in available)
+        return [stage for stage in self.stages if stage.name in needed]
+
+    def run(self, outputs: List[str], inputs: Dict = None, max_workers: int = 1,
+            metrics=None, verbose: bool = False) -> Dict:
+        """Chạy các stage cần cho outputs, stage nào đủ inputs thì chạy ngay (song song nếu max_workers > 1)
+
+        inputs: artifacts có sẵn (ví dụ customers của một chunk) -> stage sinh ra chúng được bỏ qua.
+        metrics: RunMetrics, mỗi stage được đo bằng metrics.stage(stage.name).
+        """
+        available = dict(inputs or {})
+        pending = self.plan(outputs, list(available))
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            running = {}
+            while pending or running:
+                ready = [stage for stage in pending if all(i in available for i in stage.inputs)]
+                for stage in ready:
+                    pending.remove(stage)
+                    stage_inputs = {name: available[name] for name in stage.inputs}
+                    running[pool.submit(self._run_stage, stage, stage_inputs, metrics, verbose)] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    available.update(future.result())
+
+        return {name: available[name] for name in outputs}
+
+    @staticmethod
+    def _run_stage(stage: Stage, inputs: Dict, metrics, verbose: bool) -> Dict:
+        if verbose:
+            print(f"\n[STAGE] {stage.description or stage.name}...")
+        if metrics is None:
+            values = stage.run(inputs)
+        else:
+            with metrics.stage(stage.name) as run:
+                values = stage.run(inputs)
+                run.rows = len(values[stage.rows_from])
+        if verbose:
+            print(f"   [SUCCESS] {stage.name}: {len(values[stage.rows_from]):,} rows")
+        return values
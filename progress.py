@@ -0,0 +1,79 @@
+"""
+Progress Reporter cho các vòng lặp dài của NewMainGenerator (chunks của streaming mode, shards
+của parallel mode). Báo processed/total, throughput và ETA với tần suất giới hạn (mặc định tối đa
+1 dòng mỗi giây), nên update() không ghi stdout ở mỗi vòng. Tắt hoàn toàn khi
+config.SHOW_PROGRESS = False (library mode).
+"""
+
+import time
+
+
+class ProgressReporter:
+    """Rate-limited progress cho một vòng lặp có tổng số phần tử biết trước
+    
+    In tối đa một dòng mỗi min_interval giây; min_percent > 0 thì còn phải tiến thêm ít nhất
+    min_percent % kể từ dòng trước. Vòng lặp chạy xong dưới min_interval thì không in gì.
+    """
+
+    def __init__(self, label: str, total: int, min_interval: float = 1.0, min_percent: float = 0.0):
+        self.label = label
+        self.total = max(int(total), 0)
+        self.done = 0
+        self.min_interval = min_interval
+        self._percent_step = int(self.total * min_percent / 100)
+        self._start = time.monotonic()
+        self._next_time = self._start + min_interval
+        self._next_count = self._percent_step
+        self._last_reported = 0
+
+    def update(self, n: int = 1):
+        """Cộng n phần tử đã xử lý; chỉ in khi đã qua min_interval (và mốc min_percent)"""
+        self.done += n
+        if self.done >= self._next_count and time.monotonic() >= self._next_time:
+            self._report()
+
+    def close(self):
+        """Dòng cuối cùng (100%), chỉ in nếu đã từng báo progress"""
+        if self._last_reported and self.done != self._last_reported:
+            self._report()
+
+    def _report(self):
+        now = time.monotonic()
+        elapsed = now - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = (self.total - self.done) / rate if rate > 0 else 0.0
+        percent = self.done / self.total * 100 if self.total else 100.0
+        print(f"   [PROGRESS] {self.label}: {self.done:,}/{self.total:,} ({percent:.0f}%) "
+              f"{rate:,.0f}/s, ETA {remaining:,.0f}s")
+        self._next_time = now + self.min_interval
+        self._next_count = self.done + self._percent_step
+        self._last_reported = self.done
+
+    def __enter__(self) -> 'ProgressReporter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class NullProgress:
+    """Progress không làm gì (library mode)"""
+
+    def update(self, n: int = 1):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self) -> 'NullProgress':
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def make_progress(config, label: str, total: int):
+    """ProgressReporter nếu config.SHOW_PROGRESS, ngược lại NullProgress"""
+    if getattr(config, 'SHOW_PROGRESS', False):
+        return ProgressReporter(label, total)
+    return NullProgress()
@@ -0,0 +1,84 @@
+"""
+Run Manifest của một dataset đã sinh
+Được ghi cạnh output files ở cuối mỗi run (streaming / parallel / export) và cập nhật sau mỗi lần
+sinh tiếp (incremental mode), gồm những gì cần để sinh thêm mà không sinh lại cả dataset:
+- customer_id cuối cùng theo segment: customers mới được đánh số tiếp, customer_code không trùng
+- kỳ dữ liệu đã có [start_date, end_date]: kéo dài END_DATE chỉ sinh transactions cho phần mới
+- seed gốc + next_shard: mỗi lần sinh tiếp dùng context.for_shard(next_shard), tức seed riêng và
+  key space riêng cho ID allocators, nên keys không trùng với các lần trước và vẫn tái lập được
+"""
+
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List
+
+DATE_FIELDS = ('as_of', 'start_date', 'end_date')
+
+
+def manifest_path(output_prefix: str) -> str:
+    """File manifest mặc định của dataset, ví dụ output/banking_data_manifest.json"""
+    return f"{output_prefix}_manifest.json"
+
+
+@dataclass
+class RunManifest:
+    """Trạng thái của dataset đã sinh (output files, customer_id cuối, kỳ dữ liệu, seed)"""
+    seed: int
+    as_of: datetime
+    start_date: datetime
+    end_date: datetime
+    output_prefix: str
+    output_format: str
+    tables: List[str]
+    surrogate_keys: bool = False
+    num_customers: int = 0
+    last_customer_ids: Dict[str, int] = field(default_factory=dict)
+    # Shard (seed + key space) cho lần sinh tiếp theo; run đầu dùng shard 0 (parallel: 0..num_shards-1)
+    next_shard: int = 1
+    row_counts: Dict[str, int] = field(default_factory=dict)
+    increments: List[Dict] = field(default_factory=list)
+
+    @property
+    def next_customer_id(self) -> int:
+        """customer_id của customer mới tiếp theo (customer_id tăng liên tục qua các segment)"""
+        return max(self.last_customer_ids.values(), default=0) + 1
+
+    def add_customers(self, num_customers: int, last_customer_ids: Dict[str, int]):
+        """Cộng thêm customers mới (last_customer_ids: customer_id cuối của các segment có customer mới)"""
+        self.num_customers += num_customers
+        self.last_customer_ids.update(last_customer_ids)
+
+    def add_rows(self, row_counts: Dict[str, int]):
+        for table, rows in row_counts.items():
+            self.row_counts[table] = self.row_counts.get(table, 0) + rows
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        for name in DATE_FIELDS:
+            data[name] = data[name].isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RunManifest':
+        data = dict(data)
+        for name in DATE_FIELDS:
+            data[name] = datetime.fromisoformat(data[name])
+        return cls(**data)
+
+    def save(self, path: str) -> str:
+        """Ghi manifest ra JSON"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+        print(f"[MANIFEST] Run manifest saved to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'RunManifest':
+        """Đọc manifest của một run trước"""
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Run manifest not found: {path} (generate the dataset first)")
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,185 @@
+"""
+Run Metrics cho NewMainGenerator
+Ghi lại wall time, CPU time, số rows, rows/sec cho từng stage (và từng lần export), peak memory
+cho cả run, gọi các hooks (on_stage_start / on_stage_end / on_chunk) và xuất run report JSON.
+
+Các branch của stage DAG chạy song song trên threads: CPU time của stage là time.thread_time()
+của thread chạy stage (process_time tính cả các thread khác), còn peak RSS là của cả process nên
+không tách được theo stage và chỉ được báo cáo cho cả run.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def reset_peak_rss():
+    """Reset high-water mark RSS của process (Linux >= 4.0), bỏ qua nếu không hỗ trợ
+
+    Opt-in, không được gọi tự động: ghi '5' vào /proc/self/clear_refs reset VmHWM của cả process
+    (mọi thread, mọi phép đo khác đang chạy). Chỉ caller đo tuần tự tự gọi, ví dụ
+    benchmark.py --reset-peak-rss.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS (MB) kể từ lần reset gần nhất; fallback: peak của cả process"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS trả về bytes, Linux trả về KB
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class GenerationHooks:
+    """Base class cho hooks: override các method cần dùng (mặc định không làm gì)"""
+
+    def on_stage_start(self, stage: str):
+        pass
+
+    def on_stage_end(self, stage: str, metrics: Dict):
+        """metrics: wall_seconds, cpu_seconds (thread chạy stage), rows, rows_per_sec của lần chạy này;
+        stage lỗi: failed = 1 và error = 'ExceptionType: message' (exception vẫn được raise tiếp)"""
+        pass
+
+    def on_chunk(self, chunk_index: int, row_counts: Dict[str, int]):
+        """Gọi sau mỗi chunk (streaming) / shard (parallel) với số rows mỗi bảng của chunk đó"""
+        pass
+
+
+class StageRun:
+    """Một lần chạy stage: caller gán .rows để tính rows/sec"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.rows = 0
+
+
+class RunMetrics:
+    """Thu thập metrics theo stage; chạy cùng stage nhiều lần (theo chunk) thì cộng dồn"""
+
+    def __init__(self, hooks: List[GenerationHooks] = None):
+        self.hooks = list(hooks or [])
+        self.stages: Dict[str, Dict] = {}
+        self.chunks: List[Dict] = []
+        # Stage DAG chạy các branch song song trên threads -> cộng dồn dưới lock
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        # Peak RSS của các worker process (parallel shards), gộp vào peak của run
+        self._worker_peak_rss_mb = 0.0
+
+    @contextmanager
+    def stage(self, name: str):
+        """Đo một stage: with metrics.stage('accounts') as run: ...; run.rows = len(accounts)
+
+        Stage lỗi vẫn được ghi nhận (failed, error) và on_stage_end vẫn được gọi trước khi
+        exception được raise tiếp.
+        """
+        for hook in self.hooks:
+            hook.on_stage_start(name)
+
+        run = StageRun(name)
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        error = None
+        try:
+            yield run
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            result = {
+                'wall_seconds': time.perf_counter() - start_wall,
+                'cpu_seconds': time.thread_time() - start_cpu,
+                'rows': run.rows,
+                'failed': int(error is not None)
+            }
+            if error is not None:
+                result['error'] = f"{type(error).__name__}: {error}"
+            self.merge_stage(name, result)
+            result['rows_per_sec'] = run.rows / result['wall_seconds'] if result['wall_seconds'] > 0 else None
+
+            for hook in self.hooks:
+                hook.on_stage_end(name, result)
+
+    def merge_stage(self, name: str, result: Dict):
+        """Cộng dồn một lần chạy (hoặc tổng của một shard) vào stage"""
+        with self._lock:
+            stage = self.stages.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0,
+                                                  'failed': 0, 'errors': []})
+            stage['calls'] += result.get('calls', 1)
+            stage['wall_seconds'] += result['wall_seconds']
+            stage['cpu_seconds'] += result['cpu_seconds']
+            stage['rows'] += result['rows']
+            stage['failed'] += result.get('failed', 0)
+            stage['errors'].extend(result.get('errors', [result['error']] if 'error' in result else []))
+
+    def merge_peak_rss(self, worker_peak_rss_mb: float):
+        """Gộp peak RSS của một worker process (shard) vào peak của run"""
+        with self._lock:
+            self._worker_peak_rss_mb = max(self._worker_peak_rss_mb, worker_peak_rss_mb)
+
+    def chunk(self, chunk_index: int, row_counts: Dict[str, int]):
+        """Ghi nhận một chunk đã xong và gọi on_chunk hooks"""
+        self.chunks.append({'chunk_index': chunk_index, 'row_counts': dict(row_counts)})
+        for hook in self.hooks:
+            hook.on_chunk(chunk_index, row_counts)
+
+    def report(self) -> Dict:
+        """Run report: tổng thời gian + metrics từng stage (rows/sec tính trên wall time)"""
+        stages = {}
+        for name, stage in self.stages.items():
+            wall = stage['wall_seconds']
+            stages[name] = {
+                'calls': stage['calls'],
+                'wall_seconds': round(wall, 4),
+                'cpu_seconds': round(stage['cpu_seconds'], 4),
+                'rows': stage['rows'],
+                'rows_per_sec': round(stage['rows'] / wall, 1) if wall > 0 else None,
+                'failed': stage['failed']
+            }
+            if stage['errors']:
+                stages[name]['errors'] = stage['errors']
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self._start_wall, 4),
+            'cpu_seconds': round(time.process_time() - self._start_cpu, 4),
+            # Peak RSS cả run: process này và các worker process (không đo theo stage)
+            'peak_rss_mb': round(max(peak_rss_mb(), self._worker_peak_rss_mb), 1),
+            'stages': stages,
+            'chunks': self.chunks
+        }
+
+    def write_report(self, path: str, extra: Dict = None) -> str:
+        """Ghi run report ra JSON"""
+        report = self.report()
+        report.update(extra or {})
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"[REPORT] Run report saved to {path}")
+        return path
@@ -0,0 +1,104 @@
+"""
+Weighted Samplers dùng chung cho các generator
+Mỗi phân bố có trọng số (dict value -> weight) được compile một lần thành alias table (Vose)
+để mỗi lần sinh chỉ tốn O(1), thay cho random.choices(list(d.keys()), weights=list(d.values()))
+phải dựng lại list và quét cumulative weights O(n) ở mỗi lần gọi.
+"""
+
+import random
+import numpy as np
+from typing import Dict, List, Sequence
+
+
+class WeightedSampler:
+    """Alias-table sampler cho một phân bố rời rạc có trọng số"""
+
+    def __init__(self, values: Sequence, weights: Sequence[float]):
+        if len(values) != len(weights):
+            raise ValueError("values và weights phải có cùng độ dài")
+        if len(values) == 0:
+            raise ValueError("Phân bố phải có ít nhất một giá trị")
+
+        weights = np.asarray(weights, dtype=float)
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("Weights phải không âm và có tổng > 0")
+
+        self.values = list(values)
+        self.weights = (weights / weights.sum()).tolist()
+        self._values_array = np.empty(len(self.values), dtype=object)
+        self._values_array[:] = self.values
+        self.prob, self.alias = self._build_alias_table(np.asarray(self.weights))
+
+        # Bản list để scalar draw không phải đi qua NumPy
+        self._prob_list = self.prob.tolist()
+        self._alias_list = self.alias.tolist()
+        self._n = len(self.values)
+
+    @classmethod
+    def from_dict(cls, distribution: Dict) -> 'WeightedSampler':
+        """Compile a {value: weight} dict"""
+        return cls(list(distribution.keys()), list(distribution.values()))
+
+    @staticmethod
+    def _build_alias_table(p: np.ndarray):
+        """Vose's alias method: O(n) build, O(1) draw"""
+        n = len(p)
+        scaled = p * n
+        prob = np.zeros(n, dtype=float)
+        alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+        # Phần còn lại (do sai số làm tròn) có xác suất 1
+        for i in large + small:
+            prob[i] = 1.0
+
+        return prob, alias
+
+    def draw(self, rng=None):
+        """Draw one value (rng: random.Random hoặc module random)"""
+        u = (rng or random).random() * self._n
+        i = int(u)
+        if u - i < self._prob_list[i]:
+            return self.values[i]
+        return self.values[self._alias_list[i]]
+
+    def draw_codes(self, k: int, rng: np.random.Generator = None) -> np.ndarray:
+        """Draw k value indices as an int64 array"""
+        rng = rng or np.random.default_rng()
+        return self.codes_from_uniform(rng.random(k))
+    
+    def codes_from_uniform(self, u: np.ndarray) -> np.ndarray:
+        """Map uniforms in [0, 1) to value indices (cho caller tự quản lý random stream)"""
+        u = u * self._n
+        i = u.astype(np.int64)
+        return np.where(u - i < self.prob[i], i, self.alias[i])
+
+    def values_from_uniform(self, u: np.ndarray) -> np.ndarray:
+        """Map uniforms in [0, 1) to values as an object array"""
+        return self._values_array[self.codes_from_uniform(u)]
+    
+    def draw_many(self, k: int, rng: np.random.Generator = None) -> np.ndarray:
+        """Draw k values as an object array"""
+        return self._values_array[self.draw_codes(k, rng)]
+
+
+def compile_samplers(distributions: Dict[str, Dict]) -> Dict[str, WeightedSampler]:
+    """Compile a {key: {value: weight}} mapping (ví dụ theo segment) into samplers"""
+    return {key: WeightedSampler.from_dict(distribution) for key, distribution in distributions.items()}
+
+
+def compile_list_samplers(values_by_key: Dict[str, List], weights_by_key: Dict[str, List[float]]) -> Dict[str, WeightedSampler]:
+    """Compile parallel {key: values} / {key: weights} mappings into samplers"""
+    return {key: WeightedSampler(values_by_key[key], weights_by_key[key]) for key in values_by_key}
@@ -7,12 +7,18 @@ D(20%) - Stable Savers: Mix term và demand saving, lãi trung bình
 E(30%) - New/Occasional Users: Chủ yếu demand saving, ít term ngắn hạn, lãi thấp
 """
 
-import random
-from datetime import datetime, timedelta
-from typing import List, Dict
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import List, Dict, Tuple, Union
 from dataclasses import dataclass
 
-from test_config import test_config
+from test_config import test_config, GenerationContext
+from samplers import WeightedSampler, compile_samplers
+from ledger import apply_ledger
+from id_allocator import child_ids
+from table_dtypes import (apply_table_dtypes, frame_to_python_columns, minor_units,
+                          DAY_DTYPE, NO_DATE, day_ordinal)
 
 @dataclass
 class NewAccount:
@@ -32,9 +38,24 @@ class NewAccount:
 class NewAccountGenerator:
     """New Account Generator với logic mới theo phân khúc"""
     
-    def __init__(self, config: test_config = None):
+    ACCOUNT_COLUMNS = list(NewAccount.__dataclass_fields__)
+    # Mỗi account dùng một hàng uniforms, mỗi cột là một thuộc tính
+    ACCOUNT_UNIFORMS = ['product_type', 'term_months', 'open_date', 'interest_rate',
+                        'status', 'channel', 'currency']
+    
+    def __init__(self, config: test_config = None, context: GenerationContext = None):
         self.config = config or test_config()
         
+        # RNG + clock context (substream riêng cho bảng accounts)
+        self.context = context or self.config.make_context()
+        self.np_rng = self.context.numpy('accounts')
+        # Số accounts mỗi customer lấy từ substream riêng (batch engine không phụ thuộc cách chia chunk)
+        self.np_count_rng = self.context.numpy('accounts_count')
+        # Integer surrogate keys (config.SURROGATE_KEYS), cấp theo block từ key space của shard
+        self.account_keys = self.context.id_allocator('ACC_')
+        # Substream cho overdraft_policy='redraw' của ledger
+        self.ledger_rng = self.context.numpy('ledger')
+        
         # Channels
         self.channels = ['mobile/internet', 'atm', 'branch']
         
@@ -132,149 +153,173 @@ class NewAccountGenerator:
             'D': 0.98,   # Stable Savers: Lãi suất ổn định
             'E': 0.85    # New/Occasional Users: Lãi suất thấp nhất
         }
+        
+        # Compiled samplers (alias table) cho các phân bố có trọng số
+        self.currency_sampler = WeightedSampler.from_dict(self.currency_distribution)
+        self.status_sampler = WeightedSampler.from_dict(self.status_distribution)
+        self.term_months_samplers = compile_samplers({
+            segment: preferences['term_months_distribution']
+            for segment, preferences in self.segment_account_preferences.items()
+        })
+        
+        # Thứ tự categories cố định cho các cột Categorical (table_dtypes)
+        self.categories = {
+            'product_type': ['term_saving', 'demand_saving'],
+            'status': list(self.status_distribution),
+            'channel_opened': self.channels,
+            'currency': list(self.currency_distribution),
+        }
 
     def generate_accounts_for_customers(self, customers: List[Dict], 
                                       start_date: datetime, end_date: datetime) -> List[NewAccount]:
-        """Generate accounts for all customers based on their segments"""
+        """Generate accounts for all customers based on their segments (batch engine, xem generate_accounts_frame)"""
+        return self._frame_to_accounts(self.generate_accounts_frame(customers, start_date, end_date))
+
+    def generate_accounts_frame(self, customers: Union[pd.DataFrame, List[Dict]],
+                                start_date: datetime, end_date: datetime,
+                                rng: np.random.Generator = None,
+                                count_rng: np.random.Generator = None) -> pd.DataFrame:
+        """Sinh accounts theo batch (NumPy) - trả về DataFrame có các cột của NewAccount
         
-        all_accounts = []
+        Số accounts mỗi customer nằm trong [min_accounts, max_accounts] của segment, sinh cho mọi customer
+        một lần rồi mở rộng bằng repeat/cumsum, sau đó mỗi thuộc tính (loại sổ, kỳ hạn, ngày mở,
+        ngày đáo hạn, lãi suất theo segment_interest_adjustments, status, channel, currency)
+        là một array. Index của DataFrame là customer_index (vị trí customer trong input).
+        """
+        rng = rng or self.np_rng
+        count_rng = count_rng or self.np_count_rng
         
-        for customer in customers:
-            customer_code = customer['customer_code']
-            segment = customer['customer_segment']
-            
-            # Generate accounts for this customer
-            accounts = self._generate_accounts_for_customer(
-                customer_code, segment, start_date, end_date
-            )
-            all_accounts.extend(accounts)
+        customers_df = customers if isinstance(customers, pd.DataFrame) else pd.DataFrame(list(customers))
+        if customers_df.empty:
+            key_columns = ['account_key'] if self.config.SURROGATE_KEYS else []
+            accounts_df = pd.DataFrame(columns=key_columns + self.ACCOUNT_COLUMNS,
+                                       index=pd.Index([], name='customer_index'))
+            return apply_table_dtypes(accounts_df, 'accounts', self.categories)
         
-        return all_accounts
-
-    def _generate_accounts_for_customer(self, customer_code: str, segment: str,
-                                      start_date: datetime, end_date: datetime) -> List[NewAccount]:
-        """Generate accounts for a specific customer based on segment"""
+        customer_codes = customers_df['customer_code'].to_numpy(dtype=object)
+        segment_list = list(self.segment_account_preferences)
+        segment_codes, segment_values = pd.factorize(customers_df['customer_segment'].to_numpy(dtype=object))
+        unknown = [segment for segment in segment_values if segment not in self.segment_account_preferences]
+        if unknown:
+            raise KeyError(unknown[0])
+        customer_segment = np.array([segment_list.index(segment) for segment in segment_values],
+                                    dtype=np.int64)[segment_codes]
         
-        preferences = self.segment_account_preferences[segment]
-        accounts = []
+        # Bảng tham số theo segment (index theo vị trí trong segment_account_preferences)
+        preferences = [self.segment_account_preferences[segment] for segment in segment_list]
+        min_accounts = np.array([p['min_accounts'] for p in preferences])
+        max_accounts = np.array([p['max_accounts'] for p in preferences])
+        term_saving_ratio = np.array([p['term_saving_ratio'] for p in preferences])
+        interest_adjustment = np.array([self.segment_interest_adjustments[segment] for segment in segment_list])
         
-        # Determine number of accounts for this customer
-        num_accounts = random.randint(preferences['min_accounts'], preferences['max_accounts'])
+        # Số accounts mỗi customer, mở rộng thành một row mỗi account
+        low = min_accounts[customer_segment]
+        counts = low + (count_rng.random(len(customers_df)) * (max_accounts[customer_segment] - low + 1)).astype(np.int64)
+        n = int(counts.sum())
+        customer_index = np.repeat(np.arange(len(customers_df)), counts)
+        account_number = np.arange(n) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        segment = customer_segment[customer_index]
         
-        for i in range(num_accounts):
-            # Generate account ID
-            account_id = f"ACC_{customer_code}_{i+1:02d}"
-            
-            # Determine product type based on segment preferences
-            if random.random() < preferences['term_saving_ratio']:
-                product_type = 'term_saving'
-                # Select term months based on segment distribution
-                term_months = random.choices(
-                    list(preferences['term_months_distribution'].keys()),
-                    weights=list(preferences['term_months_distribution'].values()),
-                    k=1
-                )[0]
-            else:
-                product_type = 'demand_saving'
-                term_months = 0
-            
-            # Generate open date
-            open_date = self._generate_random_date(start_date, end_date)
-            
-            # Generate maturity date based on product type
-            if product_type == 'demand_saving':
-                maturity_date = None
-            else:
-                maturity_date = open_date + timedelta(days=term_months * 30)
-            
-            # Generate interest rate based on term months and segment
-            min_rate, max_rate = self.interest_rate_ranges[term_months]
-            base_rate = random.uniform(min_rate, max_rate)
-            
-            # Apply segment-specific adjustment
-            segment_adjustment = self.segment_interest_adjustments[segment]
-            interest_rate = round(base_rate * segment_adjustment, 5)
-            
-            # Generate status
-            status = random.choices(
-                list(self.status_distribution.keys()),
-                weights=list(self.status_distribution.values()),
-                k=1
-            )[0]
-            
-            # Generate channel
-            channel_opened = random.choice(self.channels)
-            
-            # Generate currency
-            currency = random.choices(
-                list(self.currency_distribution.keys()),
-                weights=list(self.currency_distribution.values()),
-                k=1
-            )[0]
-            
-            # Initial balance
-            current_balance = 0.0
-            
-            account = NewAccount(
-                account_id=account_id,
-                customer_code=customer_code,
-                product_type=product_type,
-                open_date=open_date,
-                maturity_date=maturity_date,
-                term_months=term_months,
-                interest_rate=interest_rate,
-                status=status,
-                channel_opened=channel_opened,
-                currency=currency,
-                current_balance=current_balance
-            )
-            
-            accounts.append(account)
+        u = rng.random((n, len(self.ACCOUNT_UNIFORMS)))
+        col = {name: u[:, i] for i, name in enumerate(self.ACCOUNT_UNIFORMS)}
         
-        return accounts
-
-    def _generate_random_date(self, start_date: datetime, end_date: datetime) -> datetime:
-        """Generate random date between start and end"""
-        time_between_dates = end_date - start_date
-        days_between_dates = time_between_dates.days
-        random_number_of_days = random.randrange(days_between_dates)
-        random_date = start_date + timedelta(days=random_number_of_days)
-        return random_date
+        # Loại sổ + kỳ hạn (demand_saving -> 0 tháng)
+        is_term = col['product_type'] < term_saving_ratio[segment]
+        term_months = np.zeros(n, dtype=np.int64)
+        for i, name in enumerate(segment_list):
+            mask = is_term & (segment == i)
+            if mask.any():
+                sampler = self.term_months_samplers[name]
+                term_months[mask] = np.array(sampler.values, dtype=np.int64)[sampler.codes_from_uniform(col['term_months'][mask])]
+        product_type = np.where(is_term, 'term_saving', 'demand_saving').astype(object)
+        
+        # Ngày mở trong [start_date, end_date), đáo hạn = ngày mở + term_months * 30 ngày (day ordinals)
+        days = (col['open_date'] * (end_date - start_date).days).astype(np.int64)
+        open_date = (day_ordinal(start_date) + days).astype(DAY_DTYPE)
+        maturity_date = np.where(is_term, open_date + term_months * 30, NO_DATE).astype(DAY_DTYPE)
+        
+        # Lãi suất theo kỳ hạn, nhân hệ số của segment
+        rate_terms = np.array(sorted(self.interest_rate_ranges))
+        rate_ranges = np.array([self.interest_rate_ranges[term] for term in rate_terms])
+        min_rate, max_rate = rate_ranges[np.searchsorted(rate_terms, term_months)].T
+        base_rate = min_rate + col['interest_rate'] * (max_rate - min_rate)
+        interest_rate = np.round(base_rate * interest_adjustment[segment], 5)
+        
+        account_code = customer_codes[customer_index]
+        columns = {
+            'account_id': child_ids('ACC_', account_code, account_number, 2),
+            'customer_code': account_code,
+            'product_type': product_type,
+            'open_date': open_date,
+            'maturity_date': maturity_date,
+            'term_months': term_months,
+            'interest_rate': interest_rate,
+            'status': self.status_sampler.values_from_uniform(col['status']),
+            'channel_opened': np.array(self.channels, dtype=object)[(col['channel'] * len(self.channels)).astype(np.int64)],
+            'currency': self.currency_sampler.values_from_uniform(col['currency']),
+            'current_balance': np.zeros(n, dtype=np.int64)
+        }
+        if self.config.SURROGATE_KEYS:
+            columns = {'account_key': self.account_keys.allocate(n), **columns}
+        accounts_df = pd.DataFrame(columns, index=pd.Index(customer_index, name='customer_index'))
+        return apply_table_dtypes(accounts_df, 'accounts', self.categories)
+    
+    def _frame_to_accounts(self, accounts_df: pd.DataFrame) -> List[NewAccount]:
+        """Convert DataFrame accounts sang List[NewAccount] (datetime Python, NaT -> None)"""
+        columns = frame_to_python_columns(accounts_df, 'accounts', self.ACCOUNT_COLUMNS)
+        return [NewAccount(*row) for row in zip(*columns)]
 
     def update_account_balances(self, accounts: List[NewAccount], 
                               transactions: List[Dict]) -> List[NewAccount]:
-        """Update account balances based on transactions"""
+        """Update account balances based on transactions (ledger engine, xem update_account_balances_frame)
         
-        # Group transactions by account
-        account_transactions = {}
-        for txn in transactions:
-            account_id = txn['account_id']
-            if account_id not in account_transactions:
-                account_transactions[account_id] = []
-            account_transactions[account_id].append(txn)
+        Running balance (và amount khi clamp/redraw) được ghi ngược vào các transaction dicts.
+        """
+        if not transactions:
+            return accounts
         
-        # Update balances for each account
+        transactions_df, final_balances = self._apply_ledger(pd.DataFrame(transactions))
+        updated_columns = [column for column in ('balance', 'amount', 'tran_amt_acy', 'tran_amt_lcy')
+                           if column in transactions_df]
+        for txn, values in zip(transactions, zip(*(transactions_df[c].tolist() for c in updated_columns))):
+            txn.update(zip(updated_columns, values))
+        
+        balances = final_balances.to_dict()
         for account in accounts:
-            if account.account_id in account_transactions:
-                # Sort transactions by date
-                txns = sorted(account_transactions[account.account_id], 
-                            key=lambda x: x['transaction_date'])
-                
-                # Calculate balance
-                current_balance = 0.0
-                for txn in txns:
-                    if txn['transaction_type'] in ['Deposit', 'Fund Transfer']:
-                        current_balance += txn['amount']
-                    elif txn['transaction_type'] in ['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction']:
-                        current_balance -= txn['amount']
-                
-                account.current_balance = current_balance
+            if account.account_id in balances:
+                account.current_balance = balances[account.account_id]
         
         return accounts
 
+    def update_account_balances_frame(self, accounts_df: pd.DataFrame,
+                                      transactions_df: pd.DataFrame,
+                                      opening_balances: pd.Series = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Ledger stage trên bảng columnar: trả về (accounts_df, transactions_df) đã cập nhật
+        
+        transactions_df có cột balance là số dư thật sau mỗi transaction; current_balance của
+        account = số dư sau transaction cuối cùng (account không có transaction giữ nguyên).
+        Withdrawals làm số dư âm được xử lý theo config.OVERDRAFT_POLICY.
+        opening_balances: số dư đầu kỳ (minor units) theo account_id (mặc định 0), ví dụ khi kéo dài kỳ dữ liệu.
+        """
+        transactions_df, final_balances = self._apply_ledger(transactions_df, opening_balances)
+        accounts_df = accounts_df.copy()
+        # Bảng typed: amount, balance và current_balance đều là int64 minor units
+        position = final_balances.index.get_indexer(accounts_df['account_id'].to_numpy(dtype=object))
+        current_balance = minor_units(accounts_df['current_balance']).copy()
+        has_transactions = position >= 0
+        current_balance[has_transactions] = final_balances.to_numpy(dtype=np.int64)[position[has_transactions]]
+        accounts_df['current_balance'] = current_balance
+        return accounts_df, transactions_df
+
+    def _apply_ledger(self, transactions_df: pd.DataFrame,
+                      opening_balances: pd.Series = None) -> Tuple[pd.DataFrame, pd.Series]:
+        """Số dư tính từ opening_balances (mặc định 0, giống cách tính cũ), overdraft theo config"""
+        return apply_ledger(transactions_df, opening_balances, overdraft=self.config.OVERDRAFT_POLICY,
+                            rng=self.ledger_rng)
+
 def main():
     """Test New Account Generator"""
-    generator = NewAccountGenerator()
+    generator = NewAccountGenerator(test_config(SHOW_PROGRESS=True))
     
     # Test data
     start_date = datetime(2023, 1, 1)
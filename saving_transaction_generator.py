@@ -5,14 +5,18 @@ Y(30%) - Cân bằng deposits/withdrawals
 Z(20%) - Tiêu ít tiền, nhiều withdrawals
 """
 
-import random
 import csv
 import os
-from datetime import datetime, timedelta
-from typing import List, Dict
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import List, Dict, Union
 from dataclasses import dataclass
 
-from test_config import test_config
+from test_config import test_config, GenerationContext
+from samplers import WeightedSampler
+from table_dtypes import (apply_table_dtypes, frame_to_python_columns, amount_values, AMOUNT_SCALE, DAY_DTYPE,
+                          day_ordinal, to_day_ordinals)
 
 @dataclass
 class NewTransaction:
@@ -38,9 +42,26 @@ class NewTransaction:
 class NewTransactionGenerator:
     """New Transaction Generator với hành vi khách hàng theo phân khúc"""
     
-    def __init__(self, config: test_config = None):
+    TRANSACTION_COLUMNS = list(NewTransaction.__dataclass_fields__)
+    # Mỗi transaction dùng một hàng uniforms, mỗi cột là một thuộc tính
+    TRANSACTION_UNIFORMS = ['account', 'recent', 'recent_day', 'day', 'deposit', 'type',
+                            'amount', 'currency', 'status', 'channel', 'balance']
+    DEPOSIT_TYPES = ['Deposit', 'Fund Transfer']
+    WITHDRAWAL_TYPES = ['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction']
+    CURRENCY_RATES = {'VND': 1, 'USD': 25, 'EUR': 30}
+    
+    def __init__(self, config: test_config = None, context: GenerationContext = None):
         self.config = config or test_config()
         
+        # RNG + clock context (substream riêng cho bảng transactions)
+        self.context = context or self.config.make_context()
+        self.np_rng = self.context.numpy('transactions')
+        # Số transactions của mỗi customer lấy từ substream riêng: cả hai stream đều được dùng
+        # theo thứ tự customer nên batch engine cho cùng kết quả với mọi cách chia chunk
+        self.np_count_rng = self.context.numpy('transactions_count')
+        # Transaction IDs cấp theo block từ key space của shard (không trùng, không random)
+        self.transaction_ids = self.context.id_allocator('TXN_')
+        
         # Transaction types
         self.transaction_types = [
             'Deposit', 'Principal Withdrawal', 'Interest Withdrawal', 
@@ -134,250 +155,173 @@ class NewTransactionGenerator:
                 'demand_saving_ratio': 0.8  # 80% demand_saving
             }
         }
+        
+        # Tỷ lệ transactions nằm trong recency_days gần nhất (recency bias theo phân khúc)
+        self.recent_ratio = {'A': 0.8, 'B': 0.4, 'C': 0.6, 'D': 0.7, 'E': 0.3}
+        
+        # Compiled samplers (alias table) cho các phân bố có trọng số
+        self.currency_sampler = WeightedSampler.from_dict(self.currency_distribution)
+        self.status_sampler = WeightedSampler.from_dict(self.status_distribution)
+        
+        # Thứ tự categories cố định cho các cột Categorical (table_dtypes)
+        self.categories = {
+            'transaction_type': self.transaction_types,
+            'channel_txn': self.channels,
+            'status_txn': list(self.status_distribution),
+            'currency': list(self.currency_distribution),
+            'account_type': ['term_saving', 'demand_saving'],
+        }
 
-    def generate_transactions_for_customer(self, customer_code: str, segment: str, 
-                                         accounts: List[Dict], start_date: datetime, 
-                                         end_date: datetime) -> List[NewTransaction]:
-        """Generate transactions for customer based on segment behavior"""
+    def generate_transactions_frame(self, customer_accounts: Union[pd.DataFrame, List[Dict]], start_date: datetime,
+                                    end_date: datetime, rng: np.random.Generator = None,
+                                    count_rng: np.random.Generator = None, months: float = None) -> pd.DataFrame:
+        """Sinh transactions theo batch (NumPy) - trả về DataFrame có các cột của NewTransaction
         
-        transactions = []
-        req = self.rfm_requirements[segment]
+        Chọn account, recency bias, loại deposit/withdrawal, amount, currency, status theo
+        rfm_requirements của phân khúc; mọi thuộc tính được sinh dưới dạng array qua bảng
+        tham số theo phân khúc.
+        Rows theo thứ tự customer, trong mỗi customer sắp xếp theo transaction_date.
+        months: số tháng dùng để tính số transactions (mặc định (end_date - start_date).days // 30);
+        có thể lẻ, ví dụ kỳ ngắn của incremental mode (main_generator.extend_end_date).
+        """
+        rng = rng or self.np_rng
+        count_rng = count_rng or self.np_count_rng
         
-        # Calculate total transactions needed based on frequency
-        months = (end_date - start_date).days // 30
-        min_transactions = req['frequency_per_month'][0] * months
-        max_transactions = req['frequency_per_month'][1] * months
-        total_transactions = random.randint(min_transactions, max_transactions)
+        # DataFrame: bảng accounts đã typed; list các dict: current_balance là major units
+        accounts_df = (customer_accounts if isinstance(customer_accounts, pd.DataFrame)
+                       else apply_table_dtypes(pd.DataFrame(list(customer_accounts)), 'accounts', {}, amounts='major'))
+        if accounts_df.empty:
+            key_columns = ['transaction_key'] if self.config.SURROGATE_KEYS else []
+            return apply_table_dtypes(pd.DataFrame(columns=key_columns + self.TRANSACTION_COLUMNS),
+                                      'transactions', self.categories)
         
-        print(f"   Generating {total_transactions} transactions for {customer_code} ({segment})")
+        # Customers theo thứ tự xuất hiện, segment lấy từ customer_code (A, B, C, D, E)
+        customer_index, customer_codes = pd.factorize(accounts_df['customer_code'].to_numpy(dtype=object))
+        customer_codes = np.asarray(customer_codes, dtype=object)
+        segments = [code.split('_')[0] for code in customer_codes]
+        segment_list = list(self.rfm_requirements)
+        customer_segment = np.array([segment_list.index(s) if s in self.rfm_requirements else -1 for s in segments])
         
-        # Generate transactions with segment-specific behavior
-        for i in range(total_transactions):
-            # Select random account
-            account = random.choice(accounts)
-            account_id = account['account_id']
-            
-            # Generate transaction date with recency bias
-            transaction_date = self._generate_transaction_date(start_date, end_date, segment, req)
-            
-            # Generate transaction type based on segment behavior
-            transaction_type = self._generate_transaction_type_by_segment(segment, req)
-            
-            # Generate amount based on segment and transaction type
-            amount = self._generate_amount_by_segment_and_type(segment, transaction_type, req)
-            
-            # Use account details from loaded data
-            term_month = account.get('term_months', 0)
-            maturity_date = account.get('maturity_date')
-            open_date = account.get('open_date')
-            account_type = account.get('product_type', 'term_saving')
-            
-            # Generate other transaction details
-            currency = random.choices(
-                list(self.currency_distribution.keys()),
-                weights=list(self.currency_distribution.values()),
-                k=1
-            )[0]
-            
-            tran_amt_lcy = amount * {'VND': 1, 'USD': 25, 'EUR': 30}.get(currency, 1)
-            
-            status = random.choices(
-                list(self.status_distribution.keys()),
-                weights=list(self.status_distribution.values()),
-                k=1
-            )[0]
-            
-            channel = random.choice(self.channels)
-            
-            # Use balance from account data with some variation
-            base_balance = account.get('current_balance', 0)
-            # Add some variation to balance (±20%)
-            variation = random.uniform(0.8, 1.2)
-            balance = int(base_balance * variation)
-            
-            transaction = NewTransaction(
-                transaction_id=f"TXN_{random.randint(100000, 999999)}",
-                account_id=account_id,
-                customer_code=customer_code,
-                transaction_date=transaction_date,
-                transaction_type=transaction_type,
-                transaction_desc=f"{transaction_type} transaction for {customer_code}",
-                amount=amount,
-                balance=balance,
-                channel_txn=channel,
-                status_txn=status,
-                tran_amt_acy=amount,
-                tran_amt_lcy=tran_amt_lcy,
-                currency=currency,
-                term_month=term_month,
-                maturity_date=maturity_date,
-                open_date=open_date,
-                account_type=account_type
-            )
-            
-            transactions.append(transaction)
+        skipped_customers = int((customer_segment < 0).sum())
+        if skipped_customers:
+            print(f"   [WARNING] Skipped {skipped_customers} customers with unknown segment")
         
-        # Sort by date
-        transactions.sort(key=lambda x: x.transaction_date)
+        # Bảng tham số theo segment (index theo vị trí trong rfm_requirements)
+        req = [self.rfm_requirements[s] for s in segment_list]
+        param = lambda key: np.array([r[key] for r in req])
+        frequency = param('frequency_per_month')
+        deposit_range = np.stack([param('deposit_amount_min'), param('deposit_amount_max')], axis=1)
+        withdrawal_range = np.stack([param('withdrawal_amount_min'), param('withdrawal_amount_max')], axis=1)
+        recency_days = param('recency_days')
+        deposit_ratio = param('deposit_ratio')
+        recent_ratio = np.array([self.recent_ratio[s] for s in segment_list])
         
-        return transactions
-
-    def _generate_transaction_date(self, start_date: datetime, end_date: datetime, 
-                                 segment: str, req: Dict) -> datetime:
-        """Generate transaction date with segment-specific recency bias"""
+        # Số transactions mỗi customer: randint(min, max) * số tháng (customer bị skip -> 0)
+        if months is None:
+            months = (end_date - start_date).days // 30
+        valid = customer_segment >= 0
+        seg = np.where(valid, customer_segment, 0)
+        min_count = frequency[seg, 0] * months
+        max_count = frequency[seg, 1] * months
+        # Số tháng lẻ: phần lẻ của min_count cộng vào trước khi làm tròn xuống (kỳ vọng tỉ lệ với số ngày);
+        # số tháng nguyên -> min_base = min_count, giống hệt randint(min, max) * months
+        min_base = np.floor(min_count)
+        counts = min_base.astype(np.int64) + (
+            min_count - min_base + count_rng.random(len(customer_codes)) * (max_count - min_count + 1)
+        ).astype(np.int64)
+        counts[~valid] = 0
         
-        if segment == 'A':
-            # A: 80% recent transactions (Champions/VIPs hoạt động thường xuyên)
-            if random.random() < 0.8:
-                # Recent transactions within recency_days
-                random_days = random.randint(
-                    (end_date - start_date).days - req['recency_days'],
-                    (end_date - start_date).days
-                )
-            else:
-                # Some older transactions
-                random_days = random.randint(0, (end_date - start_date).days)
-                
-        elif segment == 'B':
-            # B: 40% recent transactions (Potential Loyalists ít hoạt động)
-            if random.random() < 0.4:
-                # Recent transactions within recency_days
-                random_days = random.randint(
-                    (end_date - start_date).days - req['recency_days'],
-                    (end_date - start_date).days
-                )
-            else:
-                # Mostly older transactions
-                random_days = random.randint(0, (end_date - start_date).days)
-                
-        elif segment == 'C':
-            # C: 60% recent transactions (At-Risk High Value)
-            if random.random() < 0.6:
-                # Recent transactions within recency_days
-                random_days = random.randint(
-                    (end_date - start_date).days - req['recency_days'],
-                    (end_date - start_date).days
-                )
-            else:
-                # Some older transactions
-                random_days = random.randint(0, (end_date - start_date).days)
-                
-        elif segment == 'D':
-            # D: 70% recent transactions (Stable Savers)
-            if random.random() < 0.7:
-                # Recent transactions within recency_days
-                random_days = random.randint(
-                    (end_date - start_date).days - req['recency_days'],
-                    (end_date - start_date).days
-                )
-            else:
-                # Some older transactions
-                random_days = random.randint(0, (end_date - start_date).days)
-                
-        else:  # E
-            # E: 30% recent transactions (New/Occasional Users)
-            if random.random() < 0.3:
-                # Recent transactions within recency_days
-                random_days = random.randint(
-                    (end_date - start_date).days - req['recency_days'],
-                    (end_date - start_date).days
-                )
-            else:
-                # Mostly older transactions
-                random_days = random.randint(0, (end_date - start_date).days)
+        n = int(counts.sum())
+        txn_customer = np.repeat(np.arange(len(customer_codes)), counts)
+        txn_segment = seg[txn_customer]
+        u = rng.random((n, len(self.TRANSACTION_UNIFORMS)))
+        col = {name: u[:, i] for i, name in enumerate(self.TRANSACTION_UNIFORMS)}
         
-        return start_date + timedelta(days=random_days)
-
-    def _generate_transaction_type_by_segment(self, segment: str, req: Dict) -> str:
-        """Generate transaction type based on segment behavior"""
+        # Chọn ngẫu nhiên một account của customer (accounts gom theo customer, giữ thứ tự)
+        account_order = np.argsort(customer_index, kind='stable')
+        account_counts = np.bincount(customer_index, minlength=len(customer_codes))
+        account_starts = np.concatenate([[0], np.cumsum(account_counts)[:-1]])
+        txn_account = account_order[
+            account_starts[txn_customer] + (col['account'] * account_counts[txn_customer]).astype(np.int64)
+        ]
         
-        if segment == 'A':
-            # A: 70% deposits (Champions/VIPs ưa deposits)
-            if random.random() < req['deposit_ratio']:
-                return random.choice(['Deposit', 'Fund Transfer'])
-            else:
-                return random.choice(['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction'])
-                
-        elif segment == 'B':
-            # B: 60% deposits, 40% withdrawals (Potential Loyalists)
-            if random.random() < req['deposit_ratio']:
-                return random.choice(['Deposit', 'Fund Transfer'])
-            else:
-                return random.choice(['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction'])
-                
-        elif segment == 'C':
-            # C: 30% deposits, 70% withdrawals (At-Risk High Value - nhiều withdrawals)
-            if random.random() < req['deposit_ratio']:
-                return random.choice(['Deposit', 'Fund Transfer'])
-            else:
-                return random.choice(['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction'])
-                
-        elif segment == 'D':
-            # D: 60% deposits, 40% withdrawals (Stable Savers)
-            if random.random() < req['deposit_ratio']:
-                return random.choice(['Deposit', 'Fund Transfer'])
-            else:
-                return random.choice(['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction'])
-                
-        else:  # E
-            # E: 70% deposits, 30% withdrawals (New/Occasional Users)
-            if random.random() < req['deposit_ratio']:
-                return random.choice(['Deposit', 'Fund Transfer'])
-            else:
-                return random.choice(['Principal Withdrawal', 'Interest Withdrawal', 'Fee Transaction'])
-
-    def _generate_amount_by_segment_and_type(self, segment: str, transaction_type: str, req: Dict) -> int:
-        """Generate amount based on segment and transaction type"""
+        # Ngày: recent -> trong recency_days cuối kỳ, còn lại -> bất kỳ ngày nào trong kỳ
+        span = (end_date - start_date).days
+        # Kỳ ngắn hơn recency_days (incremental mode) -> recent = cả kỳ
+        recency = np.minimum(recency_days[txn_segment], span)
+        days = np.where(
+            col['recent'] < recent_ratio[txn_segment],
+            span - recency + (col['recent_day'] * (recency + 1)).astype(np.int64),
+            (col['day'] * (span + 1)).astype(np.int64)
+        )
         
-        if transaction_type in ['Deposit', 'Fund Transfer']:
-            # Deposits: use deposit range
-            return random.randint(req['deposit_amount_min'], req['deposit_amount_max'])
-        else:
-            # Withdrawals: use withdrawal range
-            return random.randint(req['withdrawal_amount_min'], req['withdrawal_amount_max'])
-    
-    def _generate_account_details(self, segment: str, transaction_date: datetime, req: Dict) -> tuple:
-        """Generate account details (term_month, maturity_date, open_date, account_type)"""
+        # Loại transaction + amount theo deposit/withdrawal range của segment
+        is_deposit = col['deposit'] < deposit_ratio[txn_segment]
+        transaction_type = np.where(
+            is_deposit,
+            np.array(self.DEPOSIT_TYPES, dtype=object)[(col['type'] * 2).astype(np.int64)],
+            np.array(self.WITHDRAWAL_TYPES, dtype=object)[(col['type'] * 3).astype(np.int64)]
+        )
+        amount_range = np.where(is_deposit[:, None], deposit_range[txn_segment], withdrawal_range[txn_segment])
+        # Amount nguyên VND, lưu dạng minor units như mọi cột amount
+        amount = (amount_range[:, 0] + (col['amount'] * (amount_range[:, 1] - amount_range[:, 0] + 1)).astype(np.int64)
+                  ) * AMOUNT_SCALE
         
-        # Generate term_month based on segment
-        term_month = random.randint(req['term_month_range'][0], req['term_month_range'][1])
+        currency_codes = self.currency_sampler.codes_from_uniform(col['currency'])
+        currency = np.array(self.currency_sampler.values, dtype=object)[currency_codes]
+        rates = np.array([self.CURRENCY_RATES.get(c, 1) for c in self.currency_sampler.values])
+        status = self.status_sampler.values_from_uniform(col['status'])
+        channel = np.array(self.channels, dtype=object)[(col['channel'] * len(self.channels)).astype(np.int64)]
         
-        # Generate open_date (account opening date)
-        if segment == 'B' or segment == 'E':
-            # B, E: Open_date gần đây (trong 6 tháng)
-            open_date = transaction_date - timedelta(days=random.randint(30, 180))
-        else:
-            # A, C, D: Open_date có thể xa hơn
-            open_date = transaction_date - timedelta(days=random.randint(30, 365))
+        # Thông tin account (số dư, term, ngày đáo hạn, ngày mở, loại sổ)
+        account_column = lambda name, default: (accounts_df[name] if name in accounts_df
+                                                else pd.Series([default] * len(accounts_df), dtype=object))
         
-        # Generate account_type
-        if segment == 'E' and 'demand_saving_ratio' in req:
-            # E: 80% demand_saving
-            account_type = 'demand_saving' if random.random() < req['demand_saving_ratio'] else 'term_saving'
-        elif segment == 'C':
-            # C: Chuyển sang demand_saving (3 tháng gần đây)
-            if random.random() < 0.7:  # 70% demand_saving
-                account_type = 'demand_saving'
-                term_month = 0  # Demand saving không có kỳ hạn
-            else:
-                account_type = 'term_saving'
-        else:
-            # A, B, D: Chủ yếu term_saving
-            account_type = 'term_saving' if random.random() < 0.8 else 'demand_saving'
-            if account_type == 'demand_saving':
-                term_month = 0
+        # Balance = current_balance của account ±20%
+        base_balance = (amount_values(accounts_df['current_balance']) if 'current_balance' in accounts_df
+                        else np.zeros(len(accounts_df)))
+        balance = np.trunc(base_balance[txn_account] * (0.8 + col['balance'] * 0.4)).astype(np.int64) * AMOUNT_SCALE
+        term_month = account_column('term_months', 0).fillna(0).to_numpy(dtype=np.int64)[txn_account]
+        maturity_date = to_day_ordinals(account_column('maturity_date', None))[txn_account]
+        open_date = to_day_ordinals(account_column('open_date', None))[txn_account]
+        account_type = account_column('product_type', 'term_saving').to_numpy(dtype=object)[txn_account]
         
-        # Generate maturity_date
-        if account_type == 'term_saving' and term_month > 0:
-            maturity_date = open_date + timedelta(days=term_month * 30)
-        else:
-            maturity_date = None
+        customer_code = customer_codes[txn_customer]
         
-        return term_month, maturity_date, open_date, account_type
+        columns = {
+            'account_id': accounts_df['account_id'].to_numpy(dtype=object)[txn_account],
+            'customer_code': customer_code,
+            'transaction_date': (day_ordinal(start_date) + days).astype(DAY_DTYPE),
+            'transaction_type': transaction_type,
+            'transaction_desc': transaction_type + ' transaction for ' + customer_code,
+            'amount': amount,
+            'balance': balance,
+            'channel_txn': channel,
+            'status_txn': status,
+            'tran_amt_acy': amount,
+            'tran_amt_lcy': amount * rates[currency_codes],
+            'currency': currency,
+            'term_month': term_month,
+            'maturity_date': maturity_date,
+            'open_date': open_date,
+            'account_type': account_type
+        }
+        
+        # Sort by date trong từng customer (stable, giống transactions.sort theo ngày)
+        order = np.lexsort((days, txn_customer))
+        transactions_df = pd.DataFrame({name: values[order] for name, values in columns.items()})
+        
+        # IDs cấp theo thứ tự output (tăng dần theo rows)
+        transaction_keys, transaction_ids = self.transaction_ids.allocate_ids(n)
+        transactions_df.insert(0, 'transaction_id', transaction_ids)
+        if self.config.SURROGATE_KEYS:
+            transactions_df.insert(0, 'transaction_key', transaction_keys)
+        return apply_table_dtypes(transactions_df, 'transactions', self.categories)
     
-    def _generate_balance_by_segment(self, segment: str, req: Dict) -> int:
-        """Generate balance based on segment"""
-        return random.randint(req['balance_range'][0], req['balance_range'][1])
+    def _frame_to_transactions(self, transactions_df: pd.DataFrame) -> List[NewTransaction]:
+        """Convert DataFrame transactions sang List[NewTransaction] (datetime Python, NaT -> None)"""
+        columns = frame_to_python_columns(transactions_df, 'transactions', self.TRANSACTION_COLUMNS)
+        return [NewTransaction(*row) for row in zip(*columns)]
     
     def load_accounts_from_csv(self, csv_file_path: str) -> List[Dict]:
         """Load accounts data from CSV file"""
@@ -460,39 +404,14 @@ class NewTransactionGenerator:
 
     def generate_transactions_for_accounts(self, customer_accounts: List[Dict], 
                                          start_date: datetime, end_date: datetime) -> List[NewTransaction]:
-        """Generate transactions for all customer accounts"""
-        
-        all_transactions = []
-        
-        # Group accounts by customer
-        customer_accounts_map = {}
-        for account in customer_accounts:
-            customer_code = account['customer_code']
-            if customer_code not in customer_accounts_map:
-                customer_accounts_map[customer_code] = []
-            customer_accounts_map[customer_code].append(account)
-        
-        # Generate transactions for each customer
-        for customer_code, accounts in customer_accounts_map.items():
-            # Determine segment from customer_code (A, B, C, D, E)
-            segment = customer_code.split('_')[0]
-            
-            # Skip if segment not in our requirements
-            if segment not in self.rfm_requirements:
-                print(f"   Skipping unknown segment: {segment} for customer {customer_code}")
-                continue
-            
-            # Generate transactions for this customer
-            transactions = self.generate_transactions_for_customer(
-                customer_code, segment, accounts, start_date, end_date
-            )
-            all_transactions.extend(transactions)
-        
-        return all_transactions
+        """Generate transactions for all customer accounts (batch engine, xem generate_transactions_frame)"""
+        return self._frame_to_transactions(
+            self.generate_transactions_frame(customer_accounts, start_date, end_date)
+        )
 
 def main():
     """Generate transactions using real account data and save to CSV"""
-    generator = NewTransactionGenerator()
+    generator = NewTransactionGenerator(test_config(SHOW_PROGRESS=True))
     
     # Date range for transaction generation
     start_date = datetime(2023, 1, 1)
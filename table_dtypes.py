@@ -0,0 +1,102 @@
+"""
+Table dtypes cho các DataFrame do generator trả về
+Theo kiểu logic của cột trong output_writers.TABLE_SCHEMAS:
+- cột ít giá trị (generator khai báo categories) -> pd.Categorical với thứ tự categories cố định
+- date -> int32 day ordinals (số ngày kể từ DATE_EPOCH 1970-01-01, NO_DATE = NaT); generator tính ngày
+  trực tiếp trên ordinals, output writers convert sang date32 / 'YYYY-MM-DD' một lần mỗi cột;
+  dataset trả về caller (generate_balanced_dataset) có cột date datetime64[ns] (with_datetime_dates)
+- amount (mọi cột tiền) -> int64 minor units (value * AMOUNT_SCALE), không còn sai số float khi cộng dồn;
+  input là major hay minor units do caller khai báo (amounts=...), không đoán theo dtype
+
+Categories cố định (không suy ra từ dữ liệu) nên mọi chunk / shard có cùng dictionary và
+pd.concat vẫn giữ Categorical. Output writers convert minor units về major units khi ghi.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List
+
+from output_writers import (TABLE_SCHEMAS, AMOUNT_SCALE, DATE_EPOCH, DAY_DTYPE, NO_DATE, table_columns,
+                            to_minor_units, minor_units, amount_values, day_ordinal, to_day_ordinals, date_values, date_strings)
+
+
+def ordered_categories(*groups: Iterable) -> List[str]:
+    """Gộp các nhóm giá trị thành list không trùng, giữ thứ tự xuất hiện đầu tiên"""
+    return list(dict.fromkeys(value for group in groups for value in group))
+
+
+def _to_categorical(values: pd.Series, categories: List[str], table: str, column: str):
+    """pd.Categorical theo categories cố định; giá trị ngoài categories -> ValueError"""
+    if isinstance(values.dtype, pd.CategoricalDtype) and list(values.cat.categories) == list(categories):
+        return values
+    categorical = pd.Categorical(values.to_numpy(dtype=object), categories=categories)
+    unknown = (categorical.codes < 0) & values.notna().to_numpy()
+    if unknown.any():
+        raise ValueError(f"{table}.{column}: value '{values[unknown].iloc[0]}' is not in the declared categories")
+    return categorical
+
+
+AMOUNT_UNITS = ('minor', 'major')
+
+
+def apply_table_dtypes(df: pd.DataFrame, table: str, categories: Dict[str, List[str]],
+                       amounts: str = 'minor') -> pd.DataFrame:
+    """Áp dtypes theo TABLE_SCHEMAS cho DataFrame của một bảng (sửa trực tiếp df, trả về df)
+
+    categories: {column: categories theo thứ tự cố định}; cột category không khai báo
+    (ví dụ transaction_desc, nhiều giá trị) giữ nguyên kiểu string.
+    amounts: đơn vị của các cột amount trong df - 'minor' (int64 minor units, ví dụ bảng đã typed)
+    hoặc 'major' (số tiền thật: float, Decimal, dataclass records, file đọc lại).
+    """
+    if amounts not in AMOUNT_UNITS:
+        raise ValueError(f"Unknown amount units '{amounts}', expected one of {AMOUNT_UNITS}")
+    for column, kind in table_columns(table, df.columns):
+        if column not in df:
+            continue
+        if column in categories:
+            df[column] = _to_categorical(df[column], categories[column], table, column)
+        elif kind == 'date':
+            df[column] = to_day_ordinals(df[column])
+        elif kind == 'amount':
+            df[column] = (to_minor_units(df[column]) if amounts == 'major'
+                          else minor_units(df[column], f"{table}.{column}"))
+    return df
+
+
+def records_to_frame(records: Iterable, record_type) -> pd.DataFrame:
+    """List[dataclass] của legacy object API -> DataFrame (cột theo field của record_type, đọc theo cột)"""
+    records = list(records)
+    columns = list(record_type.__dataclass_fields__)
+    return pd.DataFrame({column: [getattr(record, column) for record in records] for column in columns},
+                        columns=columns)
+
+
+def with_datetime_dates(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Typed frame -> frame trả về cho caller: cột date day ordinals -> datetime64[ns] (NO_DATE -> NaT)
+
+    Day ordinals chỉ dùng bên trong engines và output writers; categories / minor units giữ nguyên.
+    """
+    columns = {column: date_values(df[column]).astype('datetime64[ns]')
+               for column, kind in table_columns(table, df.columns)
+               if kind == 'date' and column in df and pd.api.types.is_integer_dtype(df[column])}
+    return df.assign(**columns) if columns else df
+
+
+def frame_to_python_columns(df: pd.DataFrame, table: str, columns: List[str]) -> List[list]:
+    """Các cột của DataFrame dạng list Python cho legacy object API
+
+    date (day ordinals) -> datetime (NO_DATE -> None), amount minor units -> float major units,
+    Categorical -> str.
+    """
+    kinds = dict(TABLE_SCHEMAS[table])
+    result = []
+    for column in columns:
+        values = df[column]
+        if kinds.get(column) == 'date' or pd.api.types.is_datetime64_any_dtype(values):
+            # datetime64[us].tolist() trả về datetime Python và None cho NaT
+            result.append(date_values(values).astype('datetime64[us]').tolist())
+        elif kinds.get(column) == 'amount':
+            result.append(amount_values(values).tolist())
+        else:
+            result.append(values.tolist())
+    return result
@@ -3,10 +3,55 @@ Test Configuration
 Configuration cho banking data generator
 """
 
+import random
+import zlib
+import numpy as np
 from dataclasses import dataclass, field
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 from datetime import datetime, timedelta
 
+from id_allocator import IdAllocator, SHARD_ID_STRIDE, ID_WIDTH
+
+
+class GenerationContext:
+    """RNG + clock context dùng chung cho các generator
+    
+    Mỗi bảng (customers, accounts, ...) có substream riêng sinh từ cùng một seed, nên với
+    cùng seed và cùng as_of, output giống hệt nhau và có thể sinh lại một bảng mà không
+    cần chạy lại các bảng khác.
+    """
+    
+    def __init__(self, seed: int = None, as_of: datetime = None, shard_index: int = 0):
+        # Không có seed -> lấy entropy một lần, các substream vẫn nhất quán trong cùng context
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        # Mốc "hôm nay" thay cho datetime.now() trong các generator
+        self.as_of = as_of or datetime.now()
+        # Shard của context (parallel mode) -> key space riêng cho ID allocators
+        self.shard_index = shard_index
+    
+    def _seed_sequence(self, stream: str) -> np.random.SeedSequence:
+        """Substream seed: (seed, crc32(tên stream))"""
+        return np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(stream.encode('utf-8')),))
+    
+    def random(self, stream: str) -> random.Random:
+        """Python random.Random cho substream (dùng cho scalar path)"""
+        state = self._seed_sequence(stream).generate_state(4)
+        return random.Random(int.from_bytes(state.tobytes(), 'little'))
+    
+    def numpy(self, stream: str) -> np.random.Generator:
+        """NumPy Generator cho substream (dùng cho batch/columnar path)"""
+        return np.random.default_rng(self._seed_sequence(stream))
+    
+    def id_allocator(self, prefix: str, width: int = ID_WIDTH) -> IdAllocator:
+        """ID allocator bắt đầu từ key space của shard (không trùng giữa các shard)"""
+        return IdAllocator(prefix, self.shard_index * SHARD_ID_STRIDE, width)
+    
+    def for_shard(self, shard_index: int) -> 'GenerationContext':
+        """Context của một shard: seed riêng sinh từ seed gốc, cùng as_of, key space riêng"""
+        shard_seed = np.random.SeedSequence(self.seed, spawn_key=(0, shard_index)).generate_state(4)
+        return GenerationContext(int.from_bytes(shard_seed.tobytes(), 'little'), self.as_of, shard_index)
+
+
 @dataclass
 class test_config:
     """Configuration cho test cases và generators"""
@@ -113,6 +158,42 @@ class test_config:
     START_DATE: datetime = datetime(2023, 1, 1)
     END_DATE: datetime = datetime(2024, 12, 31)
     
+    # Reproducibility: cùng SEED + AS_OF_DATE -> output giống hệt nhau
+    SEED: int = None  # None = ngẫu nhiên mỗi lần chạy
+    AS_OF_DATE: datetime = None  # Mốc "hôm nay" của dữ liệu, None = datetime.now()
+    
+    # Output backend: 'csv', 'parquet' hoặc 'arrow' (Arrow IPC); parquet/arrow cần pyarrow
+    OUTPUT_FORMAT: str = 'csv'
+    OUTPUT_COMPRESSION: str = 'snappy'  # parquet: snappy/zstd/gzip/None, arrow: lz4/zstd/None
+    
+    # Progress (processed/total, throughput, ETA) tối đa 1 dòng/giây; False = library mode (im lặng)
+    SHOW_PROGRESS: bool = False
+    
+    # BIN prefix của số thẻ (PAN 16 chữ số, hợp lệ Luhn) theo product_type
+    CARD_BIN_PREFIXES: Dict[str, str] = field(default_factory=lambda: {
+        'QUOC_TE': '422151',  # Thẻ quốc tế
+        'NOI_DIA': '970436'   # Thẻ nội địa (NAPAS 9704)
+    })
+    
+    # Ledger: withdrawal làm số dư âm -> 'allow' (giữ nguyên), 'clamp' (rút tối đa số dư hiện có)
+    # hoặc 'redraw' (sinh lại amount trong khoảng số dư hiện có)
+    OVERDRAFT_POLICY: str = 'allow'
+    
+    # Thêm integer surrogate keys (account_key, transaction_key) bên cạnh display IDs
+    SURROGATE_KEYS: bool = False
+    
+    # Run report JSON (metrics từng stage); streaming/parallel mode tự ghi khi được set
+    RUN_REPORT_FILE: str = None
+    
+    # Run manifest JSON (customer_id cuối theo segment, kỳ dữ liệu, seed) cho incremental mode;
+    # None = {output_prefix}_manifest.json cạnh output files
+    RUN_MANIFEST_FILE: str = None
+    
+    # Các bảng cần sinh (None = tất cả); stage không cần cho các bảng này được bỏ qua
+    TABLES: List[str] = None
+    # Số threads chạy song song các branch độc lập của stage DAG (savings / card); 1 = tuần tự
+    STAGE_WORKERS: int = 2
+    
     # Account settings
     MIN_ACCOUNTS_PER_CUSTOMER: int = 1
     MAX_ACCOUNTS_PER_CUSTOMER: int = 5
@@ -134,3 +215,7 @@ class test_config:
         'MEDIUM': (3, 6),
         'LOW': (1, 3)
     })
+    
+    def make_context(self) -> GenerationContext:
+        """Create the RNG + clock context for this configuration"""
+        return GenerationContext(self.SEED, self.AS_OF_DATE)
@@ -0,0 +1,6 @@
+"""Các module của repo nằm ở thư mục gốc (flat layout) -> thêm vào sys.path cho pytest"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+"""Regression tests cho card_numbers: Luhn hợp lệ, BIN theo product_type, PAN không trùng"""
+
+import numpy as np
+import pytest
+
+from card_numbers import (CardNumberEngine, luhn_check_digits, luhn_valid, format_card_numbers,
+                          MAX_CARDS_PER_CUSTOMER)
+
+BIN_PREFIXES = {'QUOC_TE': '422151', 'NOI_DIA': '970436'}
+SEGMENTS = ['A', 'B', 'C', 'D', 'E']
+
+
+def _luhn_check_digit(payload: int) -> int:
+    """Check digit Luhn từng chữ số (tham chiếu)"""
+    total = 0
+    for j, digit in enumerate(reversed(str(payload))):
+        digit = int(digit)
+        if j % 2 == 0:
+            digit *= 2
+            digit -= 9 if digit > 9 else 0
+        total += digit
+    return (10 - total % 10) % 10
+
+
+def test_check_digits_match_reference():
+    payloads = np.random.default_rng(0).integers(0, 10 ** 15, 2_000)
+    payloads[:3] = [0, 7, 999_999_999_999_999]
+    expected = [_luhn_check_digit(int(payload)) for payload in payloads]
+    np.testing.assert_array_equal(luhn_check_digits(payloads), expected)
+
+
+def test_luhn_valid_on_known_numbers():
+    assert luhn_valid(['4111-1111-1111-1111', '4111111111111112']).tolist() == [True, False]
+
+
+def test_format_card_numbers():
+    assert format_card_numbers(np.array([4111111111111111, 12])).tolist() == [
+        '4111-1111-1111-1111', '0000-0000-0000-0012']
+
+
+def test_generated_pans_are_valid_unique_and_use_bin():
+    engine = CardNumberEngine(BIN_PREFIXES, SEGMENTS)
+    customer_ids = np.arange(1, 5_001)
+    customer_codes = np.array([f"{SEGMENTS[i % 5]}_{i:06d}" for i in customer_ids], dtype=object)
+    codes = np.repeat(customer_codes, 3)
+    card_seq = np.tile(np.arange(1, 4), len(customer_codes))
+    product_types = np.where(np.arange(len(codes)) % 2 == 0, 'QUOC_TE', 'NOI_DIA').astype(object)
+
+    pans = engine.generate(engine.card_keys(codes, card_seq), product_types)
+
+    assert luhn_valid(pans).all()
+    assert len(set(pans)) == len(pans)
+    digits = np.char.replace(pans.astype(str), '-', '')
+    for product_type, bin_prefix in BIN_PREFIXES.items():
+        assert all(pan.startswith(bin_prefix) for pan in digits[product_types == product_type])
+
+
+def test_same_card_gives_same_pan_in_any_chunk():
+    engine = CardNumberEngine(BIN_PREFIXES, SEGMENTS)
+    codes = np.array(['A_000001', 'B_000002', 'C_000003', 'A_000004'], dtype=object)
+    card_seq = np.array([1, 2, 1, 3])
+    product_types = np.array(['QUOC_TE', 'NOI_DIA', 'NOI_DIA', 'QUOC_TE'], dtype=object)
+    full = engine.generate(engine.card_keys(codes, card_seq), product_types)
+    parts = [engine.generate(engine.card_keys(codes[i:i + 1], card_seq[i:i + 1]), product_types[i:i + 1])[0]
+             for i in range(len(codes))]
+    assert full.tolist() == parts
+
+
+def test_card_keys_are_unique_per_customer_and_sequence():
+    engine = CardNumberEngine(BIN_PREFIXES, SEGMENTS)
+    codes = np.array([f"{segment}_{i:06d}" for i in range(1, 200) for segment in SEGMENTS], dtype=object)
+    keys = np.concatenate([engine.card_keys(codes, np.full(len(codes), seq))
+                           for seq in range(1, MAX_CARDS_PER_CUSTOMER + 1)])
+    assert len(np.unique(keys)) == len(keys)
+
+
+def test_rejects_invalid_input():
+    with pytest.raises(ValueError):
+        CardNumberEngine({'QUOC_TE': '42x151'}, SEGMENTS)
+    engine = CardNumberEngine(BIN_PREFIXES, SEGMENTS)
+    with pytest.raises(ValueError):
+        engine.card_keys(['A_000001'], [MAX_CARDS_PER_CUSTOMER + 1])
+    with pytest.raises(KeyError):
+        engine.generate(engine.card_keys(['A_000001'], [1]), ['PREPAID'])
@@ -0,0 +1,70 @@
+"""Regression tests cho id_allocator: block allocation, ID format, key space riêng của mỗi shard"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from id_allocator import IdAllocator, SHARD_ID_STRIDE, format_ids, child_ids
+from test_config import test_config, GenerationContext
+from main_generator import NewMainGenerator
+from output_writers import read_table
+
+
+def test_allocate_blocks_are_consecutive():
+    allocator = IdAllocator('TXN_', width=6)
+    np.testing.assert_array_equal(allocator.allocate(3), [0, 1, 2])
+    keys, ids = allocator.allocate_ids(2)
+    np.testing.assert_array_equal(keys, [3, 4])
+    assert ids.tolist() == ['TXN_000003', 'TXN_000004']
+    assert allocator.next_id() == 'TXN_000005'
+    assert len(allocator.allocate(0)) == 0 and allocator.next_key == 6
+
+
+def test_format_ids_and_child_ids():
+    assert format_ids('TXN_', np.array([7, 12_345]), 6).tolist() == ['TXN_000007', 'TXN_012345']
+    assert child_ids('ACC_', np.array(['A_000001', 'B_000002'], dtype=object), np.array([1, 12]), 2).tolist() == [
+        'ACC_A_000001_01', 'ACC_B_000002_12']
+
+
+def test_shard_key_spaces_are_disjoint():
+    context = GenerationContext(42, datetime(2025, 1, 1))
+    blocks = []
+    for shard_index in range(4):
+        allocator = context.for_shard(shard_index).id_allocator('TXN_')
+        assert allocator.start == shard_index * SHARD_ID_STRIDE
+        blocks.append(allocator.allocate_ids(1_000)[1])
+    ids = np.concatenate(blocks)
+    assert len(set(ids)) == len(ids)
+
+
+def test_shard_seeds_differ_but_are_reproducible():
+    context = GenerationContext(42, datetime(2025, 1, 1))
+    assert context.for_shard(1).seed == GenerationContext(42, datetime(2025, 1, 1)).for_shard(1).seed
+    assert context.for_shard(1).seed != context.for_shard(2).seed
+
+
+def test_key_space_overflow():
+    allocator = IdAllocator('TXN_', start=SHARD_ID_STRIDE)
+    allocator.next_key = 2 * SHARD_ID_STRIDE - 1
+    allocator.allocate(1)
+    with pytest.raises(OverflowError):
+        allocator.allocate(1)
+
+
+def test_parallel_shards_give_unique_ids(tmp_path):
+    config = test_config(SEED=7, AS_OF_DATE=datetime(2025, 1, 1), SURROGATE_KEYS=True)
+    generator = NewMainGenerator(config)
+    output_files = generator.generate_parallel_dataset(
+        90, num_workers=1, shard_size=30, output_prefix=str(tmp_path / 'banking_data'), output_format='csv',
+        tables=['customers', 'accounts', 'transactions'])
+
+    customers = read_table('csv', output_files['customers_file'], 'customers')
+    accounts = read_table('csv', output_files['accounts_file'], 'accounts')
+    transactions = read_table('csv', output_files['transactions_file'], 'transactions')
+    assert len(customers) == 90
+    for frame, column in [(customers, 'customer_code'), (accounts, 'account_id'), (accounts, 'account_key'),
+                          (transactions, 'transaction_id'), (transactions, 'transaction_key')]:
+        assert frame[column].is_unique, column
+    assert pd.Series(transactions['transaction_key'] // SHARD_ID_STRIDE).nunique() == 3
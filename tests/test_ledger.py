@@ -0,0 +1,110 @@
+"""Regression tests cho ledger.apply_ledger: so với vòng lặp từng transaction của mỗi policy"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ledger import apply_ledger, DEPOSIT_TYPES, WITHDRAWAL_TYPES
+
+
+def _transactions(n=400, num_accounts=7, seed=0):
+    rng = np.random.default_rng(seed)
+    types = np.array(DEPOSIT_TYPES + WITHDRAWAL_TYPES, dtype=object)
+    amount = rng.integers(1, 1_000, n) * 100
+    return pd.DataFrame({
+        'account_id': np.array([f"ACC_{i}" for i in rng.integers(0, num_accounts, n)], dtype=object),
+        # Ít ngày -> nhiều transactions cùng ngày (phải giữ thứ tự input)
+        'transaction_date': np.datetime64('2024-01-01') + rng.integers(0, 20, n).astype('timedelta64[D]'),
+        'transaction_type': types[rng.integers(0, len(types), n)],
+        'amount': amount,
+        'tran_amt_acy': amount,
+        'tran_amt_lcy': amount * 25,
+    })
+
+
+def _opening(transactions_df):
+    accounts = sorted(transactions_df['account_id'].unique())
+    # Có account số dư đầu kỳ âm và account không có trong opening_balances (-> 0)
+    values = [5_000, -3_000, 0, 120_000, 40_000][:len(accounts) - 1]
+    return pd.Series(values, index=accounts[:len(values)], dtype=np.int64)
+
+
+def _naive_ledger(transactions_df, opening_balances, overdraft):
+    """Vòng lặp tham chiếu: từng account theo (ngày, thứ tự input); trả về (amounts, balances) theo thứ tự input"""
+    amounts = transactions_df['amount'].to_numpy().copy()
+    balances = np.zeros(len(transactions_df), dtype=np.int64)
+    ordered = transactions_df.reset_index(drop=True).sort_values('transaction_date', kind='stable')
+    for account_id, rows in ordered.groupby('account_id', sort=False):
+        opening = int(opening_balances.get(account_id, 0))
+        balance, available = opening, max(opening, 0)
+        for i, row in rows.iterrows():
+            if row['transaction_type'] in WITHDRAWAL_TYPES:
+                if overdraft == 'clamp':
+                    amounts[i] = min(amounts[i], available)
+                signed = -amounts[i]
+            else:
+                signed = amounts[i]
+            balance += signed
+            available = max(available + signed, 0) if overdraft == 'clamp' else available + signed
+            balances[i] = balance
+    return amounts, balances
+
+
+@pytest.mark.parametrize('overdraft', ['allow', 'clamp'])
+def test_matches_naive_loop(overdraft):
+    transactions_df = _transactions()
+    opening = _opening(transactions_df)
+    result, final_balances = apply_ledger(transactions_df, opening, overdraft)
+
+    amounts, balances = _naive_ledger(transactions_df, opening, overdraft)
+    np.testing.assert_array_equal(result['amount'].to_numpy(), amounts)
+    np.testing.assert_array_equal(result['balance'].to_numpy(), balances)
+    # Rows giữ nguyên thứ tự input
+    assert result['account_id'].tolist() == transactions_df['account_id'].tolist()
+
+    # Số dư cuối kỳ = balance của transaction cuối cùng mỗi account
+    ordered = result.reset_index(drop=True).sort_values('transaction_date', kind='stable')
+    expected = ordered.groupby('account_id')['balance'].last()
+    pd.testing.assert_series_equal(final_balances.sort_index(), expected.sort_index(), check_names=False)
+
+
+def test_clamp_keeps_fx_rate_and_acy():
+    transactions_df = _transactions()
+    result, _ = apply_ledger(transactions_df, _opening(transactions_df), 'clamp')
+    assert (result['amount'] < transactions_df['amount']).any()
+    np.testing.assert_array_equal(result['tran_amt_acy'].to_numpy(), result['amount'].to_numpy())
+    np.testing.assert_array_equal(result['tran_amt_lcy'].to_numpy(), result['amount'].to_numpy() * 25)
+
+
+def test_redraw_never_overdraws_or_flips_withdrawals():
+    transactions_df = _transactions()
+    opening = _opening(transactions_df)
+    result, _ = apply_ledger(transactions_df, opening, 'redraw', np.random.default_rng(1))
+
+    clamped, _ = apply_ledger(transactions_df, opening, 'clamp')
+    overdrawn = (clamped['amount'] != transactions_df['amount']).to_numpy()
+    assert overdrawn.any()
+    # Chỉ các withdrawal bị overdrawn được sinh lại, trong [0, amount đã clamp]
+    amount = result['amount'].to_numpy()
+    np.testing.assert_array_equal(amount[~overdrawn], transactions_df['amount'].to_numpy()[~overdrawn])
+    assert (amount[overdrawn] >= 0).all()
+    assert (amount[overdrawn] <= clamped['amount'].to_numpy()[overdrawn]).all()
+    assert result['transaction_type'].tolist() == transactions_df['transaction_type'].tolist()
+
+    # Số dư không âm với mọi account có số dư đầu kỳ >= 0
+    non_negative_opening = result['account_id'].map(opening).fillna(0).to_numpy() >= 0
+    assert (result['balance'].to_numpy()[non_negative_opening] >= 0).all()
+
+
+def test_redraw_requires_rng_and_rejects_unknown_policy():
+    transactions_df = _transactions(n=10)
+    with pytest.raises(ValueError):
+        apply_ledger(transactions_df, None, 'redraw')
+    with pytest.raises(ValueError):
+        apply_ledger(transactions_df, None, 'overdraw')
+
+
+def test_empty_transactions():
+    result, final_balances = apply_ledger(_transactions().iloc[:0], None, 'clamp')
+    assert result.empty and 'balance' in result
+    assert final_balances.empty
@@ -0,0 +1,76 @@
+"""Regression tests cho pipeline.StageGraph: plan() pruning và run()"""
+
+from datetime import datetime
+
+import pytest
+
+from pipeline import Stage, StageGraph
+from test_config import test_config
+from main_generator import NewMainGenerator
+
+
+def _names(stages):
+    return [stage.name for stage in stages]
+
+
+@pytest.fixture(scope='module')
+def stage_graph():
+    return NewMainGenerator(test_config(SEED=1, AS_OF_DATE=datetime(2025, 1, 1))).stage_graph
+
+
+def test_plan_keeps_only_needed_stages(stage_graph):
+    # num_customers là input của run (generate_balanced_dataset)
+    inputs = ['num_customers']
+    assert _names(stage_graph.plan(['customers'], inputs)) == ['customers']
+    assert _names(stage_graph.plan(['opened_accounts'], inputs)) == ['customers', 'accounts']
+    assert _names(stage_graph.plan(['card_transactions'], inputs)) == [
+        'customers', 'card_master', 'cards', 'card_transactions']
+    assert _names(stage_graph.plan(['accounts', 'cards'], inputs)) == [
+        'customers', 'accounts', 'transactions', 'update_account_balances', 'card_master', 'cards']
+    # Thiếu input của run -> lỗi thay vì bỏ qua stage
+    with pytest.raises(KeyError):
+        stage_graph.plan(['customers'])
+
+
+def test_plan_skips_available_artifacts(stage_graph):
+    # customers của chunk đã có -> stage customers bị bỏ qua
+    assert _names(stage_graph.plan(['cards_from_txn'], ['customers'])) == ['card_master']
+    assert _names(stage_graph.plan(['transactions'], ['customers'])) == [
+        'accounts', 'transactions', 'update_account_balances']
+    assert stage_graph.plan(['customers'], ['customers']) == []
+
+
+def test_plan_unknown_artifact(stage_graph):
+    with pytest.raises(KeyError):
+        stage_graph.plan(['loans'], ['num_customers'])
+
+
+def test_duplicate_producer_rejected():
+    with pytest.raises(ValueError):
+        StageGraph([Stage('a', lambda: 1, [], ['x']), Stage('b', lambda: 2, [], ['x'])])
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_run_executes_only_planned_stages(max_workers):
+    calls = []
+
+    def stage(name, fn):
+        def run(*args):
+            calls.append(name)
+            return fn(*args)
+        return run
+
+    graph = StageGraph([
+        Stage('base', stage('base', lambda n: list(range(n))), ['n'], ['base']),
+        Stage('left', stage('left', lambda base: [v * 2 for v in base]), ['base'], ['left']),
+        Stage('right', stage('right', lambda base: [v + 1 for v in base]), ['base'], ['right']),
+        Stage('both', stage('both', lambda left, right: (left + right, len(left))), ['left', 'right'],
+              ['both', 'size']),
+    ])
+    assert graph.run(['left'], {'n': 3}, max_workers) == {'left': [0, 2, 4]}
+    assert sorted(calls) == ['base', 'left']
+
+    calls.clear()
+    result = graph.run(['both', 'size'], {'base': [1]}, max_workers)
+    assert result == {'both': [2, 2], 'size': 1}
+    assert sorted(calls) == ['both', 'left', 'right']
@@ -0,0 +1,117 @@
+"""Regression tests cho run_manifest.RunManifest và incremental mode (append_customers / extend_end_date)"""
+
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from run_manifest import RunManifest, manifest_path
+from test_config import test_config
+from main_generator import NewMainGenerator
+from output_writers import read_table, output_path
+
+AS_OF = datetime(2025, 3, 1)
+KEYS = {'customers': 'customer_code', 'accounts': 'account_id', 'transactions': 'transaction_id',
+        'cards': 'card_id', 'card_transactions': 'tran_id', 'cards_from_txn': 'card_id'}
+
+
+def _manifest():
+    manifest = RunManifest(seed=2 ** 100 + 7, as_of=datetime(2025, 3, 1, 12, 30), start_date=datetime(2023, 1, 1),
+                           end_date=datetime(2024, 12, 31), output_prefix='output/banking_data',
+                           output_format='parquet', tables=['customers', 'accounts'], surrogate_keys=True)
+    manifest.add_customers(100, {'A': 95, 'E': 100})
+    manifest.add_rows({'customers': 100, 'accounts': 250})
+    manifest.increments.append({'kind': 'customers', 'shard': 1, 'row_counts': {'customers': 10}})
+    return manifest
+
+
+def test_dict_round_trip():
+    manifest = _manifest()
+    data = manifest.to_dict()
+    assert data['as_of'] == '2025-03-01T12:30:00'
+    assert RunManifest.from_dict(json.loads(json.dumps(data))) == manifest
+
+
+def test_save_load_round_trip(tmp_path):
+    manifest = _manifest()
+    path = manifest.save(manifest_path(str(tmp_path / 'data' / 'banking_data')))
+    assert path.endswith('banking_data_manifest.json')
+    assert RunManifest.load(path) == manifest
+
+
+def test_load_missing_manifest(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        RunManifest.load(str(tmp_path / 'missing_manifest.json'))
+
+
+def test_customer_ids_and_row_counts():
+    manifest = _manifest()
+    assert manifest.next_customer_id == 101
+    manifest.add_customers(5, {'B': 105})
+    manifest.add_rows({'accounts': 10, 'transactions': 3})
+    assert manifest.num_customers == 105 and manifest.next_customer_id == 106
+    assert manifest.row_counts == {'customers': 100, 'accounts': 260, 'transactions': 3}
+
+
+def _config():
+    return test_config(SEED=7, AS_OF_DATE=AS_OF, SURROGATE_KEYS=True)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Dataset nhỏ (streaming, csv) + manifest"""
+    prefix = str(tmp_path / 'banking_data')
+    NewMainGenerator(_config()).generate_streaming_dataset(120, chunk_size=50, output_prefix=prefix,
+                                                           output_format='csv')
+    return prefix
+
+
+def _read(prefix, table):
+    return read_table('csv', output_path(prefix, table, 'csv'), table)
+
+
+def test_append_and_extend_keep_ids_unique_and_counts_in_sync(dataset):
+    manifest_file = manifest_path(dataset)
+    NewMainGenerator(_config()).append_customers(30, chunk_size=20, manifest_file=manifest_file)
+    NewMainGenerator(_config()).extend_end_date(datetime(2025, 2, 15), manifest_file=manifest_file)
+
+    manifest = RunManifest.load(manifest_file)
+    assert manifest.num_customers == 150 and manifest.next_shard == 3
+    assert manifest.end_date == datetime(2025, 2, 15)
+    assert [increment['kind'] for increment in manifest.increments] == ['customers', 'end_date']
+    for table, key in KEYS.items():
+        frame = _read(dataset, table)
+        assert len(frame) == manifest.row_counts[table], table
+        assert frame[key].is_unique, table
+
+    customers = _read(dataset, 'customers')
+    assert customers['customer_code'].str.rsplit('_', n=1).str[1].astype(int).tolist() == list(range(1, 151))
+
+
+def test_extend_continues_balances(dataset):
+    NewMainGenerator(_config()).extend_end_date(datetime(2025, 1, 31), manifest_file=manifest_path(dataset))
+
+    accounts = _read(dataset, 'accounts').set_index('account_id')
+    transactions = _read(dataset, 'transactions')
+    transactions['transaction_date'] = pd.to_datetime(transactions['transaction_date'])
+    new_rows = transactions['transaction_date'] >= datetime(2025, 1, 1)
+    assert new_rows.any()
+    assert (transactions.loc[new_rows, 'transaction_date'] <= datetime(2025, 1, 31)).all()
+    # current_balance = balance của transaction cuối (theo ngày) mỗi account, qua cả hai kỳ
+    last = transactions.sort_values('transaction_date', kind='stable').groupby('account_id')['balance'].last()
+    np.testing.assert_allclose(accounts.loc[last.index, 'current_balance'].to_numpy(dtype=float),
+                               last.to_numpy(dtype=float))
+
+
+def test_extend_past_as_of_writes_nothing(dataset):
+    manifest_file = manifest_path(dataset)
+    files = [manifest_file, output_path(dataset, 'transactions', 'csv'), output_path(dataset, 'accounts', 'csv')]
+    before = [os.path.getmtime(path) for path in files]
+    with pytest.raises(ValueError):
+        NewMainGenerator(_config()).extend_end_date(datetime(2025, 3, 2), manifest_file=manifest_file)
+    with pytest.raises(ValueError):
+        NewMainGenerator(_config()).extend_end_date(datetime(2024, 12, 31), manifest_file=manifest_file)
+    assert [os.path.getmtime(path) for path in files] == before